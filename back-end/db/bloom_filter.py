@@ -0,0 +1,72 @@
+import hashlib
+import math
+import struct
+from typing import Iterator
+
+class BloomFilter:
+	"""
+	A Bloom filter over byte strings: a compact, probabilistic set that can
+	say for certain that a key was never added to it, but can only say that
+	a key was *probably* added.
+
+	Keys are hashed with BLAKE2b, so the positions are the same in every
+	process and the filter can be saved to disk and loaded again.
+	"""
+
+	_HEADER = struct.Struct("<QI")
+
+	def __init__(self, bit_count: int, hash_count: int, bits: bytearray | None = None) -> None:
+		self.bit_count = bit_count
+		self.hash_count = hash_count
+		self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+
+	@classmethod
+	def for_capacity(cls, capacity: int, false_positive_rate: float = 0.01) -> "BloomFilter":
+		"""
+		Returns an empty filter sized to hold `capacity` keys with the given
+		false positive rate.
+		"""
+		capacity = max(capacity, 1)
+		bit_count = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+		hash_count = max(1, round(bit_count / capacity * math.log(2)))
+		return cls(bit_count, hash_count)
+
+	def _positions(self, key: bytes) -> Iterator[int]:
+		digest = hashlib.blake2b(key, digest_size = 16).digest()
+		first = int.from_bytes(digest[:8], "little")
+		second = int.from_bytes(digest[8:], "little") | 1
+		for i in range(self.hash_count):
+			yield (first + i * second) % self.bit_count
+
+	def add(self, key: bytes) -> None:
+		bits = self.bits
+		for position in self._positions(key):
+			bits[position >> 3] |= 1 << (position & 7)
+
+	def might_contain(self, key: bytes) -> bool:
+		"""
+		Returns False if `key` was definitely never added to the filter, and
+		True if it probably was.
+		"""
+		bits = self.bits
+		for position in self._positions(key):
+			if not bits[position >> 3] & (1 << (position & 7)):
+				return False
+		return True
+
+	def to_bytes(self) -> bytes:
+		return self._HEADER.pack(self.bit_count, self.hash_count) + bytes(self.bits)
+
+	@classmethod
+	def from_bytes(cls, data: bytes) -> "BloomFilter":
+		"""
+		Raises:
+			ValueError: if `data` wasn't produced by `to_bytes`.
+		"""
+		if len(data) < cls._HEADER.size:
+			raise ValueError("truncated Bloom filter")
+		bit_count, hash_count = cls._HEADER.unpack_from(data)
+		bits = bytearray(data[cls._HEADER.size:])
+		if bit_count == 0 or hash_count == 0 or len(bits) != (bit_count + 7) // 8:
+			raise ValueError("malformed Bloom filter")
+		return cls(bit_count, hash_count, bits)
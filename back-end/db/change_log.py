@@ -0,0 +1,133 @@
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Any, Iterable
+
+MAX_SIZE = 1 << 20
+"""
+The size in bytes past which a `ChangeLog` is started again, keeping only
+its latest entry. Anything that was catching up from the old log has to
+read the whole table again.
+"""
+
+def _version_text(version: Any) -> bytes:
+	"""
+	Returns the text a table version (see `CsvTable.version`) is logged as.
+	"""
+	if version is None:
+		return b"-"
+	return ":".join(map(str, version)).encode()
+
+class ChangeLog:
+	"""
+	A record of which rows each write to a table changed, kept in a file
+	next to the table file, so that something kept in memory that was
+	loaded from the table (e.g. an index) can catch up with the writes made
+	without it, e.g. by another process, by reading just the rows that they
+	changed rather than the whole table (see `CsvTable.changes_since`).
+
+	Each line is one write: the table's version (see `CsvTable.version`)
+	from just before it and just after it, then the keys of the rows it
+	changed. Since each write starts from the version the last one ended
+	at, a change to the table that wasn't logged (e.g. an edit of the table
+	file by hand, or a write by a process that crashed before logging it)
+	breaks that chain, and whoever is catching up then knows to read the
+	whole table instead. So the log doesn't need to be synced to disk, and
+	failing to append to it is harmless.
+
+	Entries are appended while holding the table's locks in exclusive mode,
+	and read while holding them in at least shared mode.
+	"""
+
+	def __init__(self, path: Path, max_size: int = MAX_SIZE) -> None:
+		self.path = path
+		self.max_size = max_size
+		self._fd: int | None = None
+		self._mutex = Lock()
+
+	def _fileno(self) -> int:
+		"""
+		Returns a descriptor of the log file, opening it again if another
+		process has started the log again (see `append`) or deleted it since
+		it was opened.
+		"""
+		with self._mutex:
+			if self._fd is not None:
+				try:
+					if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+						return self._fd
+				except FileNotFoundError:
+					pass
+				os.close(self._fd)
+				self._fd = None
+			self.path.parent.mkdir(parents = True, exist_ok = True)
+			self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+			return self._fd
+
+	def position(self, version: Any) -> tuple[int, int, bytes]:
+		"""
+		Returns the position that the log has reached, at which the table is
+		at `version`, to pass to `keys_since` later.
+		"""
+		stat = os.fstat(self._fileno())
+		return (stat.st_ino, stat.st_size, _version_text(version))
+
+	def append(self, before: Any, after: Any, keys: Iterable[bytes]) -> None:
+		"""
+		Records that a write took the table from version `before` to version
+		`after`, changing the rows with the given keys. Once the log has
+		grown past `max_size`, it is started again in a new file, holding
+		just this entry.
+		"""
+		entry = b"%s %s %s\n" % (_version_text(before), _version_text(after), b",".join(keys))
+		try:
+			fd = self._fileno()
+			if os.fstat(fd).st_size + len(entry) <= self.max_size:
+				os.write(fd, entry)
+				return
+			tmp_path = self.path.with_name(self.path.name + ".tmp")
+			tmp_path.write_bytes(entry)
+			os.replace(tmp_path, self.path)
+		except OSError:
+			# The next entry won't follow on from the last one that was
+			# logged, so nothing can catch up past the missing one.
+			pass
+
+	def keys_since(self, position: tuple[int, int, bytes], version: Any) -> list[bytes] | None:
+		"""
+		Returns the keys of the rows changed by the writes logged since
+		`position` (see `position`), which took the table to `version`, in
+		the order they were first written, or `None` if the log doesn't
+		account for every change made since: the log was started again, or a
+		change wasn't logged.
+		"""
+		ino, offset, expected = position
+		fd = self._fileno()
+		stat = os.fstat(fd)
+		if stat.st_ino != ino or stat.st_size < offset:
+			return None
+		data = os.pread(fd, stat.st_size - offset, offset)
+		if data and not data.endswith(b"\n"):
+			# An append that was cut short.
+			return None
+		keys: dict[bytes, None] = {}
+		for line in data.split(b"\n")[:-1]:
+			parts = line.split(b" ", 2)
+			if len(parts) != 3 or parts[0] != expected:
+				return None
+			expected = parts[1]
+			if parts[2]:
+				keys.update(dict.fromkeys(parts[2].split(b",")))
+		if expected != _version_text(version):
+			return None
+		return list(keys)
+
+	def clear(self) -> None:
+		"""
+		Deletes the log, e.g. when the table is dropped.
+		"""
+		with self._mutex:
+			if self._fd is not None:
+				os.close(self._fd)
+				self._fd = None
+			self.path.unlink(missing_ok = True)
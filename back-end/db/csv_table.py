@@ -0,0 +1,1651 @@
+from bisect import bisect_right
+from contextlib import contextmanager
+from itertools import islice
+import mmap
+import os
+from pathlib import Path
+import struct
+from threading import Event, Lock, Thread, Timer
+from typing import Any, Callable, ClassVar, Generator, Iterator
+import uuid
+
+from db.bloom_filter import BloomFilter
+from db.change_log import ChangeLog
+from db.file_lock import FileLock
+from db.loose_compare import loose_words, loosely_matches
+from db.row_cache import RowCache
+from db.rw_lock import ReadWriteLock
+from db.text_index import TextIndex, TextStatistics, rank
+from db.write_ahead_log import SYNC_INTERVAL, WriteAheadLog
+
+_COPY_CHUNK_SIZE = 1 << 20
+_CHECKPOINT_SIZE = 1 << 20
+_DENSE_MATCH_RATIO = 8
+"""
+When more than one in this many rows match a `select_like` search, they are
+found by reading through the table file rather than one at a time.
+"""
+_PAGE_SCAN_RATIO = 32
+"""
+When a `select_like` search with a `limit` matches more than one in this many
+rows, the page of rows it asks for is found by reading through the table file,
+which is likely to reach it sooner than sorting the offsets of every match.
+"""
+_LINE_READ_SIZE = 512
+_KEY_FILTER_HEADER = struct.Struct("<8sQQQ")
+_KEY_FILTER_MAGIC = b"CSVKEYS1"
+
+def _row_key(line: bytes) -> bytes:
+	"""
+	Returns the (still encoded) primary key of a stored row, i.e. its first
+	column.
+	"""
+	comma = line.find(b",")
+	if comma < 0:
+		return line.rstrip(b"\n")
+	return line[:comma]
+
+def _row_columns(line: bytes) -> list[bytes]:
+	"""
+	Splits a stored row into its (still encoded) columns.
+	"""
+	return line.rstrip(b"\n").split(b",")
+
+def _index_row(indexes: dict[int, dict[bytes, set[bytes]]], key: bytes, line: bytes) -> None:
+	if not indexes:
+		return
+	columns = _row_columns(line)
+	for column, index in indexes.items():
+		index.setdefault(columns[column], set()).add(key)
+
+def _unindex_row(indexes: dict[int, dict[bytes, set[bytes]]], key: bytes, line: bytes) -> None:
+	if not indexes:
+		return
+	columns = _row_columns(line)
+	for column, index in indexes.items():
+		keys = index.get(columns[column])
+		if keys is not None:
+			keys.discard(key)
+			if not keys:
+				del index[columns[column]]
+
+def _text_index_row(text_indexes: dict[int, TextIndex], key: bytes, line: bytes) -> None:
+	if not text_indexes:
+		return
+	columns = _row_columns(line)
+	for column, text_index in text_indexes.items():
+		text_index.add(key, columns[column])
+
+def _text_unindex_row(text_indexes: dict[int, TextIndex], key: bytes, line: bytes) -> None:
+	if not text_indexes:
+		return
+	columns = _row_columns(line)
+	for column, text_index in text_indexes.items():
+		text_index.remove(key, columns[column])
+
+def _read_line_at(fd: int, offset: int) -> bytes:
+	"""
+	Reads the line that starts at `offset`, including its trailing newline.
+	"""
+	chunk = os.pread(fd, _LINE_READ_SIZE, offset)
+	end = chunk.find(b"\n")
+	while end < 0:
+		more = os.pread(fd, _LINE_READ_SIZE, offset + len(chunk))
+		if more == b"":
+			return chunk
+		search_from = len(chunk)
+		chunk += more
+		end = chunk.find(b"\n", search_from)
+	return chunk[:end + 1]
+
+def _iter_lines(fd: int, start: int, end: int) -> Iterator[tuple[int, bytes]]:
+	"""
+	Yields `(offset, line)` for each line between the byte offsets `start`
+	and `end`. Positioned reads are used so that any number of scans
+	can share one file descriptor.
+	"""
+	offset = start
+	pending = b""
+	while offset + len(pending) < end:
+		chunk = os.pread(fd, min(_COPY_CHUNK_SIZE, end - offset - len(pending)), offset + len(pending))
+		if chunk == b"":
+			return
+		buffer = pending + chunk
+		line_start = 0
+		line_end = buffer.find(b"\n")
+		while line_end >= 0:
+			yield offset, buffer[line_start:line_end + 1]
+			offset += line_end + 1 - line_start
+			line_start = line_end + 1
+			line_end = buffer.find(b"\n", line_start)
+		pending = buffer[line_start:]
+	if pending != b"":
+		yield offset, pending
+
+def _column_span(view: mmap.mmap, line_start: int, line_end: int, column: int) -> tuple[int, int] | None:
+	"""
+	Returns the byte range of the given column of the line between
+	`line_start` and `line_end` (excluding its newline), or `None` if the
+	line has fewer columns.
+	"""
+	start = line_start
+	for _ in range(column):
+		comma = view.find(b",", start, line_end)
+		if comma < 0:
+			return None
+		start = comma + 1
+	end = view.find(b",", start, line_end)
+	return start, line_end if end < 0 else end
+
+def _matches(view: mmap.mmap, line_start: int, line_end: int, predicates: list[tuple[int, bytes]]) -> bool:
+	"""
+	Checks whether the columns of the line between `line_start` and
+	`line_end` equal the given values, comparing them in place. Only
+	columns of the right length are copied out of the file to compare.
+	"""
+	for column, value in predicates:
+		span = _column_span(view, line_start, line_end, column)
+		if span is None:
+			return False
+		start, end = span
+		if end - start != len(value) or view[start:end] != value:
+			return False
+	return True
+
+def _map_lines(
+	view: mmap.mmap,
+	start: int,
+	end: int,
+	predicates: list[tuple[int, bytes]]
+) -> Iterator[tuple[int, bytes]]:
+	"""
+	Yields `(offset, line)` for each line between the byte offsets `start`
+	and `end` of a mapped table file whose columns equal the given values.
+	Lines that don't match are never copied out of the file.
+
+	Rather than visiting every line, this searches the file for the
+	longest of the values (as a whole column) and only checks the lines
+	where it occurs.
+	"""
+	if not predicates:
+		offset = start
+		while offset < end:
+			newline = view.find(b"\n", offset, end)
+			line_end = end if newline < 0 else newline + 1
+			yield offset, view[offset:line_end]
+			offset = line_end
+		return
+
+	column, value = max(predicates, key = lambda predicate: len(predicate[1]))
+	needle = value if column == 0 else b"," + value
+	position = start
+	while True:
+		found = view.find(needle, position, end)
+		if found < 0:
+			return
+		after = found + len(needle)
+		if after < end and view[after] not in b",\n":
+			position = found + 1
+			continue
+		line_start = view.rfind(b"\n", start, found) + 1 or start
+		if column == 0 and line_start != found:
+			position = found + 1
+			continue
+		newline = view.find(b"\n", after, end)
+		line_end = end if newline < 0 else newline + 1
+		if _matches(view, line_start, newline if newline >= 0 else end, predicates):
+			yield line_start, view[line_start:line_end]
+		position = line_end
+
+def _copy_range(fd: int, out_fd: int, start: int, end: int) -> None:
+	while start < end:
+		chunk = os.pread(fd, min(_COPY_CHUNK_SIZE, end - start), start)
+		if chunk == b"":
+			return
+		os.write(out_fd, chunk)
+		start += len(chunk)
+
+
+Committed = Callable[[dict[bytes, bytes | None], Any, Any], None]
+"""
+A function that a table calls after applying a write, with the changes it
+applied and the table's versions (see `CsvTable.version`) from just before
+and just after them, while the table is still locked for the write. No other
+write can come between the two versions, so something kept in step with the
+table in memory can tell whether it was up to date when the write was made,
+and apply the changes in the same order as the table. It must not raise.
+"""
+
+
+class _TableFile:
+	"""
+	One version of a table file: an open handle on it, the byte offset of
+	every live record it contains (keyed by the encoded primary key), and
+	the table's secondary indexes.
+
+	Rewrites produce a new `_TableFile` rather than modifying this one, so a
+	reader that holds on to it keeps a consistent view of the version it
+	opened even after the file on disk has been replaced. Appends (see
+	`CsvTable.append_only`) extend the file and its offsets in place.
+
+	The secondary indexes map a column's (encoded) value to the keys of the
+	rows that have it, and the text indexes map the words in a column to
+	the keys of the rows that contain them (see `TextIndex`). They hold keys
+	rather than offsets so that they stay valid when rows move, and are
+	shared by every version of the file.
+
+	Since appends change the offsets in place, scans don't use them to tell
+	which lines are live. They use `superseded` instead, which maps each
+	superseded row version (and tombstone) to the offset of the line that
+	superseded it, so a scan that stops at the length the file had when it
+	started sees exactly the rows that were live then (see `is_live`).
+	"""
+
+	def __init__(
+		self,
+		file_path: Path,
+		offsets: dict[bytes, int],
+		data_start: int,
+		indexes: dict[int, dict[bytes, set[bytes]]],
+		superseded: dict[int, int] | None = None,
+		text_indexes: dict[int, TextIndex] | None = None
+	) -> None:
+		self.file = file_path.open("r+b", buffering = 0)
+		self.size = 0
+		self.stamp: tuple[int, int, int] = (0, 0, 0)
+		self.offsets = offsets
+		self.data_start = data_start
+		self.indexes = indexes
+		self.text_indexes = {} if text_indexes is None else text_indexes
+		self.superseded = {} if superseded is None else superseded
+		"""
+		The offset of each line in the file that is a superseded row version
+		or a tombstone, mapped to the offset of the line that superseded it
+		(a tombstone supersedes itself).
+		"""
+		self.generation = 0
+		"""
+		The value of the table's generation counter that this version
+		reflects.
+		"""
+		self.update_stamp()
+
+	def update_stamp(self) -> None:
+		stat = os.fstat(self.file.fileno())
+		self.stamp = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+		self.size = stat.st_size
+
+	@property
+	def dead_rows(self) -> int:
+		return len(self.superseded)
+
+	def supersede(self, offset: int, by: int) -> None:
+		self.superseded[offset] = by
+
+	def is_live(self, offset: int, end: int) -> bool:
+		"""
+		Returns whether the line at `offset` was a live row when the file was
+		`end` bytes long.
+		"""
+		by = self.superseded.get(offset)
+		return by is None or by >= end
+
+	def read_row(self, key: bytes) -> bytes | None:
+		offset = self.offsets.get(key)
+		if offset is None:
+			return None
+		return _read_line_at(self.file.fileno(), offset)
+
+	def index_row(self, key: bytes, line: bytes) -> None:
+		_index_row(self.indexes, key, line)
+		_text_index_row(self.text_indexes, key, line)
+
+	def unindex_row(self, key: bytes, line: bytes) -> None:
+		_unindex_row(self.indexes, key, line)
+		_text_unindex_row(self.text_indexes, key, line)
+
+	def lines(self, start: int | None = None, end: int | None = None) -> Iterator[tuple[int, bytes]]:
+		return _iter_lines(
+			self.file.fileno(),
+			self.data_start if start is None else start,
+			self.size if end is None else end
+		)
+
+
+class _PendingWrite:
+	"""
+	A write waiting to be group committed (see `CsvTable._commit`).
+	"""
+
+	def __init__(
+		self,
+		changes: dict[bytes, bytes | None],
+		if_exists: bool | None,
+		single: bool,
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> None:
+		self.changes = changes
+		self.if_exists = if_exists
+		self.single = single
+		"""
+		Whether this is a `write`, whose `if_exists` condition applies and
+		whose delete fails if there is nothing to delete, rather than a
+		`write_many`.
+		"""
+		self.replaced = replaced
+		"""
+		Where to put the rows that this write replaced, if anywhere (see
+		`CsvTable.write`).
+		"""
+		self.committed = committed
+		self.done = Event()
+		self.leads = False
+		"""
+		Set instead of the result when this write's thread should commit the
+		next group.
+		"""
+		self.result = True
+		self.error: BaseException | None = None
+
+
+class CsvTable:
+	"""
+	Storage for a single table file, as used by `PersistedModel`.
+
+	The table keeps an in-memory index from each record's (encoded) primary
+	key to its byte offset in the file, so that point lookups are a single
+	positioned read instead of a scan. The index is built the first time the
+	table is used, kept up to date by the writes that go through this class,
+	and rebuilt if the file is changed by anything else (which is detected
+	by comparing the file's inode, size and modification time).
+
+	By default each write produces a new copy of the file. In append-only
+	mode, writes instead append the new version of a row, or a tombstone
+	for a deleted row, to the end of the file, and a compaction pass in a
+	background thread rewrites the file without the dead lines once they
+	make up `garbage_ratio` of it.
+
+	Columns listed in `indexed_columns` get a secondary index from value to
+	primary keys, which `select` uses to answer equality queries without
+	scanning the file, and columns listed in `text_columns` get a
+	`TextIndex`, which `select_like` uses to find the rows that loosely
+	match a search value without checking every row.
+
+	Each table has its own read/write lock. Reads hold it in shared mode
+	only while they pick the version of the file they will read from, and
+	writes hold it exclusively, so writes to different tables never wait on
+	each other. Scans and point lookups don't take it at all while this
+	process has the latest version of the file (see `_snapshot`), so they
+	don't wait for writes to the same table either.
+
+	Several processes may use the same table file: the read/write lock is
+	paired with an advisory lock on a `.lock` file next to the table, which
+	also holds a generation counter that every write bumps. A process that
+	sees the counter change re-reads the file, or, for an append-only table
+	that has only grown, just indexes the rows appended to it.
+
+	If `cache_max_entries` is positive, the table also keeps a `RowCache` of
+	decoded records for `read_cached`, which is invalidated by each write
+	and cleared whenever the file is reloaded.
+
+	If `key_filter` is True, a Bloom filter of the table's primary keys is
+	saved in a `.keys` file next to the table each time the table is indexed,
+	so that `contains` can rule out keys that aren't in the table (which is
+	the common case for freshly generated keys) without first indexing the
+	whole table. The filter is tied to the version of the table file it was
+	built from, and for append-only tables it is caught up with any rows
+	appended since by reading just those rows.
+
+	If `wal_durability` is set, writes are first recorded in a
+	`WriteAheadLog` next to the table, and writes that arrive while another
+	is in progress are group committed: the thread that finishes first
+	records all of the waiting writes in the log with a single frame (and a
+	single fsync, depending on `wal_durability`), then applies them to the
+	table file with a single rewrite or append. Since the log makes the
+	writes durable, the table file is only synced when the log is
+	checkpointed, in the background, once it has grown past
+	`_CHECKPOINT_SIZE`. If a process crashes, the next process to open the
+	table while no other has it open replays the log.
+	"""
+
+	_tables: ClassVar[dict[str, "CsvTable"]] = {}
+	_tables_lock: ClassVar[Lock] = Lock()
+
+	def __init__(
+		self,
+		file_path: Path,
+		header: str,
+		append_only: bool = False,
+		garbage_ratio: float = 0.5,
+		indexed_columns: tuple[int, ...] = (),
+		cache_max_entries: int = 0,
+		cache_max_bytes: int = 8 << 20,
+		key_filter: bool = False,
+		wal_durability: str | None = None,
+		text_columns: tuple[int, ...] = ()
+	) -> None:
+		self.file_path = file_path
+		self.header = header
+		self.append_only = append_only
+		self.garbage_ratio = garbage_ratio
+		self.indexed_columns = indexed_columns
+		self.text_columns = text_columns
+		self._columns = header.count(",") + 1
+		self._current: _TableFile | None = None
+		self._lock = ReadWriteLock()
+		self._file_lock = FileLock(file_path.with_name(file_path.name + ".lock"))
+		self._compaction_lock = Lock()
+		self._compacting = False
+		self.cache: RowCache | None = None
+		if cache_max_entries > 0:
+			self.cache = RowCache(cache_max_entries, cache_max_bytes)
+		self.key_filter = key_filter
+		self._key_filter_path = file_path.with_name(file_path.name + ".keys")
+		self._key_filter_lock = Lock()
+		self._saved_key_filter: tuple[BloomFilter, int, int, int] | None = None
+		"""
+		The saved key filter, with the inode, size and modification time of
+		the table file that it reflects.
+		"""
+		self._change_log = ChangeLog(file_path.with_name(file_path.name + ".changes"))
+		self.wal: WriteAheadLog | None = None
+		if wal_durability is not None:
+			self.wal = WriteAheadLog(file_path.with_name(file_path.name + ".wal"), wal_durability)
+		self._commit_lock = Lock()
+		self._commit_queue: list[_PendingWrite] = []
+		self._committing = False
+		self._sync_scheduled = False
+		self._checkpointing = False
+
+	@classmethod
+	def open(
+		cls,
+		file_path: Path,
+		header: str,
+		append_only: bool = False,
+		garbage_ratio: float = 0.5,
+		indexed_columns: tuple[int, ...] = (),
+		cache_max_entries: int = 0,
+		cache_max_bytes: int = 8 << 20,
+		key_filter: bool = False,
+		wal_durability: str | None = None,
+		text_columns: tuple[int, ...] = ()
+	) -> "CsvTable":
+		"""
+		Returns the shared `CsvTable` for the given file, creating it on first
+		use.
+		"""
+		table_key = str(file_path)
+		table = cls._tables.get(table_key)
+		if table is None:
+			with cls._tables_lock:
+				table = cls._tables.setdefault(
+					table_key,
+					cls(
+						file_path,
+						header,
+						append_only,
+						garbage_ratio,
+						indexed_columns,
+						cache_max_entries,
+						cache_max_bytes,
+						key_filter,
+						wal_durability,
+						text_columns
+					)
+				)
+		return table
+
+	def _is_tombstone(self, line: bytes) -> bool:
+		# Rows have one column per field, so `columns - 1` commas. Tombstones
+		# are the key followed by one comma per field.
+		return line.count(b",") == self._columns
+
+	def _tombstone(self, key: bytes) -> bytes:
+		return key + b"," * self._columns + b"\n"
+
+	def _ensure_file(self) -> None:
+		if self.file_path.exists():
+			return
+		self.file_path.parent.mkdir(
+			parents = True,
+			exist_ok = True,
+		)
+		with self.file_path.open("a+", encoding = "latin-1") as w:
+			w.write(self.header + "\n")
+
+	def _load(self) -> _TableFile:
+		"""
+		Opens the table file and indexes every record in it. When the same key
+		appears more than once, the last occurrence wins.
+		"""
+		offsets: dict[bytes, int] = {}
+		superseded: dict[int, int] = {}
+		indexes: dict[int, dict[bytes, set[bytes]]] = {
+			column: {} for column in self.indexed_columns
+		}
+		text_indexes = {column: TextIndex() for column in self.text_columns}
+		row_columns = self._columns
+		with self.file_path.open("rb") as r:
+			offset = len(r.readline())
+			data_start = offset
+			for line in r:
+				if self.append_only and not line.endswith(b"\n"):
+					# A torn final append; drop it so the next one starts on a
+					# fresh line.
+					os.truncate(self.file_path, offset)
+					break
+				columns = line.rstrip(b"\n").split(b",")
+				key = columns[0]
+				# Popping keeps the dict in file order; `_rewrite` relies on it.
+				previous = offsets.pop(key, None)
+				if previous is not None:
+					superseded[previous] = offset
+					previous_line = _read_line_at(r.fileno(), previous)
+					_unindex_row(indexes, key, previous_line)
+					_text_unindex_row(text_indexes, key, previous_line)
+				if len(columns) > row_columns:
+					# A tombstone.
+					superseded[offset] = offset
+				else:
+					offsets[key] = offset
+					for column, index in indexes.items():
+						keys = index.get(columns[column])
+						if keys is None:
+							index[columns[column]] = {key}
+						else:
+							keys.add(key)
+					for column, text_index in text_indexes.items():
+						text_index.add(key, columns[column])
+				offset += len(line)
+
+		table_file = _TableFile(self.file_path, offsets, data_start, indexes, superseded, text_indexes)
+		if self.key_filter:
+			self._save_key_filter(table_file)
+		return table_file
+
+	def _save_key_filter(self, table_file: _TableFile) -> None:
+		"""
+		Builds a Bloom filter of the keys in `table_file` and saves it next
+		to the table, replacing any previous one.
+		"""
+		key_filter = BloomFilter.for_capacity(max(1024, 2 * len(table_file.offsets)))
+		for key in table_file.offsets:
+			key_filter.add(key)
+		stat = os.fstat(table_file.file.fileno())
+		tmp_path = self._tmp_path()
+		with tmp_path.open("wb") as w:
+			w.write(_KEY_FILTER_HEADER.pack(
+				_KEY_FILTER_MAGIC, stat.st_ino, stat.st_size, stat.st_mtime_ns
+			))
+			w.write(key_filter.to_bytes())
+		os.replace(tmp_path, self._key_filter_path)
+		with self._key_filter_lock:
+			self._saved_key_filter = (key_filter, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+	def _read_key_filter(self) -> tuple[BloomFilter, int, int, int] | None:
+		try:
+			data = self._key_filter_path.read_bytes()
+			magic, inode, size, mtime = _KEY_FILTER_HEADER.unpack_from(data)
+			if magic != _KEY_FILTER_MAGIC:
+				return None
+			return BloomFilter.from_bytes(data[_KEY_FILTER_HEADER.size:]), inode, size, mtime
+		except (OSError, ValueError, struct.error):
+			return None
+
+	def _fresh_key_filter(self) -> BloomFilter | None:
+		"""
+		Returns the saved key filter if it reflects the current table file
+		(after catching it up with any rows appended to an append-only table
+		since it was saved), or `None` if there's no such filter. The caller
+		must hold the file lock.
+		"""
+		with self._key_filter_lock:
+			saved = self._saved_key_filter or self._read_key_filter()
+			if saved is None:
+				return None
+			key_filter, inode, size, mtime = saved
+			try:
+				stat = os.stat(self.file_path)
+			except FileNotFoundError:
+				return None
+			if stat.st_ino != inode:
+				return None
+			if stat.st_size != size or stat.st_mtime_ns != mtime:
+				if not self.append_only or stat.st_size < size:
+					return None
+				with self.file_path.open("rb") as r:
+					for _, line in _iter_lines(r.fileno(), size, stat.st_size):
+						key_filter.add(_row_key(line))
+			self._saved_key_filter = (key_filter, inode, stat.st_size, stat.st_mtime_ns)
+			return key_filter
+
+	def _is_current(self, table_file: _TableFile) -> bool:
+		try:
+			stat = os.stat(self.file_path)
+		except FileNotFoundError:
+			return False
+		return table_file.stamp == (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+	def _is_fresh(self, table_file: _TableFile | None) -> bool:
+		return (
+			table_file is not None
+			and table_file.generation == self._file_lock.generation()
+			and self._is_current(table_file)
+		)
+
+	def _refresh(self) -> _TableFile:
+		"""
+		Returns the latest version of the table file, (re)indexing it if it
+		has not been opened yet or if it was changed by another process or
+		outside of this class. The caller must hold both of the table's locks
+		in exclusive mode.
+		"""
+		table_file = self._current
+		generation = self._file_lock.generation()
+		if table_file is not None and table_file.generation == generation:
+			if self._is_current(table_file):
+				return table_file
+		elif table_file is not None and self.append_only:
+			try:
+				stat = os.stat(self.file_path)
+			except FileNotFoundError:
+				stat = None
+			if (
+				stat is not None
+				and stat.st_ino == table_file.stamp[0]
+				and stat.st_size >= table_file.size
+			):
+				self._catch_up(table_file)
+				table_file.generation = generation
+				return table_file
+		self._ensure_file()
+		replay = self.wal is not None and self.wal.open()
+		table_file = self._load()
+		table_file.generation = generation
+		self._current = table_file
+		if self.cache is not None:
+			self.cache.clear()
+		if replay:
+			table_file = self._replay(table_file)
+		return table_file
+
+	def _replay(self, table_file: _TableFile) -> _TableFile:
+		"""
+		Applies the changes left in the write-ahead log by processes that
+		exited (or crashed) without checkpointing it, then checkpoints it.
+		The caller must hold both of the table's locks in exclusive mode.
+		"""
+		assert self.wal is not None
+		changes = {
+			key: row for key, row in self.wal.read().items()
+			if row is not None or key in table_file.offsets
+		}
+		if changes:
+			self._apply(table_file, changes)
+			table_file = self._current # type: ignore
+			table_file.generation = self._file_lock.bump()
+		self._checkpoint_log(table_file)
+		return table_file
+
+	def _checkpoint_log(self, table_file: _TableFile) -> None:
+		"""
+		Syncs the table file (and the directory, in case the file was
+		replaced) to disk, then empties the write-ahead log. The caller must
+		hold both of the table's locks in exclusive mode.
+		"""
+		assert self.wal is not None
+		if self.wal.size() == 0:
+			return
+		os.fsync(table_file.file.fileno())
+		if hasattr(os, "O_DIRECTORY"):
+			directory_fd = os.open(self.file_path.parent, os.O_RDONLY | os.O_DIRECTORY)
+			try:
+				os.fsync(directory_fd)
+			finally:
+				os.close(directory_fd)
+		self.wal.truncate()
+
+	def _catch_up(self, table_file: _TableFile) -> None:
+		"""
+		Indexes the rows that another process appended to the file since it
+		was loaded.
+		"""
+		fd = table_file.file.fileno()
+		end = os.fstat(fd).st_size
+		for offset, line in table_file.lines(start = table_file.size, end = end):
+			if not line.endswith(b"\n"):
+				# A torn final append; see `_load`.
+				os.ftruncate(fd, offset)
+				break
+			key = _row_key(line)
+			if self.cache is not None:
+				self.cache.invalidate(key)
+			previous = table_file.offsets.pop(key, None)
+			if previous is not None:
+				table_file.supersede(previous, offset)
+				table_file.unindex_row(key, _read_line_at(fd, previous))
+			if self._is_tombstone(line):
+				table_file.supersede(offset, offset)
+			else:
+				table_file.offsets[key] = offset
+				table_file.index_row(key, line)
+		table_file.update_stamp()
+
+	@contextmanager
+	def _pinned(self) -> Generator[_TableFile, None, None]:
+		"""
+		Yields the latest version of the table file, holding the table's
+		locks so that no writer can change it for the duration of the
+		context. Keep the context short: reads of the version it yields can
+		continue after it ends.
+		"""
+		with self._lock.read(), self._file_lock.shared():
+			table_file = self._current
+			if self._is_fresh(table_file):
+				yield table_file # type: ignore
+				return
+		with self._lock.write(), self._file_lock.exclusive():
+			yield self._refresh()
+
+	def _snapshot(self) -> tuple[_TableFile, int]:
+		"""
+		Returns the latest version of the table file and the length it had,
+		which together make a snapshot of the table: reads of that version
+		that stop at that length see the rows that were live at that moment,
+		however long they take, whatever is written meanwhile. No lock is
+		taken unless this process has yet to pick up a change made by
+		another process (or by a write that is just finishing).
+		"""
+		table_file = self._current
+		if table_file is not None:
+			# The length is read first; if the file then turns out to be
+			# fresh, it was at least this long when it was written.
+			end = table_file.size
+			if self._is_fresh(table_file):
+				return table_file, end
+		with self._pinned() as table_file:
+			return table_file, table_file.size
+
+	@contextmanager
+	def _writing(self) -> Generator[_TableFile, None, None]:
+		"""
+		Yields the latest version of the table file while holding the
+		table's locks in exclusive mode, and bumps the generation counter
+		afterwards if the file was changed.
+		"""
+		with self._lock.write(), self._file_lock.exclusive():
+			table_file = self._refresh()
+			stamp = table_file.stamp
+			try:
+				yield table_file
+			finally:
+				if self._current is not table_file or table_file.stamp != stamp:
+					generation = self._file_lock.bump()
+					if self._current is not None:
+						self._current.generation = generation
+
+	def read_row(self, key: bytes) -> bytes | None:
+		"""
+		Returns the stored row (with its trailing newline) whose primary key
+		is exactly `key`, or `None` if there is no such row.
+		"""
+		table_file, _ = self._snapshot()
+		return table_file.read_row(key)
+
+	def read_cached(self, key: bytes, decode: Callable[[bytes], Any]) -> Any:
+		"""
+		Returns `decode(row)` for the stored row whose primary key is `key`,
+		or `None` if there is no such row. Both outcomes are cached when the
+		table has a cache, in which case the same decoded object is returned
+		until the row changes, so callers must not modify it.
+		"""
+		with self._pinned() as table_file:
+			cache = self.cache
+			if cache is None:
+				row = table_file.read_row(key)
+				return None if row is None else decode(row)
+			found, value = cache.get(key)
+			if found:
+				return value
+			row = table_file.read_row(key)
+			if row is None:
+				cache.put(key, None, 0)
+				return None
+			value = decode(row)
+			cache.put(key, value, len(row))
+			return value
+
+	def cache_info(self) -> dict[str, int] | None:
+		"""
+		Returns the statistics of the table's cache, or `None` if it has none.
+		"""
+		return None if self.cache is None else self.cache.info()
+
+	def contains(self, key: bytes) -> bool:
+		if self.key_filter and self._current is None:
+			# Try to answer from the saved key filter rather than indexing the
+			# table. The table's lock comes first, as in `_pinned`: the file
+			# lock is shared by every thread of this process, so taking it
+			# while another thread holds it exclusively would give up that
+			# thread's lock.
+			with self._lock.read(), self._file_lock.shared():
+				key_filter = self._fresh_key_filter()
+				if key_filter is not None and not key_filter.might_contain(key):
+					return False
+		table_file, _ = self._snapshot()
+		return key in table_file.offsets
+
+	def scan(self) -> Iterator[bytes]:
+		"""
+		Yields every live row in the table, in file order. Rows written after
+		the scan started are not included, and neither are changes to rows
+		made after it started (see `_snapshot`).
+		"""
+		table_file, end = self._snapshot()
+		return self._scan_file(table_file, end)
+
+	@staticmethod
+	def _scan_file(table_file: _TableFile, end: int, predicates: dict[int, bytes] | None = None) -> Iterator[bytes]:
+		"""
+		Yields the live rows of `table_file` up to the byte offset `end`
+		whose columns equal the given values (if any). The file is mapped
+		into memory and the values are compared in place, so rows that
+		don't match are never read into their own objects.
+		"""
+		start = table_file.data_start
+		if end <= start:
+			return
+		with mmap.mmap(table_file.file.fileno(), end, access = mmap.ACCESS_READ) as view:
+			lines = _map_lines(view, start, end, sorted((predicates or {}).items()))
+			# Lines superseded after the scan started are superseded by lines
+			# past `end`, so they don't change what it yields.
+			if not table_file.superseded:
+				for _, line in lines:
+					yield line
+				return
+			for offset, line in lines:
+				if table_file.is_live(offset, end):
+					yield line
+
+	def select(self, predicates: dict[int, bytes]) -> Iterator[bytes]:
+		"""
+		Yields every live row whose columns equal the given (encoded) values,
+		where `predicates` maps column positions to values, in file order.
+
+		If any of the columns is the primary key or has a secondary index,
+		only the rows those indexes point to are read. Otherwise, this scans
+		a snapshot of the table.
+		"""
+		if 0 not in predicates and not any(column in self.indexed_columns for column in predicates):
+			table_file, end = self._snapshot()
+			yield from self._scan_file(table_file, end, predicates)
+			return
+
+		with self._pinned() as table_file:
+			candidates: set[bytes] | None = None
+			if 0 in predicates:
+				candidates = {predicates[0]}
+			for column in sorted(
+				(column for column in predicates if column in table_file.indexes),
+				key = lambda column: len(table_file.indexes[column].get(predicates[column], ()))
+			):
+				keys = table_file.indexes[column].get(predicates[column], set())
+				candidates = set(keys) if candidates is None else candidates & keys
+				if not candidates:
+					return
+			offsets = table_file.offsets
+			found = sorted(
+				offset for offset in map(offsets.get, candidates or ())
+				if offset is not None
+			)
+
+		for row in (_read_line_at(table_file.file.fileno(), offset) for offset in found):
+			columns = _row_columns(row)
+			if all(
+				column < len(columns) and columns[column] == value
+				for column, value in predicates.items()
+			):
+				yield row
+
+	def select_like(
+		self,
+		patterns: dict[int, bytes],
+		skip: int = 0,
+		limit: int | None = None,
+		ranked: bool = False,
+		min_similarity: float | None = None
+	) -> Iterator[bytes]:
+		"""
+		Yields every live row whose columns loosely match (see
+		`loose_compare`) the given (encoded) search values, where `patterns`
+		maps column positions to values, in file order, or best match first
+		if `ranked` (see `rank_like`). The first `skip` matching rows are
+		left out, and at most `limit` are yielded. If `min_similarity` is
+		given, the rows only have to match fuzzily (see `fuzzy_compare`).
+
+		Search values for columns with a text index are looked up in it, so
+		only the rows it finds are read. If all of them can be, `skip` and
+		`limit` are applied to those rows before any of them are read.
+		Otherwise, this checks every row of a snapshot of the table.
+		"""
+		search_values = {column: value.decode() for column, value in patterns.items()}
+		stop = None if limit is None else skip + limit
+		if ranked:
+			yield from (row for _, row in self.rank_like(patterns, stop, None, min_similarity)[skip:])
+			return
+		if not any(column in self.text_columns for column in patterns):
+			table_file, end = self._snapshot()
+			yield from islice(
+				(
+					row for row in self._scan_file(table_file, end)
+					if loosely_matches(row, search_values, min_similarity)
+				),
+				skip,
+				stop
+			)
+			return
+
+		with self._pinned() as table_file:
+			end = table_file.size
+			candidates: set[bytes] | None = None
+			unchecked: dict[int, str] = {}
+			for column, search_value in search_values.items():
+				text_index = table_file.text_indexes.get(column)
+				keys = None if text_index is None else text_index.matches(search_value, min_similarity)
+				if keys is None:
+					unchecked[column] = search_value
+					continue
+				candidates = keys if candidates is None else candidates & keys
+			found: list[int] | None = None
+			if candidates is not None and self._reads_candidates(table_file, len(candidates), stop):
+				offsets = table_file.offsets
+				found = sorted(
+					offset for offset in map(offsets.get, candidates)
+					if offset is not None
+				)
+
+		if found is None:
+			# Either none of the search values had any words to look up, or
+			# so many rows match that reading through the file is cheaper
+			# than reading each of them on its own.
+			rows = self._scan_file(table_file, end)
+			if candidates is not None:
+				rows = (row for row in rows if _row_key(row) in candidates)
+		else:
+			if not unchecked:
+				found = found[skip:stop]
+				skip, stop = 0, None
+			rows = (_read_line_at(table_file.file.fileno(), offset) for offset in found)
+		yield from islice(
+			(row for row in rows if not unchecked or loosely_matches(row, unchecked, min_similarity)),
+			skip,
+			stop
+		)
+
+	def text_statistics(
+		self,
+		patterns: dict[int, bytes],
+		min_similarity: float | None = None
+	) -> dict[int, TextStatistics]:
+		"""
+		Returns the statistics (see `TextStatistics`) of each of the given
+		(encoded) search values that `rank_like` would score rows by.
+		"""
+		with self._pinned() as table_file:
+			return {
+				column: table_file.text_indexes[column].statistics(value.decode(), min_similarity)
+				for column, value in patterns.items()
+				if column in table_file.text_indexes and loose_words(value.decode())
+			}
+
+	def rank_like(
+		self,
+		patterns: dict[int, bytes],
+		limit: int | None = None,
+		statistics: dict[int, TextStatistics] | None = None,
+		min_similarity: float | None = None
+	) -> list[tuple[float, bytes]]:
+		"""
+		Returns the `limit` live rows (or all of them) that best match the
+		given (encoded) search values, as `select_like` would find them,
+		with their scores, best first. Rows are scored by how well they
+		match the search values of the columns with a text index (see
+		`TextIndex.scores`), against this table's `text_statistics` unless
+		others are given, and ties are broken by primary key. If none of the
+		search values could be looked up in a text index, every row scores
+		0 and they are in file order instead.
+		"""
+		search_values = {column: value.decode() for column, value in patterns.items()}
+		with self._pinned() as table_file:
+			looked_up: list[tuple[TextIndex, str, TextStatistics | None]] = []
+			unchecked: dict[int, str] = {}
+			for column, search_value in search_values.items():
+				text_index = table_file.text_indexes.get(column)
+				if text_index is None or not loose_words(search_value):
+					unchecked[column] = search_value
+				else:
+					looked_up.append((
+						text_index,
+						search_value,
+						None if statistics is None else statistics[column]
+					))
+			if looked_up:
+				# Rows that fail the unchecked search values would leave
+				# the page short, so every candidate is put in order then.
+				best = rank(looked_up, None if unchecked else limit, min_similarity)
+				offsets = table_file.offsets
+				found = [(score, offsets[key]) for score, key in best if key in offsets]
+
+		if not looked_up:
+			return [
+				(0.0, row) for row in
+				islice(self.select_like(patterns, min_similarity = min_similarity), limit)
+			]
+		rows = (
+			(score, _read_line_at(table_file.file.fileno(), offset))
+			for score, offset in found
+		)
+		return list(islice(
+			(
+				(score, row) for score, row in rows
+				if not unchecked or loosely_matches(row, unchecked, min_similarity)
+			),
+			limit
+		))
+
+	@staticmethod
+	def _reads_candidates(table_file: _TableFile, matches: int, stop: int | None) -> bool:
+		"""
+		Returns whether `select_like` should read the rows that its text
+		indexes found one at a time, rather than reading through the file and
+		skipping the others (see `_DENSE_MATCH_RATIO` and `_PAGE_SCAN_RATIO`).
+		"""
+		rows = len(table_file.offsets)
+		if stop is not None and matches * _PAGE_SCAN_RATIO >= rows:
+			return False
+		return matches * _DENSE_MATCH_RATIO < rows
+
+	def version(self) -> tuple[int, int, int] | None:
+		"""
+		Returns a value that changes whenever the table file is written, by
+		this or any other process: the file's inode, size and modification
+		time, or `None` if it doesn't exist.
+		"""
+		try:
+			stat = os.stat(self.file_path)
+		except FileNotFoundError:
+			return None
+		return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+	def changes_since(self, position: Any = None) -> tuple[Any, Any, list[bytes] | None]:
+		"""
+		Returns the table's version (see `version`), a position to pass to
+		this next time, and the keys of the rows written since `position`,
+		an earlier return of this. Something kept in memory that was loaded
+		from the table (e.g. an index) can keep the position it was loaded
+		at, then catch up with the writes made without it (e.g. by another
+		process) by reading just those rows. The keys are in the order they
+		were first written, or `None` if no position is given, or if the
+		writes since can't be told (see `ChangeLog`), in which case the
+		whole table has to be read again.
+		"""
+		with self._pinned():
+			version = self.version()
+			keys = None if position is None else self._change_log.keys_since(position, version)
+			return version, self._change_log.position(version), keys
+
+	def write(
+		self,
+		key: bytes,
+		row: bytes | None,
+		if_exists: bool | None = None,
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> bool:
+		"""
+		Stores `row` (without a trailing newline) under `key`, or deletes the
+		record with that key when `row` is `None`.
+
+		When `if_exists` is True the write only happens if the record already
+		exists, and when it is False only if it doesn't.
+
+		If the write happens and `replaced` is given, the row it replaced (or
+		`None`) is added to it under `key`. It is read while the table is
+		locked for the write, so it is exactly the row that the write
+		replaced, even if other threads or processes write the same record.
+
+		If the write happens, `committed` is called with the changes and the
+		table's versions from just before and just after them (see
+		`Committed`).
+
+		Returns:
+			bool: False if the write was skipped because of `if_exists` or
+			because there was nothing to delete, otherwise True.
+		"""
+		if self.wal is not None:
+			return self._commit(_PendingWrite(
+				{key: row}, if_exists, single = True, replaced = replaced, committed = committed
+			))
+		with self._writing() as table_file:
+			exists = key in table_file.offsets
+			if if_exists is not None and exists != if_exists:
+				return False
+			if row is None and not exists:
+				return False
+			if replaced is not None:
+				replaced[key] = table_file.read_row(key)
+			before = self.version()
+			self._apply(table_file, {key: row})
+			if committed is not None:
+				committed({key: row}, before, self.version())
+		if self.append_only:
+			self._maybe_compact()
+		return True
+
+	def write_many(
+		self,
+		changes: dict[bytes, bytes | None],
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> None:
+		"""
+		Applies several writes at once: each key is stored with its row, or
+		deleted when its row is `None`. All of the changes go into a single
+		rewrite (or a single append) of the table file, so either all of them
+		are applied or none are. `replaced` and `committed` work as with
+		`write`.
+		"""
+		if self.wal is not None:
+			self._commit(_PendingWrite(
+				changes, None, single = False, replaced = replaced, committed = committed
+			))
+			return
+		with self._writing() as table_file:
+			before = self.version()
+			changes = self._write_locked(table_file, changes, replaced)
+			if changes and committed is not None:
+				committed(changes, before, self.version())
+		if self.append_only:
+			self._maybe_compact()
+
+	def _write_locked(
+		self,
+		table_file: _TableFile,
+		changes: dict[bytes, bytes | None],
+		replaced: dict[bytes, bytes | None] | None = None
+	) -> dict[bytes, bytes | None]:
+		"""
+		Applies `changes` as `write_many` does, leaving out deletes of rows
+		that don't exist, and returns the changes that were made. The caller
+		must hold both of the table's locks in exclusive mode.
+		"""
+		changes = {
+			key: row for key, row in changes.items()
+			if row is not None or key in table_file.offsets
+		}
+		if not changes:
+			return changes
+		if replaced is not None:
+			for key in changes:
+				replaced[key] = table_file.read_row(key)
+		self._log_and_apply(table_file, changes)
+		return changes
+
+	def _commit(self, pending: _PendingWrite) -> bool:
+		"""
+		Queues a write for the next group commit, and waits for it to be
+		committed. If no group is being committed, this thread commits one
+		straight away; otherwise the thread that commits the current group
+		hands the next one to the first of the writes queued behind it.
+		"""
+		with self._commit_lock:
+			self._commit_queue.append(pending)
+			leads = not self._committing
+			self._committing = True
+		if not leads:
+			pending.done.wait()
+			leads = pending.leads
+		if leads:
+			with self._commit_lock:
+				group = self._commit_queue
+				self._commit_queue = []
+			try:
+				self._commit_group(group)
+			finally:
+				with self._commit_lock:
+					if self._commit_queue:
+						self._commit_queue[0].leads = True
+						self._commit_queue[0].done.set()
+					else:
+						self._committing = False
+		if pending.error is not None:
+			raise pending.error
+		if self.append_only:
+			self._maybe_compact()
+		return pending.result
+
+	def _commit_group(self, group: list[_PendingWrite]) -> None:
+		"""
+		Records the writes in `group` in the write-ahead log as one frame and
+		applies them to the table file together, in the order they were
+		queued, then wakes up the threads waiting for them.
+		"""
+		assert self.wal is not None
+		try:
+			with self._writing() as table_file:
+				before = self.version()
+				changes: dict[bytes, bytes | None] = {}
+
+				def exists(key: bytes) -> bool:
+					if key in changes:
+						return changes[key] is not None
+					return key in table_file.offsets
+
+				def current(key: bytes) -> bytes | None:
+					if key in changes:
+						return changes[key]
+					return table_file.read_row(key)
+
+				for pending in group:
+					for key, row in pending.changes.items():
+						if pending.single:
+							if pending.if_exists is not None and exists(key) != pending.if_exists:
+								pending.result = False
+								continue
+							if row is None and not exists(key):
+								pending.result = False
+								continue
+						if pending.replaced is not None:
+							old_row = current(key)
+							if row is not None or old_row is not None:
+								pending.replaced[key] = old_row
+						changes.pop(key, None)
+						changes[key] = row
+				changes = {
+					key: row for key, row in changes.items()
+					if row is not None or key in table_file.offsets
+				}
+				if changes:
+					self._log_and_apply(table_file, changes)
+				# The writes in the group are committed together, so the
+				# first one is said to go from `before` to the new version,
+				# and the rest to leave it alone.
+				after = self.version()
+				for pending in group:
+					if pending.committed is not None and pending.result:
+						pending.committed(pending.changes, before, after)
+						before = after
+		except BaseException as error:
+			for pending in group:
+				pending.error = error
+		finally:
+			for pending in group:
+				pending.done.set()
+		self._after_commit()
+
+	def _log_and_apply(self, table_file: _TableFile, changes: dict[bytes, bytes | None]) -> None:
+		"""
+		Records `changes` in the write-ahead log, if there is one, then
+		applies them. The caller must hold both of the table's locks in
+		exclusive mode.
+		"""
+		if self.wal is None:
+			self._apply(table_file, changes)
+			return
+		log_size = self.wal.size()
+		self.wal.append(changes)
+		try:
+			self._apply(table_file, changes)
+		except BaseException:
+			# Don't leave a change in the log that was never made.
+			self.wal.truncate(log_size)
+			raise
+
+	def _after_commit(self) -> None:
+		"""
+		Makes sure that a batched log is synced soon, and checkpoints the
+		log in the background once it is big enough.
+		"""
+		assert self.wal is not None
+		if self.wal.needs_sync() and not self._sync_scheduled:
+			self._sync_scheduled = True
+			timer = Timer(SYNC_INTERVAL, self._sync_log)
+			timer.daemon = True
+			timer.start()
+		if not self._checkpointing and self.wal.size() >= _CHECKPOINT_SIZE:
+			self._checkpointing = True
+			Thread(
+				target = self.checkpoint,
+				name = f"checkpoint-{self.file_path.stem}",
+				daemon = True
+			).start()
+
+	def _sync_log(self) -> None:
+		self._sync_scheduled = False
+		if self.wal is not None:
+			self.wal.sync()
+
+	def checkpoint(self) -> None:
+		"""
+		Syncs the table file to disk and empties its write-ahead log.
+		"""
+		try:
+			if self.wal is not None:
+				with self._writing() as table_file:
+					self._checkpoint_log(table_file)
+		finally:
+			self._checkpointing = False
+
+	def delete_where(self, predicate: Callable[[bytes], bool]) -> int:
+		"""
+		Deletes every live row for which `predicate(row)` is True with a
+		single rewrite (or append) of the table file, and returns how many
+		were deleted. The rows are checked while the table is locked for
+		writing, so no write can change a row between it being checked and
+		deleted.
+		"""
+		with self._writing() as table_file:
+			changes: dict[bytes, bytes | None] = {
+				_row_key(row): None
+				for row in self._scan_file(table_file, table_file.size)
+				if predicate(row)
+			}
+			if changes:
+				self._log_and_apply(table_file, changes)
+		if self.wal is not None:
+			self._after_commit()
+		if self.append_only:
+			self._maybe_compact()
+		return len(changes)
+
+	def _apply(self, table_file: _TableFile, changes: dict[bytes, bytes | None]) -> None:
+		before = self.version()
+		if self.append_only:
+			self._append(table_file, changes)
+		else:
+			self._rewrite(table_file, changes)
+		if self.cache is not None:
+			for key in changes:
+				self.cache.invalidate(key)
+		self._change_log.append(before, self.version(), changes)
+
+	def _append(self, table_file: _TableFile, changes: dict[bytes, bytes | None]) -> None:
+		"""
+		Appends new row versions and tombstones for `changes` to the end of
+		the file in a single write.
+		"""
+		old_rows = self._old_rows(table_file, changes)
+		data = b"".join(
+			row + b"\n" if row is not None else self._tombstone(key)
+			for key, row in changes.items()
+		)
+		fd = table_file.file.fileno()
+		written = 0
+		try:
+			while written < len(data):
+				written += os.pwrite(fd, data[written:], table_file.size + written)
+		except BaseException:
+			# Don't leave part of the changes behind.
+			os.ftruncate(fd, table_file.size)
+			raise
+		self._update_indexes(table_file, changes, old_rows)
+
+		offset = table_file.size
+		for key, row in changes.items():
+			previous = table_file.offsets.pop(key, None)
+			if previous is not None:
+				table_file.supersede(previous, offset)
+			if row is not None:
+				table_file.offsets[key] = offset
+				offset += len(row) + 1
+			else:
+				table_file.supersede(offset, offset)
+				offset += len(key) + self._columns + 1
+		table_file.update_stamp()
+
+	def _rewrite(self, table_file: _TableFile, changes: dict[bytes, bytes | None]) -> None:
+		"""
+		Writes a new version of the table file with `changes` applied, then
+		atomically replaces the old one. Unchanged rows are copied byte for
+		byte in bulk rather than line by line.
+		"""
+		fd = table_file.file.fileno()
+		old_rows = self._old_rows(table_file, changes)
+		replaced: list[tuple[int, int, bytes | None]] = [
+			(table_file.offsets[key], len(old_row), changes[key])
+			for key, old_row in old_rows.items()
+		]
+		replaced.sort(key = lambda change: change[0])
+
+		tmp_path = self._tmp_path()
+		out_fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+		try:
+			position = 0
+			for offset, old_length, row in replaced:
+				_copy_range(fd, out_fd, position, offset)
+				if row is not None:
+					os.write(out_fd, row + b"\n")
+				position = offset + old_length
+			_copy_range(fd, out_fd, position, table_file.size)
+			for key, row in changes.items():
+				if row is not None and key not in table_file.offsets:
+					os.write(out_fd, row + b"\n")
+		except BaseException:
+			os.close(out_fd)
+			os.unlink(tmp_path)
+			raise
+		os.close(out_fd)
+
+		offsets = self._shift_offsets(table_file, changes, replaced)
+		new_file = _TableFile(
+			tmp_path,
+			offsets,
+			table_file.data_start,
+			table_file.indexes,
+			self._shift_superseded(table_file, replaced),
+			table_file.text_indexes
+		)
+		os.replace(tmp_path, self.file_path)
+		self._update_indexes(new_file, changes, old_rows)
+		self._current = new_file
+
+	@staticmethod
+	def _old_rows(table_file: _TableFile, changes: dict[bytes, bytes | None]) -> dict[bytes, bytes]:
+		"""
+		Reads the currently stored version of each row in `changes`.
+		"""
+		old_rows: dict[bytes, bytes] = {}
+		for key in changes:
+			old_row = table_file.read_row(key)
+			if old_row is not None:
+				old_rows[key] = old_row
+		return old_rows
+
+	@staticmethod
+	def _update_indexes(
+		table_file: _TableFile,
+		changes: dict[bytes, bytes | None],
+		old_rows: dict[bytes, bytes]
+	) -> None:
+		for key, row in changes.items():
+			old_row = old_rows.get(key)
+			if old_row is not None:
+				table_file.unindex_row(key, old_row)
+			if row is not None:
+				table_file.index_row(key, row)
+
+	@staticmethod
+	def _shift_offsets(
+		table_file: _TableFile,
+		changes: dict[bytes, bytes | None],
+		replaced: list[tuple[int, int, bytes | None]]
+	) -> dict[bytes, int]:
+		"""
+		Computes the offsets of the rewritten file from those of the old one.
+		This relies on the offsets dict being in file order, which holds
+		because keys are inserted in file order and new rows are appended.
+		"""
+		if all(row is not None and len(row) + 1 == old_length for _, old_length, row in replaced):
+			offsets = table_file.offsets.copy()
+		else:
+			old_lengths = {offset: old_length for offset, old_length, _ in replaced}
+			offsets = {}
+			shift = 0
+			for key, offset in table_file.offsets.items():
+				if key in changes:
+					row = changes[key]
+					old_length = old_lengths[offset]
+					if row is not None:
+						offsets[key] = offset + shift
+						shift += len(row) + 1 - old_length
+					else:
+						shift -= old_length
+				else:
+					offsets[key] = offset + shift
+
+		end = table_file.size + sum(
+			(len(row) + 1 if row is not None else 0) - old_length
+			for _, old_length, row in replaced
+		)
+		for key, row in changes.items():
+			if row is not None and key not in table_file.offsets:
+				offsets[key] = end
+				end += len(row) + 1
+		return offsets
+
+	@staticmethod
+	def _shift_superseded(
+		table_file: _TableFile,
+		replaced: list[tuple[int, int, bytes | None]]
+	) -> dict[int, int]:
+		"""
+		Computes where the dead lines of the old file (which a rewrite copies
+		along with the live ones) are in the rewritten file. In the new file
+		they are all dead from the start, so each supersedes itself.
+		"""
+		if not table_file.superseded:
+			return {}
+		starts = [offset for offset, _, _ in replaced]
+		shifts = [0]
+		for _, old_length, row in replaced:
+			shifts.append(shifts[-1] + (len(row) + 1 if row is not None else 0) - old_length)
+		superseded: dict[int, int] = {}
+		for offset in table_file.superseded:
+			new_offset = offset + shifts[bisect_right(starts, offset)]
+			superseded[new_offset] = new_offset
+		return superseded
+
+	def _tmp_path(self) -> Path:
+		return self.file_path.with_name(
+			f"tmp_{self.file_path.stem}_{uuid.uuid4().hex}"
+		)
+
+	def needs_compaction(self) -> bool:
+		table_file = self._current
+		if table_file is None or table_file.dead_rows == 0:
+			return False
+		total_rows = table_file.dead_rows + len(table_file.offsets)
+		return table_file.dead_rows >= self.garbage_ratio * total_rows
+
+	def _claim_compaction(self) -> bool:
+		with self._compaction_lock:
+			if self._compacting:
+				return False
+			self._compacting = True
+			return True
+
+	def _maybe_compact(self) -> None:
+		if self._compacting or not self.needs_compaction():
+			return
+		if not self._claim_compaction():
+			return
+		Thread(
+			target = self._compact,
+			name = f"compact-{self.file_path.stem}",
+			daemon = True
+		).start()
+
+	def compact(self) -> None:
+		"""
+		Rewrites the table file without superseded rows and tombstones. This
+		does nothing if a compaction is already running.
+		"""
+		if self._claim_compaction():
+			self._compact()
+
+	def _compact(self) -> None:
+		"""
+		Live rows are copied without holding the write lock; only the rows
+		appended while that copy was running are copied under the lock,
+		just before the new file replaces the old one.
+		"""
+		try:
+			with self._pinned() as table_file:
+				if table_file.dead_rows == 0:
+					return
+				live = table_file.offsets.copy()
+				end = table_file.size
+
+			tmp_path = self._tmp_path()
+			offsets: dict[bytes, int] = {}
+			with tmp_path.open("wb") as w:
+				w.write(_read_line_at(table_file.file.fileno(), 0))
+				position = table_file.data_start
+				for offset, line in table_file.lines(end = end):
+					key = _row_key(line)
+					if live.get(key) == offset:
+						w.write(line)
+						offsets[key] = position
+						position += len(line)
+
+				with self._writing():
+					if self._current is not table_file or self._refresh() is not table_file:
+						# The table was dropped or replaced in the meantime.
+						w.close()
+						tmp_path.unlink()
+						return
+					superseded: dict[int, int] = {}
+					for _, line in table_file.lines(start = end):
+						key = _row_key(line)
+						w.write(line)
+						previous = offsets.pop(key, None)
+						if previous is not None:
+							superseded[previous] = position
+						if self._is_tombstone(line):
+							superseded[position] = position
+						else:
+							offsets[key] = position
+						position += len(line)
+					w.close()
+					compacted = _TableFile(
+						tmp_path,
+						offsets,
+						table_file.data_start,
+						table_file.indexes,
+						superseded,
+						table_file.text_indexes
+					)
+					before = self.version()
+					os.replace(tmp_path, self.file_path)
+					self._current = compacted
+					# No row changed, but the version did.
+					self._change_log.append(before, self.version(), ())
+		finally:
+			self._compacting = False
+
+	def drop(self) -> None:
+		"""
+		Deletes the table file and forgets its index.
+		"""
+		with self._writing():
+			self.file_path.unlink(missing_ok = True)
+			self._key_filter_path.unlink(missing_ok = True)
+			self._change_log.clear()
+			if self.wal is not None:
+				self.wal.truncate()
+			self._current = None
+			self._saved_key_filter = None
+			if self.cache is not None:
+				self.cache.clear()
@@ -0,0 +1,66 @@
+import logging
+import os
+from threading import Event, Thread
+
+from db.persisted_model import PersistedModel
+
+_logger = logging.getLogger(__name__)
+
+def _interval_from_env() -> float:
+	raw = os.getenv("TTL_SWEEP_INTERVAL")
+	if not raw:
+		return 300.0
+	try:
+		value = float(raw)
+		return value if value > 0 else 300.0
+	except ValueError:
+		return 300.0
+
+class ExpirySweeper:
+	"""
+	A background thread that deletes the expired records of each of the
+	given models (see `PersistedModel.ttl_field`) every `interval` seconds,
+	with one rewrite (or append) of each table. Lookups already ignore
+	expired records, so this only keeps the tables from growing forever.
+
+	The interval is set by the `TTL_SWEEP_INTERVAL` environment variable
+	(300 seconds by default). Several processes may each run a sweeper on
+	the same tables; whichever runs second finds nothing left to delete.
+	"""
+
+	def __init__(self, models: list[type[PersistedModel]], interval: float | None = None) -> None:
+		self.models = models
+		self.interval = _interval_from_env() if interval is None else interval
+		self._stopped = Event()
+		self._thread: Thread | None = None
+
+	def sweep(self) -> dict[str, int]:
+		"""
+		Deletes the expired records of every model now, and returns how many
+		were deleted from each. A model whose sweep fails is skipped until
+		the next one.
+		"""
+		deleted: dict[str, int] = {}
+		for model in self.models:
+			try:
+				deleted[model.__name__] = model.delete_expired()
+			except Exception:
+				_logger.exception("Failed to delete the expired records of %s", model.__name__)
+		return deleted
+
+	def _run(self) -> None:
+		while not self._stopped.wait(self.interval):
+			self.sweep()
+
+	def start(self) -> None:
+		if self._thread is not None:
+			return
+		self._stopped.clear()
+		self._thread = Thread(target = self._run, name = "expiry-sweeper", daemon = True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		self._stopped.set()
+		if self._thread is not None:
+			self._thread.join()
+			self._thread = None
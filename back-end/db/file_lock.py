@@ -0,0 +1,119 @@
+from contextlib import contextmanager
+import os
+from pathlib import Path
+from threading import Condition, Lock
+from typing import Generator
+
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+class FileLock:
+	"""
+	An advisory lock shared by every process that opens the same lock file,
+	which also stores a generation counter that writers bump each time they
+	change the file the lock protects. Other processes compare the counter
+	with the one they last saw to find out, with a single 8-byte read,
+	whether anything they have cached about that file is out of date.
+
+	Any number of threads in this process may hold the lock in shared mode
+	at once; the underlying `flock` is taken by the first of them and
+	released by the last. Exclusive mode must only be taken by one thread
+	at a time, e.g. while holding a `ReadWriteLock` in write mode.
+
+	Where `fcntl` is not available, the lock does nothing and only a single
+	process may use the files safely.
+	"""
+
+	def __init__(self, path: Path) -> None:
+		self.path = path
+		self._fd: int | None = None
+		self._condition = Condition(Lock())
+		self._shared = 0
+		"""
+		The number of threads holding the lock in shared mode.
+		"""
+		self._acquiring = False
+		"""
+		Whether a thread is waiting for the shared `flock`, which it takes
+		without holding `_condition`, so that threads releasing the lock
+		(or checking it out) don't queue up behind it.
+		"""
+
+	def _fileno(self) -> int:
+		if self._fd is None:
+			self.path.parent.mkdir(
+				parents = True,
+				exist_ok = True,
+			)
+			fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+			with self._condition:
+				if self._fd is None:
+					self._fd = fd
+				else:
+					os.close(fd)
+		return self._fd # type: ignore
+
+	@contextmanager
+	def shared(self) -> Generator[None, None, None]:
+		"""
+		Holds the lock in shared mode for the duration of the context.
+		"""
+		fd = self._fileno()
+		with self._condition:
+			while self._acquiring:
+				self._condition.wait()
+			acquire = self._shared == 0 and fcntl is not None
+			if acquire:
+				self._acquiring = True
+			else:
+				self._shared += 1
+		if acquire:
+			try:
+				fcntl.flock(fd, fcntl.LOCK_SH) # type: ignore
+			except BaseException:
+				with self._condition:
+					self._acquiring = False
+					self._condition.notify_all()
+				raise
+			with self._condition:
+				self._acquiring = False
+				self._shared += 1
+				self._condition.notify_all()
+		try:
+			yield
+		finally:
+			with self._condition:
+				self._shared -= 1
+				if self._shared == 0 and fcntl is not None:
+					fcntl.flock(fd, fcntl.LOCK_UN)
+
+	@contextmanager
+	def exclusive(self) -> Generator[None, None, None]:
+		"""
+		Holds the lock in exclusive mode for the duration of the context.
+		"""
+		fd = self._fileno()
+		if fcntl is not None:
+			fcntl.flock(fd, fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			if fcntl is not None:
+				fcntl.flock(fd, fcntl.LOCK_UN)
+
+	def generation(self) -> int:
+		"""
+		Returns the current value of the generation counter.
+		"""
+		return int.from_bytes(os.pread(self._fileno(), 8, 0), "little")
+
+	def bump(self) -> int:
+		"""
+		Increments the generation counter and returns its new value. The lock
+		must be held in exclusive mode.
+		"""
+		generation = self.generation() + 1
+		os.pwrite(self._fileno(), generation.to_bytes(8, "little"), 0)
+		return generation
@@ -0,0 +1,225 @@
+from bisect import bisect_left, bisect_right, insort
+from functools import partial
+from heapq import nsmallest
+from itertools import islice
+from operator import itemgetter
+from threading import Lock
+from typing import Any, Callable, Hashable, Iterable, Sequence
+
+_NO_KEYS: frozenset[Hashable] = frozenset()
+
+def normalize(value: Any) -> Any:
+	"""
+	Returns the form of a value that `FilterIndex` stores and looks up:
+	strings are case folded, with their runs of whitespace collapsed into
+	single spaces, and anything else is left alone.
+	"""
+	if isinstance(value, str):
+		return " ".join(value.casefold().split())
+	return value
+
+def _elements(value: Any) -> tuple[Any, ...]:
+	"""
+	Returns the distinct (normalized) values that a record with `value` in
+	a set field has: the elements of a list, or the value itself.
+	"""
+	if value is None:
+		return ()
+	if isinstance(value, (list, tuple, set)):
+		if len(value) == 1:
+			return (normalize(next(iter(value))),)
+		return tuple(dict.fromkeys(map(normalize, value)))
+	return (normalize(value),)
+
+class FilterIndex:
+	"""
+	In-memory indexes over some of the fields of a model's records, for
+	finding the records that pass several filters at once without reading
+	any of the others.
+
+	Each of the `set_fields` maps each value it has (see `normalize`) to the
+	keys of the records that have it; a field holding a list, such as a
+	book's authors, counts as having each of its elements. Each of the
+	`range_fields` keeps the records that have a number in it sorted by that
+	number, so the records in a range are a slice of it, found by binary
+	search.
+
+	`find` intersects the records that pass each filter, starting from the
+	fewest, so it takes time in proportion to the number of records that
+	pass the most selective filter rather than to the number of records.
+	Records keep the position they were added at, as rows do in a table
+	file, so that `find` can return them in the same order as the table.
+
+	Nothing here is thread safe; hold `lock` while using it.
+	"""
+
+	def __init__(self, set_fields: tuple[str, ...], range_fields: tuple[str, ...]) -> None:
+		self.set_fields = set_fields
+		self.range_fields = range_fields
+		self.sets: dict[str, dict[Hashable, set[Hashable]]] = {field: {} for field in set_fields}
+		self.ranges: dict[str, list[tuple[float, Hashable]]] = {field: [] for field in range_fields}
+		"""
+		The `(value, key)` of each record with a value in each range field,
+		in order.
+		"""
+		self.records: dict[Hashable, tuple[tuple[Any, ...], tuple[float | None, ...]]] = {}
+		"""
+		The indexed values of each record: its (normalized) values for each
+		set field, and its value for each range field.
+		"""
+		self.positions: dict[Hashable, int] = {}
+		"""
+		The order that the records were added in.
+		"""
+		self._next_position = 0
+		self.versions: dict[str, Any] = {}
+		"""
+		The versions (see `PersistedModel.table_version`) of the tables that
+		the index reflects, as of its last change, for the owner to tell
+		whether it's still current; empty until it's been loaded.
+		"""
+		self.table_positions: dict[str, Any] = {}
+		"""
+		The positions in the tables' change logs that the index was last
+		loaded or caught up at, for the owner to catch up with the writes
+		made since (see `PersistedModel._changes_since`).
+		"""
+		self.lock = Lock()
+
+	@property
+	def fields(self) -> tuple[str, ...]:
+		"""
+		The indexed fields, in the order that records give their values in.
+		"""
+		return self.set_fields + self.range_fields
+
+	def _indexed(self, values: Sequence[Any]) -> tuple[tuple[Any, ...], tuple[float | None, ...]]:
+		split = len(self.set_fields)
+		return tuple(map(_elements, values[:split])), tuple(values[split:])
+
+	def load(self, records: Iterable[tuple[Hashable, Sequence[Any]]]) -> None:
+		"""
+		Replaces the contents of the index with the given `(key, values)`
+		records, where `values` are the record's values of `fields`.
+		"""
+		self.sets = {field: {} for field in self.set_fields}
+		self.records = {}
+		self.positions = {}
+		ranges: dict[str, list[tuple[float, Hashable]]] = {field: [] for field in self.range_fields}
+		set_indexes = [self.sets[field] for field in self.set_fields]
+		range_entries = [ranges[field] for field in self.range_fields]
+		for key, values in records:
+			indexed = self._indexed(values)
+			self.records[key] = indexed
+			self.positions[key] = len(self.positions)
+			for index, elements in zip(set_indexes, indexed[0]):
+				for element in elements:
+					keys = index.get(element)
+					if keys is None:
+						index[element] = {key}
+					else:
+						keys.add(key)
+			for entries, value in zip(range_entries, indexed[1]):
+				if value is not None:
+					entries.append((value, key))
+		for entries in range_entries:
+			entries.sort()
+		self.ranges = ranges
+		self._next_position = len(self.positions)
+
+	def set(self, key: Hashable, values: Sequence[Any] | None) -> None:
+		"""
+		Replaces the values of `fields` of the record with the given key;
+		`None` removes it. A record that is added goes after the others.
+		"""
+		old = self.records.get(key)
+		new = None if values is None else self._indexed(values)
+		if new is None:
+			self.records.pop(key, None)
+			self.positions.pop(key, None)
+		else:
+			self.records[key] = new
+			if old is None:
+				self.positions[key] = self._next_position
+				self._next_position += 1
+		if old == new:
+			return
+
+		for i, field in enumerate(self.set_fields):
+			old_elements = () if old is None else old[0][i]
+			new_elements = () if new is None else new[0][i]
+			index = self.sets[field]
+			for element in old_elements:
+				if element not in new_elements:
+					keys = index[element]
+					keys.discard(key)
+					if not keys:
+						del index[element]
+			for element in new_elements:
+				if element not in old_elements:
+					index.setdefault(element, set()).add(key)
+		for i, field in enumerate(self.range_fields):
+			old_value = None if old is None else old[1][i]
+			new_value = None if new is None else new[1][i]
+			if old_value == new_value:
+				continue
+			entries = self.ranges[field]
+			if old_value is not None:
+				del entries[bisect_left(entries, (old_value, key))]
+			if new_value is not None:
+				insort(entries, (new_value, key))
+
+	def _in_range(self, field: str, low: float | None, high: float | None) -> tuple[int, int]:
+		"""
+		Returns the slice of `ranges[field]` with values from `low` to `high`,
+		inclusive (either of which may be `None`, for no bound).
+		"""
+		entries = self.ranges[field]
+		start = 0 if low is None else bisect_left(entries, low, key = itemgetter(0))
+		end = len(entries) if high is None else bisect_right(entries, high, key = itemgetter(0))
+		return start, max(start, end)
+
+	def _between(self, position: int, low: float | None, high: float | None, key: Hashable) -> bool:
+		value = self.records[key][1][position]
+		return value is not None and (low is None or value >= low) and (high is None or value <= high)
+
+	def find(
+		self,
+		equal: dict[str, Any],
+		ranges: dict[str, tuple[float | None, float | None]],
+		limit: int | None = None
+	) -> list[Hashable]:
+		"""
+		Returns the keys of the records that have each value in `equal` (or,
+		for a list field, have it as an element), and whose value of each
+		field in `ranges` is between its `(low, high)` bounds, inclusive. At
+		most `limit` are returned, in the order they were added.
+
+		The records that pass the most selective filter are checked against
+		the others.
+		"""
+		if limit is not None and limit <= 0:
+			return []
+		filters: list[tuple[int, Iterable[Hashable], Callable[[Hashable], bool]]] = []
+		for field, value in equal.items():
+			keys = self.sets[field].get(normalize(value), _NO_KEYS)
+			filters.append((len(keys), keys, keys.__contains__))
+		for field, (low, high) in ranges.items():
+			start, end = self._in_range(field, low, high)
+			filters.append((
+				end - start,
+				map(itemgetter(1), self.ranges[field][start:end]),
+				partial(self._between, self.range_fields.index(field), low, high)
+			))
+		filters.sort(key = itemgetter(0))
+
+		if not filters:
+			# The records are kept in the order they were added.
+			return list(islice(self.records, limit))
+		_, keys, _ = filters[0]
+		checks = [check for _, _, check in filters[1:]]
+		if checks:
+			keys = (key for key in keys if all(check(key) for check in checks))
+		if limit is None:
+			return sorted(keys, key = self.positions.__getitem__)
+		return nsmallest(limit, keys, key = self.positions.__getitem__)
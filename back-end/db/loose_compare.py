@@ -1,5 +1,14 @@
 import re
 
+_WORD = re.compile(r'\b\w+\b')
+
+def loose_words(string: str) -> list[str]:
+    """
+    Splits an (already lowercased) string into the words that `loose_compare`
+    compares, i.e. its runs of word characters.
+    """
+    return _WORD.findall(string)
+
 def loose_compare(main_string: str, search_string: str) -> bool:
     """
     Check if search_string is loosely contained in main_string.
@@ -22,8 +31,8 @@ def loose_compare(main_string: str, search_string: str) -> bool:
         return True
     
     # Extract words from both strings
-    main_words = re.findall(r'\b\w+\b', main_lower)
-    search_words = re.findall(r'\b\w+\b', search_lower)
+    main_words = loose_words(main_lower)
+    search_words = loose_words(search_lower)
     
     # All distinct words from `search_string` are in `main_string`
     if search_words:
@@ -39,3 +48,53 @@ def loose_compare(main_string: str, search_string: str) -> bool:
             return False
         
     return bool(search_words)
+
+def trigrams(word: str) -> set[str]:
+    """
+    Returns the runs of three characters in a word, padded (as PostgreSQL's
+    pg_trgm does) so that its start and end count as well: the trigrams of
+    "cat" are "  c", " ca", "cat" and "at ".
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def similarity(word_1: str, word_2: str) -> float:
+    """
+    Returns how similar two words are, from 0 to 1: the share of all of
+    their trigrams that they have in common.
+    """
+    trigrams_1, trigrams_2 = trigrams(word_1), trigrams(word_2)
+    return len(trigrams_1 & trigrams_2) / len(trigrams_1 | trigrams_2)
+
+def fuzzy_compare(main_string: str, search_string: str, min_similarity: float) -> bool:
+    """
+    Check if search_string is loosely contained in main_string (see
+    `loose_compare`), allowing for misspellings: each word of search_string
+    can also be matched by a word of main_string that is at least
+    `min_similarity` similar to it (see `similarity`).
+    """
+    if loose_compare(main_string, search_string):
+        return True
+    main_words = set(loose_words(main_string.lower()))
+    search_words = set(loose_words(search_string.lower()))
+    return bool(search_words) and all(
+        any(word in main_word or similarity(word, main_word) >= min_similarity for main_word in main_words)
+        for word in search_words
+    )
+
+def loosely_matches(line: bytes, patterns: dict[int, str], min_similarity: float | None = None) -> bool:
+    """
+    Checks whether each column of a stored row (see `CsvTable`) that has a
+    search value in `patterns` loosely matches it (see `loose_compare`), or,
+    if `min_similarity` is given, fuzzily matches it (see `fuzzy_compare`).
+    """
+    columns = line.decode("latin-1").removesuffix("\n").split(",")
+    if min_similarity is not None:
+        return all(
+            column >= len(columns) or fuzzy_compare(columns[column], value, min_similarity)
+            for column, value in patterns.items()
+        )
+    return all(
+        column >= len(columns) or loose_compare(columns[column], value)
+        for column, value in patterns.items()
+    )
@@ -1,6 +1,9 @@
 from db.persisted_model import PersistedModel
+from db.password_executor import run_in_password_executor
+from db.storage_executor import run_in_storage_executor
+from db.write_behind import WriteBehind
 from pydantic import EmailStr
-from typing import Self
+from typing import ClassVar, Self
 from secrets import token_urlsafe
 from fastapi import Request, Response
 from time import time_ns
@@ -12,17 +15,32 @@ password_hasher = argon2.PasswordHasher()
 ADMIN_TOKEN_NAME = "fubar_admin_session"
 TOKEN_DURATION_NS: int = 7 * 24 * 60 * 60 * (10 ** 9)
 TOKEN_MAX_DURATION_NS: int = 30 * 24 * 60 * 60 * (10 ** 9)
+TOKEN_RENEW_THRESHOLD_NS: int = TOKEN_DURATION_NS - 24 * 60 * 60 * (10 ** 9)
 TESTING = (os.getenv("TESTING") == "1")
 
 class AdminSession(PersistedModel):
+    append_only: ClassVar[bool] = True
+    write_ahead_log: ClassVar[bool] = True
+    ttl_field: ClassVar[str | None] = "expiration_timestamp"
+    ttl_field_unit: ClassVar[float] = 1e-9
+    cache_max_entries: ClassVar[int] = 1024
+
     session_id: str
     admin_id: str
     original_creation_timestamp: int
     expiration_timestamp: int
 
     def renew(self) -> None:
-        self.expiration_timestamp = time_ns() + TOKEN_DURATION_NS
-        self.put()
+        # See `UserSession.renew`.
+        now = time_ns()
+        if self.expiration_timestamp - now >= TOKEN_RENEW_THRESHOLD_NS:
+            return
+        self.expiration_timestamp = now + TOKEN_DURATION_NS
+        admin_session_renewals.patch(self)
+
+    def delete(self) -> None:
+        admin_session_renewals.discard(self.session_id)
+        super().delete()
 
     def is_expired(self) -> bool:
         return self.expiration_timestamp < time_ns() or \
@@ -34,7 +52,7 @@ class AdminSession(PersistedModel):
         if token is None:
             return None
 
-        session = cls.get_by_primary_key(token)
+        session = admin_session_renewals.get(token) or cls.get_by_primary_key(token)
         if session is None:
             return None
         if session.is_expired():
@@ -43,8 +61,17 @@ class AdminSession(PersistedModel):
 
         return session
 
+    @classmethod
+    async def afrom_request(cls, req: Request) -> Self | None:
+        return await run_in_storage_executor(cls.from_request, req)
+
+
+admin_session_renewals: WriteBehind[AdminSession] = WriteBehind(AdminSession)
+
 
 class AdminUser(PersistedModel):
+    indexed_fields: ClassVar[tuple[str, ...]] = ("email",)
+
     id: str
     display_name: str
     email: EmailStr
@@ -72,6 +99,13 @@ class AdminUser(PersistedModel):
             return self.password == raw_password
         return False
 
+    @classmethod
+    async def ahash_password(cls, raw_password: str) -> str:
+        return await run_in_password_executor(cls.hash_password, raw_password)
+
+    async def averify_password(self, raw_password: str) -> bool:
+        return await run_in_password_executor(self.verify_password, raw_password)
+
     @classmethod
     def from_session(cls, req: Request) -> Self | None:
         session = AdminSession.from_request(req)
@@ -86,6 +120,10 @@ class AdminUser(PersistedModel):
         session.renew()
         return admin
 
+    @classmethod
+    async def afrom_session(cls, req: Request) -> Self | None:
+        return await run_in_storage_executor(cls.from_session, req)
+
     def create_session(self, resp: Response) -> None:
         new_token = token_urlsafe(64)
         AdminSession(
@@ -1,9 +1,13 @@
 from datetime import datetime, UTC
+from typing import ClassVar
 from pydantic import Field
 from db.persisted_model import PersistedModel
 
 
 class AuditLog(PersistedModel):
+    append_only: ClassVar[bool] = True
+    key_filter: ClassVar[bool] = True
+
     id: str
     admin_id: str
     action: str
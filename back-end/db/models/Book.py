@@ -1,13 +1,17 @@
-from collections import OrderedDict
-from threading import RLock
-from typing import ClassVar, Dict, Optional
+from typing import Any, ClassVar, Dict, Optional
 import httpx
 import uuid
 import os
+from threading import Lock
 from dotenv import load_dotenv
 
+from db.encode_str import decode_str
+from db.filter_index import FilterIndex
+from db.loose_compare import loose_words
 from db.persisted_model import PersistedModel
 from db.models.BookMetadataCache import BookMetadataCache
+from db.storage_executor import run_in_storage_executor
+from db.term_dictionary import TermDictionary
 
 
 def _cache_limit_from_env() -> int:
@@ -23,6 +27,29 @@ def _cache_limit_from_env() -> int:
 # Load local .env if present (safe no-op if not)
 load_dotenv()
 
+title_terms = TermDictionary()
+"""
+The words of every book's title, weighted by the books' review counts, for
+`GET /search/suggest` (see `db.suggest`). It is loaded when first used, and
+kept up to date as books (here) and ratings (see `BookRating`) are written.
+"""
+
+book_filters = FilterIndex(
+    set_fields=("authors", "categories", "year"),
+    range_fields=("average_rating",),
+)
+"""
+The authors, categories, years and average ratings of every book, by id,
+for `Book.get_filtered`. It is loaded when first used, and kept up to date
+as books are written.
+"""
+
+_filters_catching_up = Lock()
+"""
+Held while `book_filters` is loaded or caught up with the table (see
+`Book._catch_up_filters`), so that it's only done once at a time.
+"""
+
 class Book(PersistedModel):
     id: str
     title: str
@@ -31,75 +58,132 @@ class Book(PersistedModel):
     description: str | None = None
     imageLinks: Dict[str, str] | None = None  # e.g. {"thumbnail": "http://..."}
     average_rating: float | None = None
+    year: int | None = None
 
-    # _cache_lock: ClassVar[RLock] = RLock()
-    # _cache: ClassVar[OrderedDict[str, "Book | None"]] = OrderedDict()
-    # _cache_hits: ClassVar[int] = 0
-    # _cache_misses: ClassVar[int] = 0
-    # _cache_max_entries: ClassVar[int] = _cache_limit_from_env()
+    text_indexed_fields: ClassVar[tuple[str, ...]] = ("title",)
+    cache_max_entries: ClassVar[int] = _cache_limit_from_env()
 
-    # @classmethod
-    # def _cache_remember(cls, key: str, value: "Book | None") -> None:
-    #     with cls._cache_lock:
-    #         cls._cache[key] = value
-    #         cls._cache.move_to_end(key)
-    #         if len(cls._cache) > cls._cache_max_entries:
-    #             cls._cache.popitem(last=False)
+    @classmethod
+    def title_words(cls, row: bytes) -> list[str]:
+        """
+        Returns the words of the title in a row of the table, as kept in
+        `title_terms`.
+        """
+        title = cls._projector(("title",))(row.decode("latin-1"))[0]
+        return loose_words(title.lower())
 
-    # @classmethod
-    # def _cache_evict(cls, key: str) -> None:
-    #     with cls._cache_lock:
-    #         cls._cache.pop(key, None)
+    @classmethod
+    def _committed(cls, changes: dict[bytes, bytes | None], before: Any, after: Any) -> None:
+        """
+        Applies the written `changes` to `title_terms` and `book_filters`, if
+        they were up to date with the table (at version `before`). Otherwise
+        they are reloaded when next used.
+        """
+        with title_terms.lock:
+            if title_terms.versions.get("Book") == before:
+                for key, row in changes.items():
+                    title_terms.set(key, () if row is None else cls.title_words(row))
+                title_terms.versions["Book"] = after
+        with book_filters.lock:
+            if book_filters.versions.get("Book") == before:
+                for key, row in changes.items():
+                    book_filters.set(*cls._filter_record(key, row))
+                book_filters.versions["Book"] = after
 
-    # @classmethod
-    # def clear_cache(cls) -> None:
-    #     with cls._cache_lock:
-    #         cls._cache.clear()
-    #         cls._cache_hits = 0
-    #         cls._cache_misses = 0
+    @classmethod
+    def _filter_record(cls, key: bytes, row: bytes | None) -> tuple[str, list[Any] | None]:
+        """
+        Returns the id of the book with the given key, and its values of
+        `book_filters.fields` from `row` (`None` if it was deleted).
+        """
+        if row is None:
+            return decode_str(key.decode()), None
+        book_id, *values = cls._projector(("id",) + book_filters.fields)(row.decode("latin-1"))
+        return book_id, values
 
-    # @classmethod
-    # def get_by_primary_key(cls, search_key: str):
-    #     with cls._cache_lock:
-    #         if search_key in cls._cache:
-    #             cls._cache_hits += 1
-    #             value = cls._cache[search_key]
-    #             cls._cache.move_to_end(search_key)
-    #             return value
-
-    #     record = super().get_by_primary_key(search_key)
-    #     cls._cache_misses += 1
-    #     cls._cache_remember(search_key, record)
-    #     return record
+    @classmethod
+    def _catch_up_filters(cls) -> None:
+        """
+        Loads `book_filters` when it's first used, and afterwards catches it
+        up with the books that were written without it (e.g. by another
+        process), if any. Only the rows that those writes changed are read
+        and decoded (see `PersistedModel._changes_since`), so e.g. another
+        process writing new average ratings doesn't make it reload every
+        book.
 
-    # @classmethod
-    # def cache_info(cls) -> Dict[str, int]:
-    #     with cls._cache_lock:
-    #         return {
-    #             "entries": len(cls._cache),
-    #             "hits": cls._cache_hits,
-    #             "misses": cls._cache_misses,
-    #             "max_entries": cls._cache_max_entries,
-    #         }
-
-    # def post(self) -> bool:
-    #     created = super().post()
-    #     if created:
-    #         self.__class__._cache_remember(self.id, self)
-    #     return created
-
-    # def put(self) -> None:
-    #     super().put()
-    #     self.__class__._cache_remember(self.id, self)
-
-    # def delete(self) -> None:
-    #     super().delete()
-    #     self.__class__._cache_evict(self.id)
+        The table is read without holding the index's lock, since writes
+        take that lock while the table is locked (see `_committed`).
+        """
+        with _filters_catching_up:
+            version = cls.table_version()
+            with book_filters.lock:
+                if book_filters.versions.get("Book") == version:
+                    return
+                position = book_filters.table_positions.get("Book") if book_filters.versions else None
+            version, position, changed = cls._changes_since(position)
+            rows = cls._keyed_rows() if changed is None else changed
+            records = [cls._filter_record(key, row) for key, row in rows]
+            with book_filters.lock:
+                if changed is None:
+                    book_filters.load(records)
+                else:
+                    for book_id, values in records:
+                        book_filters.set(book_id, values)
+                book_filters.versions = {"Book": version}
+                book_filters.table_positions = {"Book": position}
 
-    # @classmethod
-    # def _drop_table(cls) -> None:
-    #     super()._drop_table()
-    #     cls.clear_cache()
+    @classmethod
+    def get_filtered(
+        cls,
+        author: str | None = None,
+        category: str | None = None,
+        year: int | None = None,
+        rating_min: float | None = None,
+        rating_max: float | None = None,
+        limit: int | None = None,
+    ) -> list["Book"]:
+        """
+        Returns the books that have the given author and category (ignoring
+        case and extra spaces), were published in the given year, and have
+        an average rating from `rating_min` to `rating_max`, inclusive, in
+        the order they're stored in. Leaving a filter out (`None`) doesn't
+        filter on it, but giving either rating bound leaves out books that
+        haven't been rated.
+
+        The books are found with `book_filters` rather than by checking every
+        book, and only the (at most `limit`) books found are read.
+        """
+        equal: dict[str, Any] = {
+            field: value
+            for field, value in (("authors", author), ("categories", category), ("year", year))
+            if value is not None
+        }
+        ranges = {}
+        if rating_min is not None or rating_max is not None:
+            ranges["average_rating"] = (rating_min, rating_max)
+
+        cls._catch_up_filters()
+        with book_filters.lock:
+            book_ids = book_filters.find(equal, ranges, limit)
+        books = (cls.get_by_primary_key(book_id) for book_id in book_ids)
+        return [book for book in books if book is not None]
+
+    @classmethod
+    async def aget_filtered(
+        cls,
+        author: str | None = None,
+        category: str | None = None,
+        year: int | None = None,
+        rating_min: float | None = None,
+        rating_max: float | None = None,
+        limit: int | None = None,
+    ) -> list["Book"]:
+        """
+        Awaitable version of `get_filtered`.
+        """
+        return await run_in_storage_executor(
+            cls.get_filtered, author, category, year, rating_min, rating_max, limit
+        )
 
     # @classmethod
     # def fetch_from_google_books(cls, query: str, max_results: int = 1) -> Optional["Book"]:
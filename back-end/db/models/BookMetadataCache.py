@@ -1,10 +1,14 @@
 from time import time
+from typing import ClassVar
 from pydantic import Field
 
 from db.persisted_model import PersistedModel
 
 
 class BookMetadataCache(PersistedModel):
+	ttl_field: ClassVar[str | None] = "cached_at"
+	ttl_seconds: ClassVar[float] = 30 * 24 * 60 * 60
+
 	query: str
 	book_id: str
 	cached_at: int = Field(default_factory=lambda: int(time()))
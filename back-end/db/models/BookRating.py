@@ -0,0 +1,257 @@
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import Any, ClassVar, Generator, Iterable
+from pydantic import Field
+
+from db.encode_str import decode_str
+from db.file_lock import FileLock
+from db.persisted_model import PersistedModel
+from db.ranking import Ranking
+from db.write_behind import WriteBehind
+from db.models.Book import Book, title_terms
+
+RATING_LEVELS = 11
+"""
+The number of distinct ratings a review can give (0 to 10).
+"""
+
+book_rating_sync: WriteBehind[Book] = WriteBehind(Book, fields=("average_rating",))
+"""
+Updates to `Book.average_rating`, written behind (see `WriteBehind`) so that
+posting a review doesn't rewrite the whole book table. Only the averages
+are queued, so edits made to a book before they're written are kept.
+"""
+
+book_ranking = Ranking()
+"""
+The average rating of every book that has been reviewed, by id, best first,
+for `BookRating.best_rated`. It is loaded when first used, and kept up to
+date as ratings are written, moving just the books whose averages changed.
+"""
+
+_ranking_catching_up = Lock()
+"""
+Held while `book_ranking` is loaded or caught up with the table (see
+`BookRating._catch_up_ranking`), so that it's only done once at a time.
+"""
+
+_update_lock = Lock()
+_file_locks: dict[str, FileLock] = {}
+
+
+class BookRating(PersistedModel):
+    """
+    The number, sum and histogram of the ratings given to each book, kept up
+    to date by `UserReview` as reviews are written, so that a book's average
+    rating doesn't have to be computed from all of its reviews.
+    """
+
+    append_only: ClassVar[bool] = True
+    cache_max_entries: ClassVar[int] = 4096
+
+    book_id: str
+    review_count: int = 0
+    rating_total: int = 0
+    histogram: list[int] = Field(default_factory=lambda: [0] * RATING_LEVELS)
+
+    @property
+    def average_rating(self) -> float | None:
+        if self.review_count <= 0:
+            return None
+        return self.rating_total / self.review_count
+
+    def _add(self, rating: int, count: int = 1) -> None:
+        self.review_count += count
+        self.rating_total += rating * count
+        self.histogram[rating] += count
+
+    @classmethod
+    def of(cls, book_id: str) -> "BookRating":
+        """
+        Returns the ratings of the given book, which are empty if it hasn't
+        been reviewed.
+        """
+        return cls.get_by_primary_key(book_id) or cls(book_id=book_id)
+
+    @classmethod
+    async def aof(cls, book_id: str) -> "BookRating":
+        """
+        Awaitable version of `of`.
+        """
+        return await cls.aget_by_primary_key(book_id) or cls(book_id=book_id)
+
+    @classmethod
+    @contextmanager
+    def updating(cls) -> Generator[None, None, None]:
+        """
+        Holds the lock that every change to the ratings is made under, in
+        this and any other process using the same data directory. Reviews
+        are written outside it (see `UserReview._update_book_ratings`).
+        """
+        with _update_lock:
+            file_lock = _file_locks.get(cls.data_dir)
+            if file_lock is None:
+                file_lock = FileLock(Path(cls.data_dir) / "BookRating.update.lock")
+                _file_locks[cls.data_dir] = file_lock
+            with file_lock.exclusive():
+                yield
+
+    @classmethod
+    def apply(cls, removed: Iterable[tuple[str, int]], added: Iterable[tuple[str, int]]) -> None:
+        """
+        Removes each `(book_id, rating)` in `removed` from the ratings and
+        adds each one in `added`, then queues the new averages to be written
+        to the books. Must be called inside `updating`.
+
+        Changes to the same book can arrive out of order (e.g. a review's
+        replacement before the review itself), so a book's ratings can be
+        negative for a while. They're only deleted once every rating level
+        is back to zero.
+        """
+        changed: dict[str, BookRating] = {}
+        previous: dict[str, BookRating] = {}
+        for ratings, count in ((removed, -1), (added, 1)):
+            for book_id, rating in ratings:
+                if book_id not in changed:
+                    previous[book_id] = cls.of(book_id)
+                    changed[book_id] = previous[book_id].model_copy(deep=True)
+                changed[book_id]._add(rating, count)
+
+        changed = {
+            book_id: book_rating for book_id, book_rating in changed.items()
+            if book_rating != previous[book_id]
+        }
+        with cls.batch():
+            for book_rating in changed.values():
+                if any(book_rating.histogram):
+                    book_rating.put()
+                else:
+                    book_rating.delete()
+
+        for book_id, book_rating in changed.items():
+            if book_rating.average_rating != previous[book_id].average_rating:
+                _sync_average(book_id, book_rating.average_rating)
+
+    @classmethod
+    def _committed(cls, changes: dict[bytes, bytes | None], before: Any, after: Any) -> None:
+        """
+        Sets the weights of the books in `title_terms` to their new review
+        counts, and moves them in `book_ranking` to their new averages, if
+        they were up to date with the ratings (at version `before`).
+        Otherwise they are reloaded or caught up when next used.
+        """
+        with title_terms.lock:
+            if title_terms.versions.get("BookRating") == before:
+                for key, row in changes.items():
+                    review_count = 0 if row is None else cls._from_stored_row(row).review_count
+                    title_terms.weigh(key, review_count)
+                title_terms.versions["BookRating"] = after
+        with book_ranking.lock:
+            if book_ranking.versions.get("BookRating") == before:
+                for key, row in changes.items():
+                    book_ranking.set(*cls._ranked_average(key, row))
+                book_ranking.versions["BookRating"] = after
+
+    @classmethod
+    def _ranked_average(cls, key: bytes, row: bytes | None) -> tuple[str, float | None]:
+        """
+        Returns the id of the book with the given key, and its average rating
+        from `row` (`None` if it was deleted or has no reviews).
+        """
+        if row is None:
+            return decode_str(key.decode()), None
+        book_id, review_count, rating_total = cls._projector(
+            ("book_id", "review_count", "rating_total")
+        )(row.decode("latin-1"))
+        return book_id, rating_total / review_count if review_count > 0 else None
+
+    @classmethod
+    def _catch_up_ranking(cls) -> None:
+        """
+        Loads `book_ranking` when it's first used, and afterwards catches it
+        up with the ratings that were written without it (e.g. by another
+        process), if any. Only the rows that those writes changed are read
+        and decoded (see `PersistedModel._changes_since`).
+
+        The table is read without holding the ranking's lock, since writes
+        take that lock while the table is locked (see `_committed`).
+        """
+        with _ranking_catching_up:
+            version = cls.table_version()
+            with book_ranking.lock:
+                if book_ranking.versions.get("BookRating") == version:
+                    return
+                position = book_ranking.table_positions.get("BookRating") if book_ranking.versions else None
+            version, position, changed = cls._changes_since(position)
+            rows = cls._keyed_rows() if changed is None else changed
+            averages = [cls._ranked_average(key, row) for key, row in rows]
+            with book_ranking.lock:
+                if changed is None:
+                    book_ranking.load(
+                        (book_id, average) for book_id, average in averages if average is not None
+                    )
+                else:
+                    for book_id, average in averages:
+                        book_ranking.set(book_id, average)
+                book_ranking.versions = {"BookRating": version}
+                book_ranking.table_positions = {"BookRating": position}
+
+    @classmethod
+    def best_rated(cls, count: int | None = None, exclude: Iterable[str] = ()) -> list[tuple[str, float]]:
+        """
+        Returns the `(book_id, average rating)` of up to `count` of the books
+        with the best average ratings (or all of those reviewed), best first,
+        leaving out those in `exclude`. Books with the same average are in
+        the order their ratings were last written in.
+
+        The books are read off the front of `book_ranking` rather than
+        sorting every book's ratings.
+        """
+        cls._catch_up_ranking()
+        with book_ranking.lock:
+            return book_ranking.best(count, exclude)  # type: ignore[return-value]
+
+    @classmethod
+    def rebuild(cls, ratings: Iterable[tuple[str, int]]) -> int:
+        """
+        Replaces all of the ratings with those computed from `ratings`, an
+        iterable of every review's `(book_id, rating)`, and sets the average
+        rating of every book to match. Must be called inside `updating`.
+
+        Returns:
+            int: The number of books that have been rated.
+        """
+        rebuilt: dict[str, BookRating] = {}
+        for book_id, rating in ratings:
+            if book_id not in rebuilt:
+                rebuilt[book_id] = cls(book_id=book_id)
+            rebuilt[book_id]._add(int(rating))
+
+        # Written as one batch rather than dropping the table first, so that
+        # readers see either the old ratings or the new ones, and a failure
+        # leaves the old ones in place.
+        with cls.batch():
+            for book_rating in cls.get_all():
+                if book_rating.book_id not in rebuilt:
+                    book_rating.delete()
+            for book_rating in rebuilt.values():
+                book_rating.put()
+
+        book_rating_sync.flush()
+        with Book.batch():
+            for book in Book.get_all():
+                book_rating = rebuilt.get(book.id)
+                average = None if book_rating is None else book_rating.average_rating
+                if book.average_rating != average:
+                    book.average_rating = average
+                    book.put()
+        return len(rebuilt)
+
+
+def _sync_average(book_id: str, average: float | None) -> None:
+    book = book_rating_sync.get(book_id) or Book.get_by_primary_key(book_id)
+    if book is None or book.average_rating == average:
+        return
+    book.average_rating = average
+    book_rating_sync.patch(book)
@@ -1,8 +1,12 @@
+from typing import ClassVar
 from pydantic import Field
 from db.persisted_model import PersistedModel
 
 
 class Penalty(PersistedModel):
+    indexed_fields: ClassVar[tuple[str, ...]] = ("user_id",)
+    key_filter: ClassVar[bool] = True
+
     id: str
     user_id: str
     penalty_type: str
@@ -1,8 +1,12 @@
+from typing import ClassVar
 from pydantic import Field
 from db.persisted_model import PersistedModel
 
 
 class Report(PersistedModel):
+    indexed_fields: ClassVar[tuple[str, ...]] = ("review_id", "user_id")
+    key_filter: ClassVar[bool] = True
+
     id: str
     review_id: str
     user_id: str
@@ -1,8 +1,10 @@
-from typing import Self
+from typing import ClassVar, Self
 
 from db.persisted_model import PersistedModel
 
 class SavedBook(PersistedModel):
+	indexed_fields: ClassVar[tuple[str, ...]] = ("user_id", "book_id")
+
 	id: str
 	user_id: str
 	book_id: str
@@ -1,11 +1,14 @@
 from time import time
-from typing import Self
+from typing import ClassVar, Self
 from pydantic import Field
 
 from db.persisted_model import PersistedModel
 
 
 class SentimentCache(PersistedModel):
+	ttl_field: ClassVar[str | None] = "cached_at"
+	ttl_seconds: ClassVar[float] = 24 * 60 * 60
+
 	book_id: str
 	sentiment: str
 	score: float
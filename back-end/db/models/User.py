@@ -1,7 +1,10 @@
 from datetime import date
 from db.persisted_model import PersistedModel
+from db.password_executor import run_in_password_executor
+from db.storage_executor import run_in_storage_executor
+from db.write_behind import WriteBehind
 from pydantic import EmailStr, Field
-from typing import Self
+from typing import ClassVar, Self
 from secrets import token_urlsafe
 from fastapi import Request, Response
 from time import time_ns
@@ -13,17 +16,41 @@ password_hasher = argon2.PasswordHasher()
 TOKEN_NAME = "fubar_user_session"
 TOKEN_DURATION_NS: int = 7 * 24 * 60 * 60 * (10 ** 9)
 TOKEN_MAX_DURATION_NS: int = 30 * 24 * 60 * 60 * (10 ** 9)
+TOKEN_RENEW_THRESHOLD_NS: int = TOKEN_DURATION_NS - 24 * 60 * 60 * (10 ** 9)
+"""
+Sessions are only renewed once less than this much of them is left, so each
+session is written at most once a day rather than on every request.
+"""
 TESTING = (os.getenv("TESTING") == "1")
 
 class UserSession(PersistedModel):
+	append_only: ClassVar[bool] = True
+	indexed_fields: ClassVar[tuple[str, ...]] = ("user_id",)
+	write_ahead_log: ClassVar[bool] = True
+	ttl_field: ClassVar[str | None] = "expiration_timestamp"
+	ttl_field_unit: ClassVar[float] = 1e-9
+	cache_max_entries: ClassVar[int] = 4096
+
 	session_id: str
 	user_id: str
 	original_creation_timestamp: int
 	expiration_timestamp: int
 
 	def renew(self) -> None:
-		self.expiration_timestamp = time_ns() + TOKEN_DURATION_NS
-		self.put()
+		"""
+		Pushes the session's expiry back to `TOKEN_DURATION_NS` from now, if
+		less than `TOKEN_RENEW_THRESHOLD_NS` of it is left. The new expiry is
+		written in the background (see `WriteBehind`).
+		"""
+		now = time_ns()
+		if self.expiration_timestamp - now >= TOKEN_RENEW_THRESHOLD_NS:
+			return
+		self.expiration_timestamp = now + TOKEN_DURATION_NS
+		session_renewals.patch(self)
+
+	def delete(self) -> None:
+		session_renewals.discard(self.session_id)
+		super().delete()
 
 	def is_expired(self) -> bool:
 		return self.expiration_timestamp < time_ns() or \
@@ -35,7 +62,7 @@ class UserSession(PersistedModel):
 		if token == None:
 			return None
 		
-		session = cls.get_by_primary_key(token)
+		session = session_renewals.get(token) or cls.get_by_primary_key(token)
 		if session == None:
 			return None
 		if session.is_expired():
@@ -44,7 +71,22 @@ class UserSession(PersistedModel):
 		
 		return session
 
+	@classmethod
+	async def afrom_request(cls, req: Request) -> Self | None:
+		"""
+		Awaitable version of `from_request`.
+		"""
+		return await run_in_storage_executor(cls.from_request, req)
+
+session_renewals: WriteBehind[UserSession] = WriteBehind(UserSession)
+"""
+Session renewals that haven't been written yet.
+"""
+
 class User(PersistedModel):
+	indexed_fields: ClassVar[tuple[str, ...]] = ("email", "display_name")
+	cache_max_entries: ClassVar[int] = 1024
+
 	id: str
 	display_name: str
 	email: EmailStr
@@ -78,6 +120,21 @@ class User(PersistedModel):
 			return self.password == raw_password
 		return False
 
+	@classmethod
+	async def ahash_password(cls, raw_password: str) -> str:
+		"""
+		Awaitable version of `hash_password`, which runs on the password
+		executor (see `db.password_executor`).
+		"""
+		return await run_in_password_executor(cls.hash_password, raw_password)
+
+	async def averify_password(self, raw_password: str) -> bool:
+		"""
+		Awaitable version of `verify_password`, which runs on the password
+		executor (see `db.password_executor`).
+		"""
+		return await run_in_password_executor(self.verify_password, raw_password)
+
 	@classmethod
 	def from_session(cls, req: Request) -> Self | None:
 		"""
@@ -97,6 +154,13 @@ class User(PersistedModel):
 		session.renew()
 		return user
 
+	@classmethod
+	async def afrom_session(cls, req: Request) -> Self | None:
+		"""
+		Awaitable version of `from_session`.
+		"""
+		return await run_in_storage_executor(cls.from_session, req)
+
 	def create_session(self, resp: Response) -> None:
 		"""
 		Creates a new user session, setting an appropriate cookie on the
@@ -1,9 +1,41 @@
+from itertools import count
+from pathlib import Path
+from typing import ClassVar, Iterable
+import os
 from pydantic import Field
 
 from db.persisted_model import PersistedModel
+from db.models.BookRating import BookRating
+from db.write_ahead_log import WriteAheadLog
+
+JOURNAL_COMPACTION_SIZE = 1 << 20
+"""
+The size in bytes past which the journal of rating updates (see
+`UserReview._ratings_journal`) is cut back to the updates still running.
+"""
+
+_journals: dict[str, WriteAheadLog] = {}
+_journal_entries = count()
+
+
+def _partitions_from_env() -> int:
+    raw = os.getenv("USER_REVIEW_PARTITIONS")
+    if not raw:
+        return 1
+    try:
+        value = int(raw)
+        return value if value > 0 else 1
+    except ValueError:
+        return 1
 
 
 class UserReview(PersistedModel):
+    append_only: ClassVar[bool] = True
+    indexed_fields: ClassVar[tuple[str, ...]] = ("user_id", "book_id")
+    key_filter: ClassVar[bool] = True
+    write_ahead_log: ClassVar[bool] = True
+    partitions: ClassVar[int] = _partitions_from_env()
+
     id: str
     user_id: str
     book_id: str
@@ -15,3 +47,125 @@ class UserReview(PersistedModel):
     def new_id(cls) -> str:
         """Generate a new unique ID for reviews."""
         return cls.generate_primary_key()
+
+    @classmethod
+    def _write(
+        cls,
+        key: bytes,
+        row: bytes | None,
+        if_exists: bool | None = None,
+        replaced: dict[bytes, bytes | None] | None = None,
+    ) -> bool:
+        old_rows: dict[bytes, bytes | None] = {}
+        entry = cls._begin_rating_update()
+        written = super()._write(key, row, if_exists=if_exists, replaced=old_rows)
+        cls._update_book_ratings(entry, old_rows, {key: row})
+        if replaced is not None:
+            replaced.update(old_rows)
+        return written
+
+    @classmethod
+    def _write_many(
+        cls,
+        changes: dict[bytes, bytes | None],
+        replaced: dict[bytes, bytes | None] | None = None,
+    ) -> None:
+        old_rows: dict[bytes, bytes | None] = {}
+        entry = cls._begin_rating_update()
+        super()._write_many(changes, replaced=old_rows)
+        cls._update_book_ratings(entry, old_rows, changes)
+        if replaced is not None:
+            replaced.update(old_rows)
+
+    @classmethod
+    def _ratings_journal(cls) -> WriteAheadLog:
+        """
+        Returns the journal of the rating updates that have been started but
+        not finished (see `_begin_rating_update`). The first process to open
+        it, while no other process has it open, rebuilds `BookRating` if a
+        process crashed with an update unfinished, then empties it. Must be
+        called inside `BookRating.updating`.
+        """
+        journal = _journals.get(BookRating.data_dir)
+        if journal is None:
+            journal = WriteAheadLog(
+                Path(BookRating.data_dir) / "BookRating.journal",
+                cls._wal_durability() or "fsync"
+            )
+            if journal.open():
+                if any(entry is not None for entry in journal.read().values()):
+                    BookRating.rebuild(cls.get_all(fields=["book_id", "rating"]))
+                journal.truncate()
+            _journals[BookRating.data_dir] = journal
+        return journal
+
+    @classmethod
+    def recover_book_ratings(cls) -> None:
+        """
+        Rebuilds `BookRating` if a process crashed between writing reviews
+        and updating the ratings to match, which the journal of rating
+        updates shows. This is done anyway before the first review is
+        written, but calling it at startup keeps that out of a request.
+        """
+        with BookRating.updating():
+            cls._ratings_journal()
+
+    @classmethod
+    def _begin_rating_update(cls) -> bytes:
+        """
+        Records in the journal that reviews are about to be written, before
+        they are, and returns the entry's key, which `_update_book_ratings`
+        marks finished once the ratings have been updated to match. Until
+        then, a crash leaves the entry in the journal for the next startup
+        to find.
+        """
+        entry = f"{os.getpid()}:{next(_journal_entries)}".encode()
+        with BookRating.updating():
+            cls._ratings_journal().append({entry: b""})
+        return entry
+
+    @classmethod
+    def _update_book_ratings(
+        cls,
+        entry: bytes,
+        replaced: dict[bytes, bytes | None],
+        changes: dict[bytes, bytes | None],
+    ) -> None:
+        """
+        Moves the ratings of the reviews that the written `changes` replaced
+        (or deleted) out of `BookRating`, and those of the reviews written
+        into it, then marks the journal `entry` finished. The replaced rows
+        are the ones the table write found (see `CsvTable.write`), so each
+        rating is moved exactly once, whatever order concurrent writes get
+        here in.
+        """
+        def ratings(rows: Iterable[bytes | None]) -> list[tuple[str, int]]:
+            reviews = [cls._from_stored_row(row) for row in rows if row is not None]
+            return [(review.book_id, review.rating) for review in reviews]
+
+        removed = ratings(replaced.values())
+        added = ratings(changes[key] for key in replaced)
+        with BookRating.updating():
+            if removed or added:
+                BookRating.apply(removed, added)
+            journal = cls._ratings_journal()
+            journal.append({entry: None})
+            if journal.size() > JOURNAL_COMPACTION_SIZE:
+                running = {key: row for key, row in journal.read().items() if row is not None}
+                journal.truncate()
+                if running:
+                    journal.append(running)
+
+    @classmethod
+    def rebuild_book_ratings(cls) -> int:
+        """
+        Recomputes `BookRating` (and every book's average rating) from all
+        of the stored reviews, e.g. after they were imported straight into
+        the table file. Returns the number of books that have been rated.
+
+        Reviews written while this runs can be counted twice, so it should
+        be run while nothing else is writing reviews.
+        """
+        with BookRating.updating():
+            cls._ratings_journal()
+            return BookRating.rebuild(cls.get_all(fields=["book_id", "rating"]))
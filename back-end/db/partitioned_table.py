@@ -0,0 +1,470 @@
+from concurrent.futures import Future
+from contextlib import ExitStack
+from heapq import merge
+from itertools import islice
+import mmap
+import os
+from pathlib import Path
+from typing import Any, Callable, Iterator
+import zlib
+
+from db.csv_table import Committed, CsvTable, _map_lines, _row_key
+from db.loose_compare import loosely_matches
+from db.storage_executor import scan_executor, scan_workers
+from db.text_index import TextStatistics
+
+def partition_of(key: bytes, partitions: int) -> int:
+	"""
+	Returns the partition that the record with the given (encoded) primary
+	key belongs in. The hash is the same in every process and every run.
+	"""
+	return zlib.crc32(key) % partitions
+
+def partition_paths(directory: Path, name: str, partitions: int) -> list[Path]:
+	return [directory / f"{name}.part{i}.csv" for i in range(partitions)]
+
+def existing_partition_paths(directory: Path, name: str) -> list[Path]:
+	"""
+	Returns the partition files of the given table that exist, in order.
+	"""
+	paths = list(directory.glob(f"{name}.part*.csv"))
+	return sorted(
+		(path for path in paths if path.name[len(name) + 5:-4].isdigit()),
+		key = lambda path: int(path.name[len(name) + 5:-4])
+	)
+
+def _scan_partition(
+	path: str,
+	inode: int,
+	start: int,
+	end: int,
+	predicates: dict[int, bytes],
+	patterns: dict[int, str] | None,
+	min_similarity: float | None = None
+) -> list[tuple[int, bytes]] | None:
+	"""
+	Returns `(offset, line)` for each line of the partition file between
+	`start` and `end` whose columns equal `predicates`, and loosely match
+	`patterns` if given (see `loosely_matches`). This runs in the scan pool,
+	so it reads the file itself, and returns `None` if the file at `path`
+	has been replaced since the caller looked at it (i.e. if it isn't the
+	file with this inode).
+
+	Superseded rows and tombstones are included; the caller knows which
+	lines are live.
+	"""
+	try:
+		fd = os.open(path, os.O_RDONLY)
+	except FileNotFoundError:
+		return None
+	try:
+		if os.fstat(fd).st_ino != inode:
+			return None
+		if end <= start:
+			return []
+		with mmap.mmap(fd, end, access = mmap.ACCESS_READ) as view:
+			lines = _map_lines(view, start, end, sorted(predicates.items()))
+			if patterns is None:
+				return list(lines)
+			return [
+				(offset, line) for offset, line in lines
+				if loosely_matches(line, patterns, min_similarity)
+			]
+	finally:
+		os.close(fd)
+
+
+class PartitionedTable:
+	"""
+	A table split across several `CsvTable` files by the hash of each
+	record's primary key (see `partition_of`), with the same interface as
+	`CsvTable`.
+
+	Reads and writes of a single record only touch its own partition, so
+	writes to different partitions don't wait for each other, and rewrites
+	only copy one partition. Scans that can't use an index are fanned out
+	across the partitions on the scan pool (see `scan_executor`).
+
+	Scans and searches yield rows partition by partition, each partition's
+	in table order. The partitions don't record when their rows were
+	written relative to each other's, so the order across partitions says
+	nothing about the order the rows were written in, and callers must not
+	rely on it (ranked searches are ordered by score, as usual).
+
+	Writes to several partitions at once (`write_many`) lock all of them
+	first, and put back the partitions already written if one fails, so
+	they are all-or-nothing across them too. A crash part of the way
+	through can still leave some partitions written and not others.
+	"""
+
+	def __init__(self, partitions: list[CsvTable]) -> None:
+		self.partitions = partitions
+		self.indexed_columns = partitions[0].indexed_columns
+		self.cache = partitions[0].cache
+		"""
+		The cache of the first partition; each partition has its own, but
+		this tells callers whether there are caches at all.
+		"""
+
+	@classmethod
+	def open(
+		cls,
+		directory: Path,
+		name: str,
+		header: str,
+		partitions: int,
+		cache_max_entries: int = 0,
+		cache_max_bytes: int = 8 * 1024 * 1024,
+		**options: Any
+	) -> "PartitionedTable":
+		"""
+		Opens the `partitions` partition files of the table called `name` in
+		`directory`, passing `options` on to each `CsvTable`. The cache is
+		split evenly between the partitions.
+
+		Raises:
+			RuntimeError: if the table is stored with a different number of
+			partitions (or none), in which case it needs to be repartitioned
+			first.
+		"""
+		existing = existing_partition_paths(directory, name)
+		paths = partition_paths(directory, name, partitions)
+		unpartitioned = (directory / f"{name}.csv").exists()
+		if (existing and existing != paths) or (not existing and unpartitioned):
+			raise RuntimeError(
+				f"{name} is stored in {len(existing) or 1} partition(s), not {partitions}; "
+				f"run `python -m scripts.repartition {name} {partitions}` first"
+			)
+		if cache_max_entries > 0:
+			cache_max_entries = max(1, cache_max_entries // partitions)
+		return cls([
+			CsvTable.open(
+				path,
+				header,
+				cache_max_entries = cache_max_entries,
+				cache_max_bytes = cache_max_bytes // partitions,
+				**options
+			)
+			for path in paths
+		])
+
+	def partition(self, key: bytes) -> CsvTable:
+		return self.partitions[partition_of(key, len(self.partitions))]
+
+	def read_row(self, key: bytes) -> bytes | None:
+		return self.partition(key).read_row(key)
+
+	def read_cached(self, key: bytes, decode: Callable[[bytes], Any]) -> Any:
+		return self.partition(key).read_cached(key, decode)
+
+	def cache_info(self) -> dict[str, int] | None:
+		"""
+		Returns the statistics of the partitions' caches added together.
+		"""
+		if self.cache is None:
+			return None
+		total: dict[str, int] = {}
+		for partition in self.partitions:
+			for stat, value in (partition.cache_info() or {}).items():
+				total[stat] = total.get(stat, 0) + value
+		return total
+
+	def contains(self, key: bytes) -> bool:
+		return self.partition(key).contains(key)
+
+	def version(self) -> tuple[Any, ...]:
+		return tuple(partition.version() for partition in self.partitions)
+
+	def changes_since(self, position: Any = None) -> tuple[Any, Any, list[bytes] | None]:
+		"""
+		Works the same as `CsvTable.changes_since`, partition by partition.
+		"""
+		positions = position or (None,) * len(self.partitions)
+		versions: list[Any] = []
+		new_positions: list[Any] = []
+		keys: list[bytes] | None = []
+		for partition, partition_position in zip(self.partitions, positions):
+			version, new_position, partition_keys = partition.changes_since(partition_position)
+			versions.append(version)
+			new_positions.append(new_position)
+			if keys is not None and partition_keys is not None:
+				keys += partition_keys
+			else:
+				keys = None
+		return tuple(versions), tuple(new_positions), keys
+
+	def scan(self) -> Iterator[bytes]:
+		"""
+		Yields every live row in the table, partition by partition.
+		"""
+		for partition in self.partitions:
+			yield from partition.scan()
+
+	def select(self, predicates: dict[int, bytes]) -> Iterator[bytes]:
+		"""
+		Works the same as `CsvTable.select`, partition by partition (see
+		`PartitionedTable`). Searches by primary key only
+		read one partition, searches on indexed columns use each partition's
+		index, and other searches scan the partitions in parallel.
+		"""
+		if 0 in predicates:
+			return self.partition(predicates[0]).select(predicates)
+		if any(column in self.indexed_columns for column in predicates):
+			return (row for partition in self.partitions for row in partition.select(predicates))
+		if not predicates:
+			return self.scan()
+		return self._fan_out(predicates, None)
+
+	def select_like(
+		self,
+		patterns: dict[int, bytes],
+		skip: int = 0,
+		limit: int | None = None,
+		ranked: bool = False,
+		min_similarity: float | None = None
+	) -> Iterator[bytes]:
+		"""
+		Works the same as `CsvTable.select_like`, partition by partition. If
+		none of the columns has a text index, the partitions are scanned in
+		parallel, and the rows are checked with `loose_compare` as part of
+		the scan, so that only the matching ones are sent back.
+
+		Ranked searches take the best `skip + limit` rows of each partition
+		and merge them. The partitions score their rows against the
+		statistics of the whole table, added up from theirs, so that rows
+		score the same whichever partition they're in.
+		"""
+		stop = None if limit is None else skip + limit
+		if ranked and any(column in self.partitions[0].text_columns for column in patterns):
+			statistics: dict[int, TextStatistics] = {}
+			for partition in self.partitions:
+				for column, column_statistics in partition.text_statistics(patterns, min_similarity).items():
+					statistics[column] = (
+						column_statistics if column not in statistics
+						else statistics[column] + column_statistics
+					)
+			ranked_rows = merge(
+				*(
+					partition.rank_like(patterns, stop, statistics, min_similarity)
+					for partition in self.partitions
+				),
+				key = lambda scored: (-scored[0], _row_key(scored[1]))
+			)
+			return islice((row for _, row in ranked_rows), skip, stop)
+		if any(column in self.partitions[0].text_columns for column in patterns):
+			# No partition can have to contribute more than `stop` rows.
+			rows = (
+				row for partition in self.partitions
+				for row in partition.select_like(patterns, limit = stop, min_similarity = min_similarity)
+			)
+		else:
+			rows = self._fan_out(
+				{},
+				{column: value.decode() for column, value in patterns.items()},
+				min_similarity
+			)
+		return islice(rows, skip, stop)
+
+	def _fan_out(
+		self,
+		predicates: dict[int, bytes],
+		patterns: dict[int, str] | None,
+		min_similarity: float | None = None
+	) -> Iterator[bytes]:
+		"""
+		Scans every partition on the scan pool, and yields the live rows that
+		match, in partition order. With only one worker in the pool, the
+		partitions are scanned here instead, one after another.
+		"""
+		executor = scan_executor() if scan_workers() > 1 else None
+		scans: list[tuple[Any, int, Future[list[tuple[int, bytes]] | None] | None]] = []
+		for partition in self.partitions:
+			table_file, end = partition._snapshot()
+			scans.append((table_file, end, None if executor is None else executor.submit(
+				_scan_partition,
+				str(partition.file_path),
+				table_file.stamp[0],
+				table_file.data_start,
+				end,
+				predicates,
+				patterns,
+				min_similarity
+			)))
+
+		try:
+			for table_file, end, scan in scans:
+				lines = None if scan is None else scan.result()
+				if lines is None:
+					# Either there's no pool, or the file was replaced after
+					# it was pinned; scan the pinned version here instead.
+					for line in CsvTable._scan_file(table_file, end, predicates):
+						if patterns is None or loosely_matches(line, patterns, min_similarity):
+							yield line
+					continue
+				for offset, line in lines:
+					if table_file.is_live(offset, end):
+						yield line
+		finally:
+			for _, _, scan in scans:
+				if scan is not None:
+					scan.cancel()
+
+	def write(
+		self,
+		key: bytes,
+		row: bytes | None,
+		if_exists: bool | None = None,
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> bool:
+		i = partition_of(key, len(self.partitions))
+		return self.partitions[i].write(key, row, if_exists, replaced, self._committed(i, committed))
+
+	def write_many(
+		self,
+		changes: dict[bytes, bytes | None],
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> None:
+		"""
+		Applies several writes at once, with a single rewrite (or append) of
+		each partition that they touch. Either all of them are applied or
+		none are: if writing one partition fails, the rows that the others
+		were written over are put back before the error is raised, and no
+		other write can see the table in between. `committed` is called once,
+		with the versions of the whole table.
+		"""
+		by_partition: dict[int, dict[bytes, bytes | None]] = {}
+		for key, row in changes.items():
+			by_partition.setdefault(partition_of(key, len(self.partitions)), {})[key] = row
+		if len(by_partition) == 1:
+			for i, partition_changes in by_partition.items():
+				self.partitions[i].write_many(partition_changes, replaced, self._committed(i, committed))
+			return
+
+		touched = [self.partitions[i] for i in sorted(by_partition)]
+		with ExitStack() as stack:
+			# The partitions are locked in order, so that two writes to the
+			# same ones can't each wait for a partition the other has locked.
+			for partition in touched:
+				stack.enter_context(partition._writing())
+			before = self.version()
+			made: dict[bytes, bytes | None] = {}
+			written: list[tuple[CsvTable, dict[bytes, bytes | None]]] = []
+			try:
+				for i in sorted(by_partition):
+					partition = self.partitions[i]
+					old_rows: dict[bytes, bytes | None] = {}
+					made.update(partition._write_locked(partition._current, by_partition[i], old_rows)) # type: ignore
+					written.append((partition, old_rows))
+			except BaseException:
+				for partition, old_rows in written:
+					partition._write_locked(partition._current, { # type: ignore
+						key: None if row is None else row.removesuffix(b"\n")
+						for key, row in old_rows.items()
+					})
+				raise
+			if replaced is not None:
+				for _, old_rows in written:
+					replaced.update(old_rows)
+			if made and committed is not None:
+				committed(made, before, self.version())
+		for partition in touched:
+			if partition.wal is not None:
+				partition._after_commit()
+			if partition.append_only:
+				partition._maybe_compact()
+
+	def _committed(self, i: int, committed: Committed | None) -> Committed | None:
+		"""
+		Wraps `committed` to be called by the `i`th partition, with versions
+		of the whole table (see `version`) rather than of the partition.
+		"""
+		if committed is None:
+			return None
+
+		def partition_committed(changes: dict[bytes, bytes | None], before: Any, after: Any) -> None:
+			versions = [partition.version() for partition in self.partitions]
+			versions[i] = before
+			table_before = tuple(versions)
+			versions[i] = after
+			committed(changes, table_before, tuple(versions))
+
+		return partition_committed
+
+	def delete_where(self, predicate: Callable[[bytes], bool]) -> int:
+		"""
+		Works the same as `CsvTable.delete_where`, one partition at a time.
+		"""
+		return sum(partition.delete_where(predicate) for partition in self.partitions)
+
+	def drop(self) -> None:
+		for partition in self.partitions:
+			partition.drop()
+
+
+_REPARTITION_CHUNK_SIZE = 100_000
+
+def repartition(
+	directory: Path,
+	name: str,
+	header: str,
+	partitions: int,
+	append_only: bool = False
+) -> int:
+	"""
+	Rewrites the table called `name` in `directory` (whether it is a single
+	table file or already partitioned) into `partitions` partition files,
+	or into a single table file if `partitions` is 1, and returns the
+	number of records. The table must not be in use while this runs.
+	"""
+	old_paths = existing_partition_paths(directory, name)
+	single_path = directory / f"{name}.csv"
+	if single_path.exists():
+		old_paths.append(single_path)
+	# Opening an old table with its write-ahead log replays anything left in
+	# the log first.
+	old_tables = [
+		CsvTable(
+			path,
+			header,
+			append_only = append_only,
+			wal_durability = "fsync" if path.with_name(path.name + ".wal").exists() else None
+		)
+		for path in old_paths
+	]
+
+	new_paths = [single_path] if partitions == 1 else partition_paths(directory, name, partitions)
+	tmp_paths = [path.with_name(path.name + ".repartition") for path in new_paths]
+	# The new files are only ever appended to, a chunk at a time.
+	new_tables = [CsvTable(path, header, append_only = True) for path in tmp_paths]
+	for table in new_tables:
+		table.drop()
+
+	def flush(by_partition: dict[int, dict[bytes, bytes | None]]) -> None:
+		for i, rows in by_partition.items():
+			new_tables[i].write_many(rows)
+		by_partition.clear()
+
+	records = 0
+	by_partition: dict[int, dict[bytes, bytes | None]] = {}
+	for old_table in old_tables:
+		for row in old_table.scan():
+			key = _row_key(row)
+			by_partition.setdefault(partition_of(key, len(new_tables)), {})[key] = row.removesuffix(b"\n")
+			records += 1
+			if records % _REPARTITION_CHUNK_SIZE == 0:
+				flush(by_partition)
+	flush(by_partition)
+
+	for path in old_paths:
+		for sidecar in [path] + [path.with_name(path.name + suffix) for suffix in (".lock", ".keys", ".wal", ".changes")]:
+			sidecar.unlink(missing_ok = True)
+	for tmp_path, path in zip(tmp_paths, new_paths):
+		if tmp_path.exists():
+			os.replace(tmp_path, path)
+		else:
+			CsvTable(path, header)._ensure_file()
+		for suffix in (".lock", ".changes"):
+			tmp_path.with_name(tmp_path.name + suffix).unlink(missing_ok = True)
+	return records
@@ -0,0 +1,92 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+import os
+from threading import Lock
+from typing import Any, Callable, TypeVar
+
+from fastapi import HTTPException
+
+T = TypeVar("T")
+
+def _int_from_env(name: str, default: int) -> int:
+	raw = os.getenv(name)
+	if not raw:
+		return default
+	try:
+		value = int(raw)
+		return value if value > 0 else default
+	except ValueError:
+		return default
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+_in_flight = 0
+
+class PasswordHashingBusy(HTTPException):
+	"""
+	Raised (and sent to the client as 503 Service Unavailable) when too many
+	passwords are already waiting to be hashed or verified.
+	"""
+
+	def __init__(self) -> None:
+		super().__init__(
+			status_code = HTTPStatus.SERVICE_UNAVAILABLE,
+			detail = "The server is busy; please try again shortly.",
+			headers = {"Retry-After": "1"}
+		)
+
+def password_workers() -> int:
+	"""
+	The number of threads that hash passwords, set by the
+	`PASSWORD_HASH_WORKERS` environment variable (by default, the number of
+	CPUs, up to 4). argon2 releases the GIL while it hashes, so they run in
+	parallel.
+	"""
+	return _int_from_env("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1))
+
+def password_queue_limit() -> int:
+	"""
+	The most password hashes that may be running or waiting at once, set by
+	the `PASSWORD_HASH_QUEUE` environment variable (64 by default).
+	"""
+	return _int_from_env("PASSWORD_HASH_QUEUE", 64)
+
+def password_executor() -> ThreadPoolExecutor:
+	"""
+	Returns the thread pool that hashes and verifies passwords. It is kept
+	apart from the storage executor so that a burst of logins (each of which
+	takes tens of milliseconds of CPU) can't hold up reads and writes.
+	"""
+	global _executor
+	if _executor is None:
+		with _executor_lock:
+			if _executor is None:
+				_executor = ThreadPoolExecutor(
+					max_workers = password_workers(),
+					thread_name_prefix = "password"
+				)
+	return _executor
+
+async def run_in_password_executor(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+	"""
+	Runs a password hashing function on the password executor without
+	blocking the event loop, and returns its result.
+
+	Raises:
+		PasswordHashingBusy: if `password_queue_limit()` hashes are already
+		running or waiting, so that a flood of logins is turned away quickly
+		instead of piling up behind each other.
+	"""
+	global _in_flight
+	with _executor_lock:
+		if _in_flight >= password_queue_limit():
+			raise PasswordHashingBusy()
+		_in_flight += 1
+	try:
+		loop = asyncio.get_running_loop()
+		return await loop.run_in_executor(password_executor(), partial(function, *args, **kwargs))
+	finally:
+		with _executor_lock:
+			_in_flight -= 1
@@ -1,16 +1,41 @@
+from contextlib import contextmanager
+from itertools import islice
+from contextvars import ContextVar
+from functools import partial
 from io import TextIOWrapper
 import json
 import os
 from pathlib import Path
-from threading import Lock
-from typing import Any, ClassVar, Generator, Self, Union, get_args, get_origin
-from types import UnionType
+from time import time
+from typing import Any, AsyncGenerator, Callable, ClassVar, Generator, Iterable, Iterator, Self, Sequence, get_origin, overload
 import uuid
 from db.camelized_model import CamelizedModel
-import ast
-
-from db.loose_compare import loose_compare
-from db.encode_str import encode_str, decode_str
+from db.csv_table import CsvTable, _row_key
+from db.partitioned_table import PartitionedTable
+from db.row_codec import RowCodec
+from db.sqlite_table import SqliteTable
+from db.storage_executor import iterate_in_storage_executor, run_in_storage_executor
+
+from db.encode_str import encode_str
+
+_write_batches: ContextVar[dict[type, dict[bytes, bytes | None]] | None] = \
+	ContextVar("_write_batches", default = None)
+"""
+The changes queued by each model class's open `batch`, if any, for the
+current thread or async task.
+"""
+
+_tables: dict[tuple[type, str, str], CsvTable | PartitionedTable | SqliteTable] = {}
+"""
+The table used by each model class for each data directory and storage
+backend it has used.
+"""
+
+SQLITE_FILE_NAME = "tables.sqlite3"
+"""
+The name of the SQLite database, in each data directory, that holds the
+tables of models that use the `"sqlite"` storage backend.
+"""
 
 class PersistedModel(CamelizedModel):
 	"""
@@ -39,16 +64,303 @@ class PersistedModel(CamelizedModel):
 	"""
 	Defines the directory where instances of this model should be stored.
 	"""
-	_mutex: ClassVar[Lock] = Lock()
+	append_only: ClassVar[bool] = False
+	"""
+	When True, writes append the new version of a record (or a tombstone for
+	a deleted one) to the end of the table file instead of rewriting the
+	whole file, so their cost depends on the size of the record rather than
+	the size of the table. Updated records then move to the end of the
+	table's iteration order.
+	"""
+	compaction_garbage_ratio: ClassVar[float] = 0.5
+	"""
+	For `append_only` tables, the fraction of the table file that may be
+	taken up by superseded records and tombstones before it is compacted in
+	the background.
+	"""
+	indexed_fields: ClassVar[tuple[str, ...]] = ()
+	"""
+	Fields that are indexed in memory, so that `get_where` and
+	`get_first_where` can find records with a given value for them without
+	scanning the whole table. The primary key is always indexed.
+	"""
+	text_indexed_fields: ClassVar[tuple[str, ...]] = ()
+	"""
+	Fields that are kept in a full-text index, so that `get_where_like`
+	searches on them only read the records that contain the words being
+	searched for. Table files keep an inverted index of each field's words
+	in memory (see `TextIndex`), and the SQLite backend (see
+	`storage_backend`) keeps an FTS5 index.
+	"""
+	cache_max_entries: ClassVar[int] = 0
+	"""
+	When positive, `get_by_primary_key` keeps up to this many recently used
+	records (and recently missed keys) in memory, so that looking them up
+	again doesn't read the table file. Writes invalidate the cached copies.
+	"""
+	cache_max_bytes: ClassVar[int] = 8 * 1024 * 1024
+	"""
+	The most (stored) bytes of records that the cache may hold.
+	"""
+	key_filter: ClassVar[bool] = False
+	"""
+	When True, a Bloom filter of the table's primary keys is saved next to
+	the table file, so that a process that hasn't read the table yet can
+	still tell that a key isn't in it (e.g. in `generate_primary_key`)
+	without indexing the whole table first.
+	"""
+	partitions: ClassVar[int] = 1
+	"""
+	When greater than 1, the table is split into this many table files by
+	the hash of each record's primary key (see `PartitionedTable`), so that
+	writes only rewrite (or append to) one of them, and scans that can't use
+	an index run on all of them in parallel. Records are then read back
+	partition by partition, so the table's iteration order no longer
+	follows the order they were written in. Changing this for a table that
+	already has records requires `python -m scripts.repartition`. Only the
+	CSV backend uses partitions.
+	"""
+	write_ahead_log: ClassVar[bool] = False
+	"""
+	When True, writes are recorded in a write-ahead log next to the table
+	file before they are applied, and concurrent writes are committed to
+	the log and the table file together (see `CsvTable`). A crash can then
+	only lose writes that `wal_durability` hadn't synced yet.
+	"""
+	wal_durability: ClassVar[str | None] = None
+	"""
+	How the write-ahead log is synced to disk: `"fsync"` on every commit,
+	`"batched"` at most every few milliseconds, or `"buffered"` never (see
+	`db.write_ahead_log.DURABILITY_MODES`). When `None`, the `WAL_DURABILITY`
+	environment variable decides, and the default is `"fsync"`.
+	"""
+	ttl_field: ClassVar[str | None] = None
+	"""
+	A numeric field holding a timestamp that decides when each record
+	expires (see `ttl_seconds`). Every lookup treats expired records as
+	missing, and `delete_expired` (which `db.expiry_sweeper` runs
+	periodically) deletes them. Writes don't look at expiry: `post` still
+	fails, and `patch` still succeeds, for an expired record that hasn't
+	been deleted yet.
+	"""
+	ttl_seconds: ClassVar[float] = 0
+	"""
+	How long after the time in `ttl_field` a record expires. When 0, the
+	field holds the time of expiry itself.
+	"""
+	ttl_field_unit: ClassVar[float] = 1
+	"""
+	The length, in seconds, of one unit of `ttl_field`: 1 for `time()`
+	timestamps, or 1e-9 for `time_ns()` ones.
+	"""
+	storage_backend: ClassVar[str | None] = None
+	"""
+	Where this model's records are stored: `"csv"` for a table file in
+	`data_dir`, or `"sqlite"` for a table in the SQLite database in
+	`data_dir` (see `SQLITE_FILE_NAME`). When `None`, the `STORAGE_BACKEND`
+	environment variable decides, and the default is `"csv"`. The settings
+	above that only make sense for table files (`key_filter`,
+	`write_ahead_log` and `partitions`) are ignored by the SQLite backend,
+	which has a write-ahead log of its own; `append_only` only decides
+	whether an updated record moves to the end of the table's order.
+	"""
 
 	def _primary_key(self) -> Any: # type: ignore
 		primary_key_field: str = next(iter(self.__class__.model_fields.keys()))
 		return getattr(self, primary_key_field)
 
+	@staticmethod
+	def _encode_value(key: Any) -> bytes:
+		return encode_str(str(key)).encode()
+
+	def _key_bytes(self) -> bytes:
+		return self.__class__._encode_value(self._primary_key())
+
+	def _row_bytes(self) -> bytes:
+		return self._to_csv_row().encode()
+
+	@classmethod
+	def _table(cls) -> CsvTable | PartitionedTable | SqliteTable:
+		backend = cls._storage_backend()
+		table = _tables.get((cls, cls.data_dir, backend))
+		if table is None:
+			table = _tables.setdefault((cls, cls.data_dir, backend), cls._open_table(backend))
+		return table
+
+	@classmethod
+	def _storage_backend(cls) -> str:
+		backend = cls.storage_backend or os.getenv("STORAGE_BACKEND") or "csv"
+		if backend not in ("csv", "sqlite"):
+			raise ValueError(f"unknown storage backend {backend!r}")
+		return backend
+
+	@classmethod
+	def _wal_durability(cls) -> str | None:
+		if not cls.write_ahead_log:
+			return None
+		return cls.wal_durability or os.getenv("WAL_DURABILITY") or "fsync"
+
+	@classmethod
+	def _open_table(cls, backend: str) -> CsvTable | PartitionedTable | SqliteTable:
+		fields = tuple(cls.model_fields.keys())
+		indexed_columns = tuple(fields.index(field) for field in cls.indexed_fields)
+		text_columns = tuple(fields.index(field) for field in cls.text_indexed_fields)
+		if backend == "sqlite":
+			return SqliteTable.open(
+				Path(cls.data_dir) / SQLITE_FILE_NAME,
+				cls.__name__,
+				fields,
+				indexed_columns = indexed_columns,
+				text_columns = text_columns,
+				append_only = cls.append_only,
+				cache_max_entries = cls.cache_max_entries,
+				cache_max_bytes = cls.cache_max_bytes
+			)
+		if cls.partitions > 1:
+			return PartitionedTable.open(
+				Path(cls.data_dir),
+				cls.__name__,
+				cls._to_csv_header(),
+				cls.partitions,
+				append_only = cls.append_only,
+				garbage_ratio = cls.compaction_garbage_ratio,
+				indexed_columns = indexed_columns,
+				cache_max_entries = cls.cache_max_entries,
+				cache_max_bytes = cls.cache_max_bytes,
+				key_filter = cls.key_filter,
+				wal_durability = cls._wal_durability(),
+				text_columns = text_columns
+			)
+		return CsvTable.open(
+			Path(cls.data_dir + "/" + cls.__name__ + ".csv"),
+			cls._to_csv_header(),
+			append_only = cls.append_only,
+			garbage_ratio = cls.compaction_garbage_ratio,
+			indexed_columns = indexed_columns,
+			cache_max_entries = cls.cache_max_entries,
+			cache_max_bytes = cls.cache_max_bytes,
+			key_filter = cls.key_filter,
+			wal_durability = cls._wal_durability(),
+			text_columns = text_columns
+		)
+
+	@classmethod
+	def table_version(cls) -> Any:
+		"""
+		Returns a value that changes whenever this model's table is written,
+		by this process or any other, so that results derived from the
+		whole table can be cached until then.
+		"""
+		return cls._table().version()
+
+	@classmethod
+	def _predicates(cls, search_fields: dict[str, Any]) -> dict[int, bytes]:
+		"""
+		Maps the column position of each field in `search_fields` to its
+		encoded value, ignoring names that aren't fields of this model.
+		"""
+		predicates: dict[int, bytes] = {}
+		for i, field in enumerate(cls.model_fields.keys()):
+			if field in search_fields:
+				predicates[i] = cls._encode_value(search_fields[field])
+		return predicates
+
+	@classmethod
+	def _scan_rows(cls) -> Iterator[bytes]:
+		return cls._unexpired(cls._table().scan())
+
+	@classmethod
+	def _keyed_rows(cls) -> Iterator[tuple[bytes, bytes]]:
+		"""
+		Yields the `(key, row)` of every row in the table.
+		"""
+		return ((_row_key(row), row) for row in cls._scan_rows())
+
+	@classmethod
+	def _changes_since(cls, position: Any) -> tuple[Any, Any, list[tuple[bytes, bytes | None]] | None]:
+		"""
+		Returns the table's version, a position to pass to this next time,
+		and the `(key, row)` of each row written since `position` (an
+		earlier return of this), with `None` for rows that have since been
+		deleted (or have expired). The rows are `None` instead if they can't
+		be told apart from the rest (see `CsvTable.changes_since`), or if no
+		position is given, in which case the whole table has to be read
+		again.
+
+		Something kept in memory that was loaded from the table (e.g. an
+		index) can keep the position it was loaded at, and later catch up
+		with the writes made without it (e.g. by another process) by
+		decoding just the rows that they changed, rather than all of them.
+		Rows are read after the version is, so they can be newer than it;
+		writes made meanwhile are returned again next time.
+		"""
+		table = cls._table()
+		version, position, keys = table.changes_since(position)
+		if keys is None:
+			return version, position, None
+		rows: list[tuple[bytes, bytes | None]] = []
+		for key in keys:
+			row = table.read_row(key)
+			rows.append((key, None if row is None or cls._row_has_expired(row) else row))
+		return version, position, rows
+
+	@classmethod
+	def _expiry_check(cls) -> Callable[[bytes], bool] | None:
+		"""
+		Returns a function that tells whether a stored row has expired as of
+		now (see `ttl_field`), or `None` if this model's records don't
+		expire.
+		"""
+		if cls.ttl_field is None:
+			return None
+		column = list(cls.model_fields.keys()).index(cls.ttl_field)
+		cutoff = (time() - cls.ttl_seconds) / cls.ttl_field_unit
+
+		def expired(row: bytes) -> bool:
+			columns = row.split(b",", column + 1)
+			try:
+				return column < len(columns) and float(columns[column]) <= cutoff
+			except ValueError:
+				return False
+
+		return expired
+
+	@classmethod
+	def _unexpired(cls, rows: Iterable[bytes]) -> Iterator[bytes]:
+		expired = cls._expiry_check()
+		if expired is None:
+			return iter(rows)
+		return (row for row in rows if not expired(row))
+
+	@classmethod
+	def _row_has_expired(cls, row: bytes) -> bool:
+		expired = cls._expiry_check()
+		return expired is not None and expired(row)
+
+	def _has_expired(self) -> bool:
+		cls = self.__class__
+		if cls.ttl_field is None:
+			return False
+		expires = getattr(self, cls.ttl_field) * cls.ttl_field_unit + cls.ttl_seconds
+		return expires <= time()
+
+	@classmethod
+	def delete_expired(cls) -> int:
+		"""
+		Deletes the records that have expired (see `ttl_field`) with a single
+		rewrite of the table (or a single append, for `append_only` tables),
+		and returns how many there were.
+		"""
+		expired = cls._expiry_check()
+		if expired is None:
+			return 0
+		return cls._table().delete_where(expired)
+
 	@classmethod
 	def generate_primary_key(cls) -> str:
 		"""
-		Generates a unique primary key for this model.
+		Generates a unique primary key for this model. Checking that the key
+		is unused only takes an index (or `key_filter`) lookup.
 		"""
 		new_key = uuid.uuid4().hex
 		while cls.exists(new_key):
@@ -82,38 +394,14 @@ class PersistedModel(CamelizedModel):
 			a matching record couldn't be found.
 		"""
 
-		self.__class__._mutex.acquire()
-
-		original_file = self.__class__._read_csv_file()
-		updated_file = open(
-			f"{self.__class__.data_dir}/tmp_{self.__class__.__name__}_{uuid.uuid4().hex}",
-			"w"
-		)
-
-		prev_record_found = False
-
-		primary_key = encode_str(str(self._primary_key())) # type: ignore
-
-		line = original_file.readline() 
-		while line != "":
-			if line.startswith(primary_key):
-				prev_record_found = True
-				updated_file.write(self._to_csv_row() + "\n")
-			else:
-				updated_file.write(line)
-			line = original_file.readline()
-
-		original_file.close()
-		updated_file.close()
-
-		if prev_record_found:
-			os.replace(updated_file.name, original_file.name)
-		else:
-			os.unlink(updated_file.name)
+		pending = self.__class__._pending_changes()
+		if pending is not None:
+			if not self.__class__._exists_in_batch(pending, self._key_bytes()):
+				return False
+			pending[self._key_bytes()] = self._row_bytes()
+			return True
 
-		self.__class__._mutex.release()
-
-		return prev_record_found
+		return self.__class__._write(self._key_bytes(), self._row_bytes(), if_exists = True)
 
 	def post(self) -> bool:
 		"""
@@ -128,40 +416,14 @@ class PersistedModel(CamelizedModel):
 			an existing record was found to already exist.
 		"""
 
-		self.__class__._mutex.acquire()
-
-		original_file = self.__class__._read_csv_file()
-		updated_file = open(
-			f"{self.__class__.data_dir}/tmp_{self.__class__.__name__}_{uuid.uuid4().hex}",
-			"w"
-		)
-		prev_record_found = False
-
-		primary_key = encode_str(str(self._primary_key())) # type: ignore
-
-		line = original_file.readline() 
-		while line != "":
-			if line.startswith(primary_key):
-				prev_record_found = True
-				break
-			else:
-				updated_file.write(line)
-			line = original_file.readline()
-		
-		if not prev_record_found:
-			updated_file.write(self._to_csv_row() + "\n")
-
-		original_file.close()
-		updated_file.close()
-
-		if not prev_record_found:
-			os.replace(updated_file.name, original_file.name)
-		else:
-			os.unlink(updated_file.name)
-
-		self.__class__._mutex.release()
+		pending = self.__class__._pending_changes()
+		if pending is not None:
+			if self.__class__._exists_in_batch(pending, self._key_bytes()):
+				return False
+			pending[self._key_bytes()] = self._row_bytes()
+			return True
 
-		return not prev_record_found
+		return self.__class__._write(self._key_bytes(), self._row_bytes(), if_exists = False)
 		
 	@classmethod
 	def create(cls, **fields: Any) -> Self:
@@ -189,66 +451,136 @@ class PersistedModel(CamelizedModel):
 			None.
 		"""
 
-		self.__class__._mutex.acquire()
+		pending = self.__class__._pending_changes()
+		if pending is not None:
+			pending[self._key_bytes()] = self._row_bytes()
+			return
 
-		original_file = self.__class__._read_csv_file()
-		updated_file = open(
-			f"{self.__class__.data_dir}/tmp_{self.__class__.__name__}_{uuid.uuid4().hex}",
-			"w"
-		)
-		prev_record_found = False
+		self.__class__._write(self._key_bytes(), self._row_bytes())
 
-		primary_key = encode_str(str(self._primary_key())) # type: ignore
+	def delete(self) -> None:
+		"""
+		Deletes the record of this instance from persistent storage.
 
-		line = original_file.readline() 
-		while line != "":
-			if line.startswith(primary_key):
-				prev_record_found = True
-				updated_file.write(self._to_csv_row() + "\n")
-			else:
-				updated_file.write(line)
-			line = original_file.readline()
+		Returns:
+			None.
+		"""
 
-		if not prev_record_found:
-			updated_file.write(self._to_csv_row() + "\n")
+		pending = self.__class__._pending_changes()
+		if pending is not None:
+			pending[self._key_bytes()] = None
+			return
 
-		original_file.close()
-		updated_file.close()
+		self.__class__._write(self._key_bytes(), None)
 
-		os.replace(updated_file.name, original_file.name)
+	@classmethod
+	@contextmanager
+	def batch(cls) -> Generator[None, None, None]:
+		"""
+		Within this context, `put`, `post`, `patch` and `delete` calls on
+		instances of this class are queued rather than written immediately.
+		When the context exits, they are all applied with a single rewrite of
+		the table (or a single append, for `append_only` tables). If the
+		context exits with an exception, none of them are applied.
 
-		self.__class__._mutex.release()
+		The return values of `post` and `patch` are decided when they are
+		called, taking the writes already queued in the batch into account.
+		Reads inside the batch do not see the queued writes. A batch opened
+		inside another batch for the same class just joins the outer one.
 
-	def delete(self) -> None:
+		Examples:
+			>>> with Book.batch():
+					for book in new_books:
+						book.put()
+					old_book.delete()
 		"""
-		Deletes the record of this instance from persistent storage.
+		batches = _write_batches.get()
+		if batches is not None and cls in batches:
+			yield
+			return
 
-		Returns:
-			None.
-		"""
+		pending: dict[bytes, bytes | None] = {}
+		token = _write_batches.set({**(batches or {}), cls: pending})
+		try:
+			yield
+		finally:
+			_write_batches.reset(token)
 
-		self.__class__._mutex.acquire()
+		cls._write_many(pending)
 
-		original_file = self.__class__._read_csv_file()
-		updated_file = open(
-			f"{self.__class__.data_dir}/tmp_{self.__class__.__name__}_{uuid.uuid4().hex}",
-			"w"
-		)
+	@classmethod
+	def put_many(cls, instances: Iterable[Self]) -> None:
+		"""
+		Works the same as calling `put` on each of the instances, but writes
+		them all at once (see `batch`).
+		"""
+		with cls.batch():
+			for instance in instances:
+				instance.put()
 
-		primary_key = encode_str(str(self._primary_key())) # type: ignore
+	@classmethod
+	def delete_many(cls, instances: Iterable[Self]) -> None:
+		"""
+		Works the same as calling `delete` on each of the instances, but
+		deletes them all at once (see `batch`).
+		"""
+		with cls.batch():
+			for instance in instances:
+				instance.delete()
 
-		line = original_file.readline() 
-		while line != "":
-			if not line.startswith(primary_key):
-				updated_file.write(line)
-			line = original_file.readline()
+	@classmethod
+	def _pending_changes(cls) -> dict[bytes, bytes | None] | None:
+		batches = _write_batches.get()
+		if batches is None:
+			return None
+		return batches.get(cls)
+
+	@classmethod
+	def _exists_in_batch(cls, pending: dict[bytes, bytes | None], key: bytes) -> bool:
+		if key in pending:
+			return pending[key] is not None
+		return cls._table().contains(key)
 
-		original_file.close()
-		updated_file.close()
+	@classmethod
+	def _write(
+		cls,
+		key: bytes,
+		row: bytes | None,
+		if_exists: bool | None = None,
+		replaced: dict[bytes, bytes | None] | None = None
+	) -> bool:
+		"""
+		Writes (or, when `row` is `None`, deletes) a single record in the
+		table; `put`, `post`, `patch` and `delete` all go through here. Models
+		that keep data derived from their records up to date as they change
+		(see `UserReview`) override this and `_write_many`, and can pass
+		`replaced` to learn which rows were replaced (see `CsvTable.write`).
+		"""
+		return cls._table().write(
+			key, row, if_exists = if_exists, replaced = replaced, committed = cls._committed
+		)
 
-		os.replace(updated_file.name, original_file.name)
+	@classmethod
+	def _write_many(
+		cls,
+		changes: dict[bytes, bytes | None],
+		replaced: dict[bytes, bytes | None] | None = None
+	) -> None:
+		"""
+		Applies the changes queued by a `batch` to the table.
+		"""
+		cls._table().write_many(changes, replaced = replaced, committed = cls._committed)
 
-		self.__class__._mutex.release()
+	@classmethod
+	def _committed(cls, changes: dict[bytes, bytes | None], before: Any, after: Any) -> None:
+		"""
+		Called by the table after each write, with the changes it made and
+		the table's versions (see `table_version`) from just before and just
+		after them, while the table is still locked for the write (see
+		`Committed`). Models that keep something in memory in step with
+		their table (see `Book`) override this; it must be quick, and must
+		not raise.
+		"""
 
 	@classmethod
 	def _to_csv_header(cls) -> str:
@@ -293,83 +625,31 @@ class PersistedModel(CamelizedModel):
 
 	@classmethod
 	def _from_csv_row(cls, csv_row: str) -> Self:
-		if csv_row.endswith("\n"):
-			csv_row = csv_row[:-1]
-		fields = {}
-		values = csv_row.split(",")
-		keys = cls.model_fields.keys()
-		for key, value in zip(keys, values):
-			field_info = cls.model_fields[key]
-			annotation = field_info.annotation
-			origin = get_origin(annotation)
-			decoded_value = decode_str(value)
-
-			args = get_args(annotation)
-			allows_none = any(arg is type(None) for arg in args)
-
-			# unwrap Optional/Union types that include None
-			if origin in (UnionType, Union):
-				non_none_args = [arg for arg in args if arg is not type(None)]
-				if len(non_none_args) == 1:
-					annotation = non_none_args[0]
-					origin = get_origin(annotation)
-				else:
-					origin = None
+		"""
+		Parses and validates a row in the format written by `_to_csv_row`.
+		"""
+		return RowCodec.for_model(cls).validate(csv_row) # type: ignore
 
-			if decoded_value == "None" and allows_none:
-				fields[key] = None
-				continue
+	@classmethod
+	def _projector(cls, fields: Sequence[str]) -> Callable[[str], tuple[Any, ...]]:
+		"""
+		Returns a function that decodes just `fields` from a row of this
+		model's table file (see `RowCodec.projector`).
+		"""
+		return RowCodec.for_model(cls).projector(tuple(fields))
 
-			if origin in (list, dict, tuple, set):
-				try:
-					json_value = json.loads(decoded_value)
-				except json.JSONDecodeError:
-					json_value = decoded_value
-
-				if origin is tuple:
-					fields[key] = tuple(json_value) if isinstance(json_value, list) else json_value # pyright: ignore[reportUnknownArgumentType]
-				elif origin is set:
-					fields[key] = set(json_value) if isinstance(json_value, list) else json_value # pyright: ignore[reportUnknownArgumentType]
-				else:
-					fields[key] = json_value
-			else:
-				fields[key] = decoded_value
-		# strip trailing newline then split
-		values = csv_row.removesuffix("\n").split(",")
-		keys = cls.model_fields.keys()
-		for key, value in zip(keys, values):
-			# decode any encoded commas/newlines
-			decoded = decode_str(value)
-			ann = cls.model_fields[key].annotation
-			# strings should remain decoded strings
-			if ann is str:
-				fields[key] = decoded
-			else:
-				# handle explicit None
-				if decoded == "None" or decoded == "":
-					fields[key] = None
-				else:
-					# try literal eval for lists/dicts/numbers
-					try:
-						val = ast.literal_eval(decoded)
-					except Exception:
-						# fallback: try numeric conversion
-						try:
-							val = float(decoded)
-							# if it's an int-valued float, cast to int when annotation expects int
-							if ann is int:
-								val = int(val)
-						except Exception:
-							val = decoded
-					fields[key] = val
-		return cls.model_validate(fields)
+	@classmethod
+	def _from_stored_row(cls, row: bytes) -> Self:
+		"""
+		Parses a row read from this model's table file. Rows in the table were
+		written from valid instances, so this skips validation (falling back
+		to `_from_csv_row` for rows that aren't in the expected format).
+		"""
+		return RowCodec.for_model(cls).construct(row.decode("latin-1")) # type: ignore
 	
 	@classmethod
 	def _drop_table(cls) -> None:
-		cls._mutex.acquire()
-		file_path = Path(cls.data_dir + "/" + cls.__name__ + ".csv")
-		file_path.unlink(missing_ok = True)
-		cls._mutex.release()
+		cls._table().drop()
 
 	@classmethod
 	def get_by_primary_key(cls, search_key: Any) -> Self | None:
@@ -379,6 +659,11 @@ class PersistedModel(CamelizedModel):
 		first field defined on it). If no such instance is found, then this
 		method returns `None`.
 
+		The key must match exactly, and is found through an in-memory index
+		of where each record sits in the table file, so this does not scan
+		the table. If the model has a cache (see `cache_max_entries`), the
+		record may not even be read from the file.
+
 		Args:
 			search_key (Any): The value of the target instance's primary key.
 
@@ -386,30 +671,60 @@ class PersistedModel(CamelizedModel):
 			Self | None: The instance of the class which has the matching key
 			if it exists. Otherwise, returns `None`.
 		"""
-		key_str = encode_str(str(search_key)) # type: ignore
-
-		with cls._read_csv_file() as r:
-			r.readline() # skip the header
-			line = r.readline()
-			while line != "":
-				if line.startswith(key_str):
-					return cls._from_csv_row(line)
-				line = r.readline()
+		table = cls._table()
+		if table.cache is None:
+			row = table.read_row(cls._encode_value(search_key))
+			if row is None or cls._row_has_expired(row):
+				return None
+			return cls._from_stored_row(row)
+
+		instance = table.read_cached(cls._encode_value(search_key), cls._from_stored_row)
+		if instance is None or instance._has_expired():
+			return None
+		# The cached instance is shared, so hand out a copy of it.
+		return instance.model_copy(deep = True)
 
-		return None
+	@classmethod
+	def cache_info(cls) -> dict[str, int] | None:
+		"""
+		Returns the hit, miss and size statistics of this model's cache (see
+		`cache_max_entries`), or `None` if it doesn't have one.
+		"""
+		return cls._table().cache_info()
 	
 	@classmethod
 	def exists(cls, search_key: Any) -> bool:
 		"""
 		Returns True if a record with the provided primary key exists.
 		"""
-		return cls.get_by_primary_key(search_key) is not None
+		table = cls._table()
+		key = cls._encode_value(search_key)
+		if not table.contains(key):
+			return False
+		if cls.ttl_field is None:
+			return True
+		row = table.read_row(key)
+		return row is not None and not cls._row_has_expired(row)
 	
+	@overload
+	@classmethod
+	def get_all(cls) -> Generator[Self, None, None]: ...
+
+	@overload
+	@classmethod
+	def get_all(cls, fields: Sequence[str]) -> Generator[tuple[Any, ...], None, None]: ...
+
 	@classmethod
-	def get_all(cls) -> Generator[Self, None, None]:
+	def get_all(cls, fields: Sequence[str] | None = None) -> Generator[Any, None, None]:
 		"""
 		Yields each stored instance of this class via a generator.
 
+		Args:
+			fields (Sequence[str] | None): If given, only these fields are
+			decoded, and each record is yielded as a tuple of their values
+			(in the same order) instead of as an instance. This is much
+			cheaper when you only need a few of the fields.
+
 		Yields:
 			Self: Instances of this model class in the order that they appear
 			in the persisted table.
@@ -419,16 +734,30 @@ class PersistedModel(CamelizedModel):
 
 			>>> for instance in ExampleClass.get_all():
 				#...
+
+			To only read some fields,
+
+			>>> for user_id, rating in UserReview.get_all(fields = ["user_id", "rating"]):
+				#...
 		"""
-		with cls._read_csv_file() as r:
-			r.readline() # skip the header
-			line = r.readline()
-			while line != "":
-				yield cls._from_csv_row(line)
-				line = r.readline()
+		if fields is not None:
+			project = cls._projector(fields)
+			for row in cls._scan_rows():
+				yield project(row.decode("latin-1"))
+			return
+		for row in cls._scan_rows():
+			yield cls._from_stored_row(row)
 
 	@classmethod
-	def get_where_like(cls, **search_fields: Any) -> Generator[Self, None, None]: # type: ignore
+	def get_where_like(
+		cls,
+		*,
+		skip: int = 0,
+		limit: int | None = None,
+		ranked: bool = False,
+		min_similarity: float | None = None,
+		**search_fields: Any
+	) -> Generator[Self, None, None]: # type: ignore
 		"""
 		Yields each stored instance of this class where the conditions roughly
 		match those set in `search_fields`. If you want a literal search, then
@@ -438,7 +767,23 @@ class PersistedModel(CamelizedModel):
 		that you only do this kind of loose search on fields that truly are
 		strings, but it's not required.
 
+		Searches on `text_indexed_fields` use their index to find the
+		matching records rather than checking every record, and only read
+		the records that are in the requested page of results.
+
 		Args:
+			skip (int): The number of matching records to leave out.
+			limit (int | None): The most records to yield, if any.
+			ranked (bool): Whether to yield the best matches first, rather
+			than in table order. Matches are scored with BM25 on the
+			`text_indexed_fields` that are searched (see
+			`TextIndex.scores`); without any, this has no effect.
+			min_similarity (float | None): If given, a word of a search value
+			also matches words that are at least this similar to it (from
+			0 to 1, see `fuzzy_compare`), so that misspelled searches still
+			find something. 0.4 allows for about one typo in a long word.
+			Searches on `text_indexed_fields` find the similar words in
+			their index rather than checking every record.
 			**search_fields: Here, you can set values for any number of the 
 			class fields. The values will be loosely checked against each
 			record's values.
@@ -446,7 +791,7 @@ class PersistedModel(CamelizedModel):
 		Yields:
 			Self: Instances of this model class that have fields which loosely
 			match the specified values, in the order that they appear in the
-			persisted table.
+			persisted table (unless `ranked`).
 
 		Examples:
 			Suppose you had `Book` as a table. You could do the following:
@@ -461,32 +806,47 @@ class PersistedModel(CamelizedModel):
 				search_values.append(encode_str(str(search_fields[field]))) # type: ignore
 			else:
 				search_values.append(None)
-		
-		with cls._read_csv_file() as r:
-			r.readline() # skip the header
-			line = r.readline()
-			while line != "":
-				values: list[str] = line.\
-					removesuffix("\n").\
-					split(",")
-				match_found = True
-				for i in range(len(values)):
-					if search_values[i] == None:
-						continue
-					if not loose_compare(values[i], search_values[i]): # type: ignore
-						match_found = False
-						break
-				if match_found:
-					yield cls._from_csv_row(line)
-				line = r.readline()
-
-	@classmethod
-	def get_where(cls, **search_fields: Any) -> Generator[Self, None, None]: # type: ignore
+
+		patterns = {
+			i: value.encode() for i, value in enumerate(search_values)
+			if value is not None
+		}
+		if cls.ttl_field is None:
+			rows = cls._table().select_like(patterns, skip, limit, ranked, min_similarity)
+		else:
+			# Expired records must not count towards `skip` and `limit`.
+			rows = islice(
+				cls._unexpired(cls._table().select_like(
+					patterns, ranked = ranked, min_similarity = min_similarity
+				)),
+				skip,
+				None if limit is None else skip + limit
+			)
+		for row in rows:
+			yield cls._from_stored_row(row)
+
+	@overload
+	@classmethod
+	def get_where(cls, *, fields: None = None, **search_fields: Any) -> Generator[Self, None, None]: ...
+
+	@overload
+	@classmethod
+	def get_where(cls, *, fields: Sequence[str], **search_fields: Any) -> Generator[tuple[Any, ...], None, None]: ...
+
+	@classmethod
+	def get_where(cls, *, fields: Sequence[str] | None = None, **search_fields: Any) -> Generator[Any, None, None]: # type: ignore
 		"""
 		Yields each stored instance of this class that matches the conditions
 		set by `search_fields` via a generator.
+
+		If any of the fields is the primary key or is listed in
+		`indexed_fields`, then only the records with matching values for
+		those fields are read. Otherwise, the whole table is scanned.
 		
 		Args:
+			fields (Sequence[str] | None): If given, each matching record is
+			yielded as a tuple of just these fields' values, as in `get_all`.
+
 			**search_fields: Here, you can set values for any number of the
 			class fields. The yielded records will match each of those values.
 
@@ -509,30 +869,14 @@ class PersistedModel(CamelizedModel):
 			):
 				# ...
 		"""
-		search_values: list[str | None] = [] 
-		for field in cls.model_fields.keys():
-			if field in search_fields:
-				search_values.append(encode_str(str(search_fields[field]))) # type: ignore
-			else:
-				search_values.append(None)
-		
-		with cls._read_csv_file() as r:
-			r.readline() # skip the header
-			line = r.readline()
-			while line != "":
-				values: list[str] = line.\
-					removesuffix("\n").\
-					split(",")
-				match_found = True
-				for i in range(len(values)):
-					if search_values[i] == None:
-						continue
-					if search_values[i] != values[i]:
-						match_found = False
-						break
-				if match_found:
-					yield cls._from_csv_row(line)
-				line = r.readline()
+		rows = cls._unexpired(cls._table().select(cls._predicates(search_fields)))
+		if fields is not None:
+			project = cls._projector(fields)
+			for row in rows:
+				yield project(row.decode("latin-1"))
+			return
+		for row in rows:
+			yield cls._from_stored_row(row)
 
 	@classmethod
 	def get_first_where(cls, **search_fields: Any) -> Self | None: # type: ignore
@@ -551,29 +895,128 @@ class PersistedModel(CamelizedModel):
 		Examples:
 			>>> ExampleClass.get_first_where(field_1 = "value", field_2 = 123)
 		"""
-		search_values: list[str | None] = [] 
-		for field in cls.model_fields.keys():
-			if field in search_fields:
-				search_values.append(encode_str(str(search_fields[field]))) # type: ignore
-			else:
-				search_values.append(None)
-		
-		with cls._read_csv_file() as r:
-			r.readline() # skip the header
-			line = r.readline()
-			while line != "":
-				values: list[str] = line.\
-					removesuffix("\n").\
-					split(",")
-				match_found = True
-				for i in range(len(values)):
-					if search_values[i] == None:
-						continue
-					if search_values[i] != values[i]:
-						match_found = False
-						break
-				if match_found:
-					return cls._from_csv_row(line)
-				line = r.readline()
+		for row in cls._unexpired(cls._table().select(cls._predicates(search_fields))):
+			return cls._from_stored_row(row)
 
 		return None
+
+	# The methods below are awaitable versions of the ones above, for use in
+	# async code (such as request handlers). The blocking work runs on the
+	# storage executor (see `db.storage_executor`) instead of the event loop.
+
+	@classmethod
+	async def aget_by_primary_key(cls, search_key: Any) -> Self | None:
+		"""
+		Awaitable version of `get_by_primary_key`.
+		"""
+		return await run_in_storage_executor(cls.get_by_primary_key, search_key)
+
+	@classmethod
+	async def aexists(cls, search_key: Any) -> bool:
+		"""
+		Awaitable version of `exists`.
+		"""
+		return await run_in_storage_executor(cls.exists, search_key)
+
+	@classmethod
+	async def aget_first_where(cls, **search_fields: Any) -> Self | None:
+		"""
+		Awaitable version of `get_first_where`.
+		"""
+		return await run_in_storage_executor(partial(cls.get_first_where, **search_fields))
+
+	@overload
+	@classmethod
+	def aget_all(cls) -> AsyncGenerator[Self, None]: ...
+
+	@overload
+	@classmethod
+	def aget_all(cls, fields: Sequence[str]) -> AsyncGenerator[tuple[Any, ...], None]: ...
+
+	@classmethod
+	def aget_all(cls, fields: Sequence[str] | None = None) -> AsyncGenerator[Any, None]:
+		"""
+		Asynchronous iterator version of `get_all`. Records are read on the
+		storage executor a chunk at a time.
+
+		Examples:
+			>>> async for instance in ExampleClass.aget_all():
+				#...
+		"""
+		if fields is None:
+			return iterate_in_storage_executor(cls.get_all())
+		return iterate_in_storage_executor(cls.get_all(fields))
+
+	@overload
+	@classmethod
+	def aget_where(cls, *, fields: None = None, **search_fields: Any) -> AsyncGenerator[Self, None]: ...
+
+	@overload
+	@classmethod
+	def aget_where(cls, *, fields: Sequence[str], **search_fields: Any) -> AsyncGenerator[tuple[Any, ...], None]: ...
+
+	@classmethod
+	def aget_where(cls, *, fields: Sequence[str] | None = None, **search_fields: Any) -> AsyncGenerator[Any, None]:
+		"""
+		Asynchronous iterator version of `get_where`.
+		"""
+		return iterate_in_storage_executor(cls.get_where(fields = fields, **search_fields))
+
+	@classmethod
+	def aget_where_like(
+		cls,
+		*,
+		skip: int = 0,
+		limit: int | None = None,
+		ranked: bool = False,
+		min_similarity: float | None = None,
+		**search_fields: Any
+	) -> AsyncGenerator[Self, None]:
+		"""
+		Asynchronous iterator version of `get_where_like`.
+		"""
+		return iterate_in_storage_executor(cls.get_where_like(
+			skip = skip,
+			limit = limit,
+			ranked = ranked,
+			min_similarity = min_similarity,
+			**search_fields
+		))
+
+	async def aput(self) -> None:
+		"""
+		Awaitable version of `put`.
+		"""
+		await run_in_storage_executor(self.put)
+
+	async def apost(self) -> bool:
+		"""
+		Awaitable version of `post`.
+		"""
+		return await run_in_storage_executor(self.post)
+
+	async def apatch(self) -> bool:
+		"""
+		Awaitable version of `patch`.
+		"""
+		return await run_in_storage_executor(self.patch)
+
+	async def adelete(self) -> None:
+		"""
+		Awaitable version of `delete`.
+		"""
+		await run_in_storage_executor(self.delete)
+
+	@classmethod
+	async def aput_many(cls, instances: Iterable[Self]) -> None:
+		"""
+		Awaitable version of `put_many`.
+		"""
+		await run_in_storage_executor(cls.put_many, instances)
+
+	@classmethod
+	async def adelete_many(cls, instances: Iterable[Self]) -> None:
+		"""
+		Awaitable version of `delete_many`.
+		"""
+		await run_in_storage_executor(cls.delete_many, instances)
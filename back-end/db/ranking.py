@@ -0,0 +1,75 @@
+from bisect import bisect_left, insort
+from itertools import islice
+from threading import Lock
+from typing import Any, Hashable, Iterable, Iterator
+
+class Ranking:
+	"""
+	A set of keys (e.g. book ids), each with a score, kept sorted from the
+	highest score to the lowest, so that the best ones can be read off the
+	front without sorting them all. Keys with equal scores are in the order
+	they were last set in, as rows are in an append-only table file.
+
+	Scores are changed one key at a time with `set`, which moves just that
+	key within the sorted list.
+
+	Nothing here is thread safe; hold `lock` while using it.
+	"""
+
+	def __init__(self) -> None:
+		self.entries: list[tuple[float, int, Hashable]] = []
+		"""
+		The `(-score, position, key)` of each key, in order.
+		"""
+		self.scores: dict[Hashable, tuple[float, int]] = {}
+		"""
+		The `(-score, position)` of each key, to find its entry by.
+		"""
+		self._next_position = 0
+		self.versions: dict[str, Any] = {}
+		"""
+		The versions (see `PersistedModel.table_version`) of the tables that
+		the ranking reflects, as of its last change, for the owner to tell
+		whether it's still current; empty until it's been loaded.
+		"""
+		self.table_positions: dict[str, Any] = {}
+		"""
+		The positions in the tables' change logs that the ranking was last
+		loaded or caught up at, for the owner to catch up with the writes
+		made since (see `PersistedModel._changes_since`).
+		"""
+		self.lock = Lock()
+
+	def load(self, scores: Iterable[tuple[Hashable, float]]) -> None:
+		"""
+		Replaces the contents of the ranking with the given `(key, score)`
+		pairs, in the order they were set in.
+		"""
+		self.scores = {key: (-score, position) for position, (key, score) in enumerate(scores)}
+		self.entries = sorted((negated, position, key) for key, (negated, position) in self.scores.items())
+		self._next_position = len(self.scores)
+
+	def set(self, key: Hashable, score: float | None) -> None:
+		"""
+		Sets the score of the given key, which goes after any others with the
+		same score; `None` removes it.
+		"""
+		old = self.scores.pop(key, None)
+		if old is not None:
+			del self.entries[bisect_left(self.entries, (*old, key))]
+		if score is None:
+			return
+		new = self.scores[key] = (-score, self._next_position)
+		self._next_position += 1
+		insort(self.entries, (*new, key))
+
+	def best(self, count: int | None = None, exclude: Iterable[Hashable] = ()) -> list[tuple[Hashable, float]]:
+		"""
+		Returns the `(key, score)` of up to `count` keys (or all of them) that
+		aren't in `exclude`, highest score first.
+		"""
+		excluded = set(exclude)
+		ranked: Iterator[tuple[Hashable, float]] = (
+			(key, -negated) for negated, _, key in self.entries if key not in excluded
+		)
+		return list(islice(ranked, count))
@@ -1,44 +1,39 @@
-from typing import Dict, List, Tuple, Iterable, Set
+from typing import Any, Dict, List, Tuple, Iterable, Set
 import math
-from pathlib import Path
 from threading import Lock
 
+from db.models.BookRating import BookRating, book_ranking
 from db.models.UserReview import UserReview
 
 _cached_users: Dict[str, Dict[str, float]] | None = None
-_cached_mtime: float = -1.0
+_cached_version: Any = None
 _cache_lock: Lock = Lock()
 
 
-def _reviews_file_mtime() -> float:
-    file_path = Path(UserReview.data_dir + f"/{UserReview.__name__}.csv")
-    if file_path.exists():
-        return file_path.stat().st_mtime
-    return -1.0
-
-
 def invalidate_recommendation_cache() -> None:
     """Helper for tests or maintenance to clear the in-memory cache."""
-    global _cached_users, _cached_mtime
+    global _cached_users, _cached_version
     with _cache_lock:
         _cached_users = None
-        _cached_mtime = -1.0
+        _cached_version = None
+    with book_ranking.lock:
+        book_ranking.versions = {}
 
 
 def _build_user_item_map() -> Dict[str, Dict[str, float]]:
-    """Return mapping user_id -> {book_id: rating} with simple file mtime caching."""
-    global _cached_users, _cached_mtime
-    current_mtime = _reviews_file_mtime()
+    """Return mapping user_id -> {book_id: rating}, cached until the reviews table changes."""
+    global _cached_users, _cached_version
+    current_version = UserReview.table_version()
     with _cache_lock:
-        if _cached_users is not None and current_mtime == _cached_mtime:
+        if _cached_users is not None and current_version == _cached_version:
             return _cached_users
 
         users: Dict[str, Dict[str, float]] = {}
-        for r in UserReview.get_all():
-            users.setdefault(r.user_id, {})[r.book_id] = float(r.rating)
+        for user_id, book_id, rating in UserReview.get_all(fields=["user_id", "book_id", "rating"]):
+            users.setdefault(user_id, {})[book_id] = float(rating)
 
         _cached_users = users
-        _cached_mtime = current_mtime
+        _cached_version = current_version
         return users
 
 def _cosine(u: Dict[str, float], v: Dict[str, float]) -> float:
@@ -52,24 +47,9 @@ def _cosine(u: Dict[str, float], v: Dict[str, float]) -> float:
         return 0.0
     return dot / (nu * nv)
 
-def _global_rank(users: Dict[str, Dict[str, float]], exclude: Iterable[str] | None = None) -> List[Tuple[str, float]]:
-    totals: Dict[str, float] = {}
-    counts: Dict[str, int] = {}
-    for uvec in users.values():
-        for b, r in uvec.items():
-            totals[b] = totals.get(b, 0.0) + r
-            counts[b] = counts.get(b, 0) + 1
-
-    ranked = sorted(
-        ((book_id, totals[book_id] / counts[book_id]) for book_id in totals.keys()),
-        key=lambda x: x[1],
-        reverse=True,
-    )
-
-    if exclude:
-        exclude_set = set(exclude)
-        ranked = [item for item in ranked if item[0] not in exclude_set]
-    return ranked
+def _global_rank(exclude: Iterable[str] | None = None, count: int | None = None) -> List[Tuple[str, float]]:
+    """Return (book_id, average rating) for up to count rated books, best first (see `BookRating.best_rated`)."""
+    return BookRating.best_rated(count, exclude or ())
 
 
 def recommend_for_user(user_id: str, k_neighbors: int = 5, n_recs: int = 10) -> List[Tuple[str, float]]:
@@ -77,11 +57,13 @@ def recommend_for_user(user_id: str, k_neighbors: int = 5, n_recs: int = 10) ->
 
     Scores are weighted averages of neighbor ratings using cosine similarity.
     """
-    users = _build_user_item_map()
-
     # Cold-start or unknown user fallback: recommend popular books by average rating
+    if UserReview.get_first_where(user_id=user_id) is None:
+        return _global_rank(count=n_recs)
+
+    users = _build_user_item_map()
     if user_id not in users or len(users.get(user_id, {})) == 0:
-        return _global_rank(users)[:n_recs]
+        return _global_rank(count=n_recs)
 
     target = users[user_id]
 
@@ -100,8 +82,7 @@ def recommend_for_user(user_id: str, k_neighbors: int = 5, n_recs: int = 10) ->
     # If there are no similar neighbors with positive similarity,
     # fall back to recommending by global average (cold-start style).
     if not neighbors:
-        ranked = _global_rank(users, exclude=target.keys())
-        return ranked[:n_recs]
+        return _global_rank(exclude=target.keys(), count=n_recs)
 
     neighbor_vectors: List[Tuple[Dict[str, float], float]] = [
         (users[nb_id], sim) for nb_id, sim in neighbors
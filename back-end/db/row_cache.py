@@ -0,0 +1,90 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+class RowCache:
+	"""
+	A least-recently-used cache of decoded records, keyed by their encoded
+	primary key, which is bounded both by the number of entries and by the
+	(approximate) number of bytes they take up. Keys that aren't in the table
+	are cached too, as `None`, so repeated lookups of missing records are
+	also answered from memory.
+
+	The cache doesn't know when records change; `CsvTable` invalidates it on
+	every write and clears it whenever the table file is reloaded.
+	"""
+
+	def __init__(self, max_entries: int, max_bytes: int) -> None:
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self._entries: OrderedDict[bytes, tuple[Any, int]] = OrderedDict()
+		self._bytes = 0
+		self._lock = Lock()
+		self.hits = 0
+		self.negative_hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.invalidations = 0
+
+	def get(self, key: bytes) -> tuple[bool, Any]:
+		"""
+		Returns `(True, value)` if `key` is cached (where the value is `None`
+		for a missing record), or `(False, None)` if it isn't.
+		"""
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				self.misses += 1
+				return False, None
+			self._entries.move_to_end(key)
+			self.hits += 1
+			if entry[0] is None:
+				self.negative_hits += 1
+			return True, entry[0]
+
+	def put(self, key: bytes, value: Any, size: int) -> None:
+		"""
+		Caches `value` under `key`, counting it as `size` bytes (plus the
+		size of the key), and evicts the least recently used entries until
+		the cache is within its bounds again.
+		"""
+		size += len(key)
+		if size > self.max_bytes:
+			return
+		with self._lock:
+			previous = self._entries.pop(key, None)
+			if previous is not None:
+				self._bytes -= previous[1]
+			self._entries[key] = (value, size)
+			self._bytes += size
+			while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+				_, (_, evicted_size) = self._entries.popitem(last = False)
+				self._bytes -= evicted_size
+				self.evictions += 1
+
+	def invalidate(self, key: bytes) -> None:
+		with self._lock:
+			entry = self._entries.pop(key, None)
+			if entry is not None:
+				self._bytes -= entry[1]
+				self.invalidations += 1
+
+	def clear(self) -> None:
+		with self._lock:
+			self.invalidations += len(self._entries)
+			self._entries.clear()
+			self._bytes = 0
+
+	def info(self) -> dict[str, int]:
+		with self._lock:
+			return {
+				"entries": len(self._entries),
+				"bytes": self._bytes,
+				"max_entries": self.max_entries,
+				"max_bytes": self.max_bytes,
+				"hits": self.hits,
+				"negative_hits": self.negative_hits,
+				"misses": self.misses,
+				"evictions": self.evictions,
+				"invalidations": self.invalidations,
+			}
@@ -0,0 +1,240 @@
+import ast
+import json
+from operator import itemgetter
+from typing import Any, Callable, ClassVar, Union, get_args, get_origin
+from types import UnionType
+
+from pydantic import BaseModel, EmailStr
+
+from db.encode_str import decode_str
+
+Decoder = Callable[[str], Any]
+
+def _decode_any(annotation: Any) -> Decoder:
+	"""
+	The general decoder, for annotations that don't have a specific one.
+	It guesses the type of the value from its text.
+	"""
+	def decode(value: str) -> Any:
+		decoded = decode_str(value)
+		if decoded == "None" or decoded == "":
+			return None
+		try:
+			return ast.literal_eval(decoded)
+		except Exception:
+			pass
+		try:
+			number = float(decoded)
+		except ValueError:
+			return decoded
+		return int(number) if annotation is int else number
+	return decode
+
+def _decode_bool(value: str) -> bool:
+	if value == "True":
+		return True
+	if value == "False":
+		return False
+	raise ValueError(f"not a bool: {value}")
+
+def _decode_literal(value: str) -> Any:
+	return ast.literal_eval(decode_str(value))
+
+def _decode_json(origin: Any) -> Decoder:
+	if origin is tuple:
+		return lambda value: tuple(json.loads(decode_str(value)))
+	if origin is set:
+		return lambda value: set(json.loads(decode_str(value)))
+	return lambda value: json.loads(decode_str(value))
+
+def _apply(decode: Decoder, value: str) -> Any:
+	return decode(value)
+
+def _decode_optional(decode: Decoder) -> Decoder:
+	def decode_optional(value: str) -> Any:
+		if value == "None" or value == "":
+			return None
+		return decode(value)
+	return decode_optional
+
+def _decoder_for(annotation: Any) -> Decoder:
+	"""
+	Returns a function that converts a stored column back into a value of
+	the given type, the inverse of `PersistedModel._to_csv_row`. The
+	function raises an exception if the column doesn't hold such a value.
+	"""
+	origin = get_origin(annotation)
+	if origin in (UnionType, Union):
+		args = get_args(annotation)
+		non_none_args = [arg for arg in args if arg is not type(None)]
+		if len(non_none_args) == 1 and len(args) == 2:
+			inner = non_none_args[0]
+			if get_origin(inner) in (list, dict, tuple, set):
+				# `_to_csv_row` only uses JSON for fields that are containers
+				# themselves; optional ones are stored as their `repr`.
+				return _decode_optional(_decode_literal)
+			return _decode_optional(_decoder_for(inner))
+		return _decode_any(annotation)
+	if annotation is str or annotation is EmailStr:
+		return decode_str
+	if annotation is int:
+		return int
+	if annotation is float:
+		return float
+	if annotation is bool:
+		return _decode_bool
+	if origin in (list, dict, tuple, set):
+		return _decode_json(origin)
+	return _decode_any(annotation)
+
+
+def _decodes_none(decode: Decoder) -> bool:
+	try:
+		return decode("None") is None
+	except Exception:
+		return False
+
+
+class RowCodec:
+	"""
+	Decodes the rows of a model's table file in a single pass, using one
+	decoder per column that is chosen once from the model's field types.
+	"""
+
+	_codecs: ClassVar[dict[type[BaseModel], "RowCodec"]] = {}
+
+	def __init__(self, model: type[BaseModel]) -> None:
+		self.model = model
+		self.fields = tuple(model.model_fields.keys())
+		self.decoders = tuple(
+			_decoder_for(field_info.annotation)
+			for field_info in model.model_fields.values()
+		)
+		self.fallbacks = tuple(
+			_decode_any(field_info.annotation)
+			for field_info in model.model_fields.values()
+		)
+		self._projectors: dict[tuple[str, ...], Callable[[str], tuple[Any, ...]]] = {}
+		self.min_columns = len(self.fields)
+		"""
+		The fewest columns a row can have and still be decoded without
+		validation: the fields at the end of the model that default to
+		`None` (typically ones added after older rows were written) can be
+		missing, and are filled in as `None`.
+		"""
+		for field_info, decode in reversed(list(zip(model.model_fields.values(), self.decoders))):
+			if field_info.default is not None or not _decodes_none(decode):
+				break
+			self.min_columns -= 1
+
+	def _columns(self, row: str) -> list[str]:
+		"""
+		Splits `row` into its columns, filling in any that are missing from
+		the end (down to `min_columns`) with `None`.
+		"""
+		columns = row.removesuffix("\n").split(",")
+		if self.min_columns <= len(columns) < len(self.fields):
+			columns.extend(["None"] * (len(self.fields) - len(columns)))
+		return columns
+
+	@classmethod
+	def for_model(cls, model: type[BaseModel]) -> "RowCodec":
+		"""
+		Returns the codec for the given model class, creating it on first use.
+		"""
+		codec = cls._codecs.get(model)
+		if codec is None:
+			codec = cls._codecs.setdefault(model, cls(model))
+		return codec
+
+	def _values(self, row: str) -> dict[str, Any]:
+		"""
+		Decodes each column of `row` with its field's decoder. Raises an
+		exception if a column can't be decoded, or if the row doesn't have
+		exactly one column per field (see `_columns`).
+		"""
+		columns = self._columns(row)
+		if len(columns) != len(self.fields):
+			raise ValueError("wrong number of columns")
+		return {
+			field: decode(column)
+			for field, decode, column in zip(self.fields, self.decoders, columns)
+		}
+
+	def validate(self, row: str) -> BaseModel:
+		"""
+		Decodes `row` into a validated instance of the model. Columns that
+		don't decode as their field's type are left for validation to deal
+		with, and fields missing from the end of the row get their defaults.
+		"""
+		columns = row.removesuffix("\n").split(",")
+		values: dict[str, Any] = {}
+		for field, decode, fallback, column in zip(
+			self.fields, self.decoders, self.fallbacks, columns
+		):
+			try:
+				values[field] = decode(column)
+			except Exception:
+				values[field] = fallback(column)
+		return self.model.model_validate(values)
+
+	def construct(self, row: str) -> BaseModel:
+		"""
+		Decodes `row` into an instance of the model without validating it,
+		which is only safe for rows that were written from valid instances.
+		Rows that aren't in the expected format are validated instead.
+		"""
+		try:
+			values = self._values(row)
+		except Exception:
+			return self.validate(row)
+		if self.model.__private_attributes__:
+			return self.model.model_construct(**values)
+		# The same as `model_construct`, minus the alias and default handling
+		# that a complete row doesn't need.
+		instance = self.model.__new__(self.model)
+		object.__setattr__(instance, "__dict__", values)
+		object.__setattr__(instance, "__pydantic_fields_set__", set(self.fields))
+		object.__setattr__(instance, "__pydantic_extra__", None)
+		object.__setattr__(instance, "__pydantic_private__", None)
+		return instance
+
+	def projector(self, fields: tuple[str, ...]) -> Callable[[str], tuple[Any, ...]]:
+		"""
+		Returns a function that decodes only the given fields of a row, as a
+		tuple in the same order, without building or validating an instance
+		of the model. Rows that aren't in the expected format are validated
+		first.
+
+		Raises:
+			ValueError: if any of the names isn't a field of the model.
+		"""
+		projector = self._projectors.get(fields)
+		if projector is not None:
+			return projector
+
+		unknown = [field for field in fields if field not in self.fields]
+		if unknown:
+			raise ValueError(f"{self.model.__name__} has no fields {unknown}")
+		positions = [self.fields.index(field) for field in fields]
+		decoders = [self.decoders[position] for position in positions]
+		column_count = len(self.fields)
+		if len(positions) == 1:
+			position, = positions
+			decode, = decoders
+			pick = lambda columns: (decode(columns[position]),)
+		else:
+			get_columns = itemgetter(*positions)
+			pick = lambda columns: tuple(map(_apply, decoders, get_columns(columns)))
+
+		def project(row: str) -> tuple[Any, ...]:
+			columns = self._columns(row)
+			if len(columns) == column_count:
+				try:
+					return pick(columns)
+				except Exception:
+					pass
+			instance = self.validate(row)
+			return tuple(getattr(instance, field) for field in fields)
+
+		return self._projectors.setdefault(fields, project)
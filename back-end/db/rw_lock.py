@@ -0,0 +1,54 @@
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Generator
+
+class ReadWriteLock:
+	"""
+	A lock that can be held by any number of readers at once, or by a single
+	writer. Waiting writers take priority over new readers, so a steady
+	stream of reads can't starve writes.
+
+	The lock is not reentrant: a thread must not take it again (in either
+	mode) while it already holds it.
+	"""
+
+	def __init__(self) -> None:
+		self._condition = Condition(Lock())
+		self._readers = 0
+		self._writing = False
+		self._waiting_writers = 0
+
+	@contextmanager
+	def read(self) -> Generator[None, None, None]:
+		"""
+		Holds the lock in shared mode for the duration of the context.
+		"""
+		with self._condition:
+			while self._writing or self._waiting_writers > 0:
+				self._condition.wait()
+			self._readers += 1
+		try:
+			yield
+		finally:
+			with self._condition:
+				self._readers -= 1
+				if self._readers == 0:
+					self._condition.notify_all()
+
+	@contextmanager
+	def write(self) -> Generator[None, None, None]:
+		"""
+		Holds the lock in exclusive mode for the duration of the context.
+		"""
+		with self._condition:
+			self._waiting_writers += 1
+			while self._writing or self._readers > 0:
+				self._condition.wait()
+			self._waiting_writers -= 1
+			self._writing = True
+		try:
+			yield
+		finally:
+			with self._condition:
+				self._writing = False
+				self._condition.notify_all()
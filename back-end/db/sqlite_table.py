@@ -0,0 +1,825 @@
+from contextlib import contextmanager
+from itertools import islice
+from pathlib import Path
+import re
+import sqlite3
+from threading import Lock, local
+from typing import Any, Callable, ClassVar, Generator, Iterator
+
+from db.csv_table import Committed
+from db.loose_compare import loose_words, loosely_matches
+from db.row_cache import RowCache
+from db.rw_lock import ReadWriteLock
+from db.text_index import TextIndex, TextStatistics, rank
+
+_SCAN_CHUNK_SIZE = 1024
+_KEY_CHUNK_SIZE = 500
+"""
+How many rows `_rows_of` looks up with each query, which stays below
+SQLite's limit on the number of parameters of a statement.
+"""
+_MIN_SEARCH_WORD_LENGTH = 3
+"""
+The trigram tokenizer can only find words of at least three characters;
+shorter ones are left for `loose_compare` to check.
+"""
+
+_LOGGED_VERSIONS = 10_000
+"""
+How many of a table's latest versions the change log keeps the changed keys
+of (see `SqliteTable.changes_since`).
+"""
+
+_connections = local()
+
+def _quote(name: str) -> str:
+	return '"' + name.replace('"', '""') + '"'
+
+def _has_fts5() -> bool:
+	try:
+		sqlite3.connect(":memory:").execute(
+			"CREATE VIRTUAL TABLE probe USING fts5(x, tokenize = 'trigram')"
+		)
+	except sqlite3.OperationalError:
+		return False
+	return True
+
+_FTS5 = _has_fts5()
+
+
+class SqliteTable:
+	"""
+	Storage for a single model's table in a SQLite database, with the same
+	interface as `CsvTable`, so that `PersistedModel` can use either (see
+	`PersistedModel.storage_backend`).
+
+	Each of the model's fields is a column of the SQL table, holding the
+	same encoded text that `CsvTable` would store in that column. Rows are
+	passed in and out as the same bytes `CsvTable` uses, so the model's
+	encoding and decoding doesn't depend on the backend. The primary key
+	column is the SQL primary key, and `indexed_columns` get SQL indexes.
+
+	If SQLite has FTS5, the columns listed in `text_columns` are also kept
+	in a trigram full-text index, which `select_like` uses to find the rows
+	that may loosely match a search without scanning the table. Ranked and
+	fuzzy searches instead use the same in-memory `TextIndex` of each of
+	those columns as `CsvTable`, loaded on first use, so that they find and
+	score rows exactly as it does.
+
+	Rows are kept in the order they were inserted. For `append_only`
+	tables, a row that is replaced is deleted and inserted again, so it
+	moves to the end of that order, as it would at the end of the table
+	file.
+
+	Every write runs in its own transaction, and so does each `write_many`.
+	Each thread uses its own connection to the database, which is opened in
+	WAL mode so that reads don't wait for writes.
+	"""
+
+	_tables: ClassVar[dict[tuple[str, str], "SqliteTable"]] = {}
+	_tables_lock: ClassVar[Lock] = Lock()
+
+	def __init__(
+		self,
+		database_path: Path,
+		name: str,
+		columns: tuple[str, ...],
+		indexed_columns: tuple[int, ...] = (),
+		text_columns: tuple[int, ...] = (),
+		append_only: bool = False,
+		cache_max_entries: int = 0,
+		cache_max_bytes: int = 8 * 1024 * 1024
+	) -> None:
+		self.database_path = database_path
+		self.name = name
+		self.columns = columns
+		self.indexed_columns = indexed_columns
+		self.text_columns = text_columns
+		self.append_only = append_only
+		self._fts = _FTS5 and bool(text_columns)
+		self._table = _quote(name)
+		self._fts_table = _quote(name + "__fts")
+		self._column_list = ", ".join(map(_quote, columns))
+		self._qualified_column_list = ", ".join(
+			self._table + "." + _quote(column) for column in columns
+		)
+		self._key_column = _quote(columns[0])
+		self._upsert = (
+			f"INSERT INTO {self._table} ({self._column_list}) "
+			f"VALUES ({', '.join('?' * len(columns))}) "
+			f"ON CONFLICT ({self._key_column}) DO UPDATE SET "
+			+ ", ".join(f"{_quote(column)} = excluded.{_quote(column)}" for column in columns[1:])
+		)
+		self._insert = (
+			f"INSERT INTO {self._table} ({self._column_list}) "
+			f"VALUES ({', '.join('?' * len(columns))})"
+		)
+		self._delete = f"DELETE FROM {self._table} WHERE {self._key_column} = ?"
+		self._lock = ReadWriteLock()
+		self.cache: RowCache | None = None
+		if cache_max_entries > 0:
+			self.cache = RowCache(cache_max_entries, cache_max_bytes)
+		self._cached_version: int | None = None
+		"""
+		The table's version (see `version`) when the cache was last known
+		to be up to date.
+		"""
+		self._text_indexes: dict[int, TextIndex] | None = None
+		self._text_indexes_version: int | None = None
+		"""
+		The table's version that `_text_indexes` are up to date with.
+		"""
+		self._created = False
+		self._creating = Lock()
+		"""
+		Held while the table is created, so that threads that all find it
+		missing (e.g. after a drop) don't each try to create it, contending
+		for SQLite's write lock and backing off in its busy handler.
+		"""
+
+	@classmethod
+	def open(
+		cls,
+		database_path: Path,
+		name: str,
+		columns: tuple[str, ...],
+		indexed_columns: tuple[int, ...] = (),
+		text_columns: tuple[int, ...] = (),
+		append_only: bool = False,
+		cache_max_entries: int = 0,
+		cache_max_bytes: int = 8 * 1024 * 1024
+	) -> "SqliteTable":
+		"""
+		Returns the shared `SqliteTable` for the given table of the given
+		database, creating it on first use.
+		"""
+		table_key = (str(database_path.resolve()), name)
+		table = cls._tables.get(table_key)
+		if table is None:
+			with cls._tables_lock:
+				table = cls._tables.setdefault(
+					table_key,
+					cls(
+						database_path,
+						name,
+						columns,
+						indexed_columns,
+						text_columns,
+						append_only,
+						cache_max_entries,
+						cache_max_bytes
+					)
+				)
+		return table
+
+	def _connection(self) -> sqlite3.Connection:
+		"""
+		Returns this thread's connection to the database, creating the table
+		if it hasn't been yet.
+		"""
+		connections: dict[Path, sqlite3.Connection] = _connections.__dict__.setdefault("by_path", {})
+		connection = connections.get(self.database_path)
+		if connection is None:
+			self.database_path.parent.mkdir(parents = True, exist_ok = True)
+			connection = sqlite3.connect(
+				self.database_path,
+				isolation_level = None,
+				check_same_thread = False,
+				timeout = 30
+			)
+			connection.execute("PRAGMA journal_mode = WAL")
+			connection.execute("PRAGMA synchronous = NORMAL")
+			connections[self.database_path] = connection
+		if not self._created:
+			with self._creating:
+				if not self._created:
+					self._create(connection)
+		return connection
+
+	@contextmanager
+	def _transaction(self, connection: sqlite3.Connection) -> Generator[sqlite3.Connection, None, None]:
+		connection.execute("BEGIN IMMEDIATE")
+		try:
+			yield connection
+		except BaseException:
+			connection.execute("ROLLBACK")
+			raise
+		connection.execute("COMMIT")
+
+	def _create(self, connection: sqlite3.Connection) -> None:
+		"""
+		Creates the table, its indexes and its full-text index if they don't
+		exist, and adds any columns that the table is missing (e.g. for a
+		field that was added to the model).
+		"""
+		with self._transaction(connection):
+			connection.execute(
+				"CREATE TABLE IF NOT EXISTS _table_versions "
+				"(name TEXT PRIMARY KEY NOT NULL, version INTEGER NOT NULL)"
+			)
+			connection.execute(
+				"CREATE TABLE IF NOT EXISTS _changes "
+				"(name TEXT NOT NULL, version INTEGER NOT NULL, key TEXT NOT NULL)"
+			)
+			connection.execute("CREATE INDEX IF NOT EXISTS _changes__version ON _changes (name, version)")
+			# The oldest version of each table that the changes since are
+			# all in the log from.
+			connection.execute(
+				"CREATE TABLE IF NOT EXISTS _changes_start "
+				"(name TEXT PRIMARY KEY NOT NULL, version INTEGER NOT NULL)"
+			)
+			connection.execute(
+				"INSERT OR IGNORE INTO _changes_start (name, version) "
+				"SELECT ?, coalesce((SELECT version FROM _table_versions WHERE name = ?), 0)",
+				(self.name, self.name)
+			)
+			connection.execute(
+				f"CREATE TABLE IF NOT EXISTS {self._table} ("
+				f"{self._key_column} TEXT PRIMARY KEY NOT NULL, "
+				+ ", ".join(f"{_quote(column)} TEXT" for column in self.columns[1:])
+				+ ")"
+			)
+			existing = {
+				row[1] for row in connection.execute(f"PRAGMA table_info({self._table})")
+			}
+			for column in self.columns:
+				if column not in existing:
+					connection.execute(f"ALTER TABLE {self._table} ADD COLUMN {_quote(column)} TEXT")
+			for column in self.indexed_columns:
+				connection.execute(
+					f"CREATE INDEX IF NOT EXISTS {_quote(self.name + '__' + self.columns[column])} "
+					f"ON {self._table} ({_quote(self.columns[column])})"
+				)
+			if self._fts:
+				self._create_fts(connection)
+		self._created = True
+
+	def _create_fts(self, connection: sqlite3.Connection) -> None:
+		wanted = [self.columns[column] for column in self.text_columns]
+		existing = [
+			row[1] for row in connection.execute(f"PRAGMA table_info({self._fts_table})")
+		]
+		if existing == wanted:
+			return
+		if existing:
+			self._drop_fts(connection)
+
+		fts_columns = ", ".join(map(_quote, wanted))
+		new_values = ", ".join("new." + _quote(column) for column in wanted)
+		old_values = ", ".join("old." + _quote(column) for column in wanted)
+		connection.execute(
+			f"CREATE VIRTUAL TABLE {self._fts_table} USING fts5("
+			f"{fts_columns}, content = {self._table}, content_rowid = 'rowid', "
+			"tokenize = 'trigram')"
+		)
+		connection.execute(
+			f"CREATE TRIGGER {_quote(self.name + '__fts_insert')} AFTER INSERT ON {self._table} BEGIN "
+			f"INSERT INTO {self._fts_table} (rowid, {fts_columns}) VALUES (new.rowid, {new_values}); END"
+		)
+		connection.execute(
+			f"CREATE TRIGGER {_quote(self.name + '__fts_delete')} AFTER DELETE ON {self._table} BEGIN "
+			f"INSERT INTO {self._fts_table} ({self._fts_table}, rowid, {fts_columns}) "
+			f"VALUES ('delete', old.rowid, {old_values}); END"
+		)
+		connection.execute(
+			f"CREATE TRIGGER {_quote(self.name + '__fts_update')} AFTER UPDATE ON {self._table} BEGIN "
+			f"INSERT INTO {self._fts_table} ({self._fts_table}, rowid, {fts_columns}) "
+			f"VALUES ('delete', old.rowid, {old_values}); "
+			f"INSERT INTO {self._fts_table} (rowid, {fts_columns}) VALUES (new.rowid, {new_values}); END"
+		)
+		connection.execute(f"INSERT INTO {self._fts_table} ({self._fts_table}) VALUES ('rebuild')")
+
+	def _drop_fts(self, connection: sqlite3.Connection) -> None:
+		for trigger in ("__fts_insert", "__fts_delete", "__fts_update"):
+			connection.execute(f"DROP TRIGGER IF EXISTS {_quote(self.name + trigger)}")
+		connection.execute(f"DROP TABLE IF EXISTS {self._fts_table}")
+
+	def _values(self, key: bytes, row: bytes) -> list[str | None]:
+		"""
+		Splits a stored row into the values of its columns, padding it with
+		NULLs if it is short.
+		"""
+		values: list[str | None] = list(row.removesuffix(b"\n").decode().split(","))
+		values[0] = key.decode()
+		values.extend([None] * (len(self.columns) - len(values)))
+		return values
+
+	@staticmethod
+	def _row(values: tuple[str | None, ...]) -> bytes:
+		"""
+		Joins the values of a SQL row back into a stored row. Trailing NULLs
+		(columns that were added after the row was written) are left off, as
+		they would be in a table file written before the columns existed.
+		"""
+		end = len(values)
+		while end > 0 and values[end - 1] is None:
+			end -= 1
+		return ",".join(values[:end]).encode() + b"\n" # type: ignore
+
+	def version(self) -> int:
+		"""
+		Returns a number that changes whenever the table is written, by this
+		or any other process.
+		"""
+		row = self._connection().execute(
+			"SELECT version FROM _table_versions WHERE name = ?", (self.name,)
+		).fetchone()
+		return 0 if row is None else row[0]
+
+	def _bump_version(self, connection: sqlite3.Connection) -> int:
+		"""
+		Increments the table's version inside the current transaction, and
+		returns the version it had before.
+		"""
+		connection.execute(
+			"INSERT INTO _table_versions (name, version) VALUES (?, 1) "
+			"ON CONFLICT (name) DO UPDATE SET version = version + 1",
+			(self.name,)
+		)
+		return connection.execute(
+			"SELECT version FROM _table_versions WHERE name = ?", (self.name,)
+		).fetchone()[0] - 1
+
+	def _log_changes(self, connection: sqlite3.Connection, keys: Any, version: int) -> None:
+		"""
+		Records in the change log, inside the current transaction, that the
+		rows with the given keys were written at `version`, and forgets the
+		changes of all but the latest `_LOGGED_VERSIONS` versions.
+		"""
+		connection.executemany(
+			"INSERT INTO _changes (name, version, key) VALUES (?, ?, ?)",
+			((self.name, version, key.decode()) for key in keys)
+		)
+		if version % 100 == 0:
+			oldest = version - _LOGGED_VERSIONS
+			connection.execute("DELETE FROM _changes WHERE name = ? AND version <= ?", (self.name, oldest))
+			connection.execute(
+				"UPDATE _changes_start SET version = max(version, ?) WHERE name = ?", (oldest, self.name)
+			)
+
+	def changes_since(self, position: Any = None) -> tuple[Any, Any, list[bytes] | None]:
+		"""
+		Works the same as `CsvTable.changes_since`. The position is the
+		table's version, and the changed keys are kept in a log table,
+		written in the same transactions as the changes, for the latest
+		`_LOGGED_VERSIONS` versions.
+		"""
+		connection = self._connection()
+		# The version and the changes are read in one transaction, so that
+		# they agree.
+		connection.execute("BEGIN")
+		try:
+			version = self.version()
+			keys = None
+			start = connection.execute(
+				"SELECT version FROM _changes_start WHERE name = ?", (self.name,)
+			).fetchone()
+			if position is not None and start is not None and start[0] <= position:
+				keys = [
+					key.encode() for key, in connection.execute(
+						"SELECT key FROM _changes WHERE name = ? AND version > ? "
+						"GROUP BY key ORDER BY min(rowid)",
+						(self.name, position)
+					)
+				]
+		finally:
+			connection.execute("COMMIT")
+		return version, version, keys
+
+	def read_row(self, key: bytes) -> bytes | None:
+		values = self._connection().execute(
+			f"SELECT {self._column_list} FROM {self._table} WHERE {self._key_column} = ?",
+			(key.decode(),)
+		).fetchone()
+		return None if values is None else self._row(values)
+
+	def read_cached(self, key: bytes, decode: Callable[[bytes], Any]) -> Any:
+		"""
+		Returns `decode` of the row stored under `key` (or `None` if there
+		isn't one), from the cache if possible.
+		"""
+		assert self.cache is not None
+		with self._lock.read():
+			version = self.version()
+			if version != self._cached_version:
+				# Another process has written the table since.
+				self.cache.clear()
+				self._cached_version = version
+			found, value = self.cache.get(key)
+			if found:
+				return value
+			row = self.read_row(key)
+			value = None if row is None else decode(row)
+			self.cache.put(key, value, 0 if row is None else len(row))
+			return value
+
+	def cache_info(self) -> dict[str, int] | None:
+		return None if self.cache is None else self.cache.info()
+
+	def contains(self, key: bytes) -> bool:
+		return self._connection().execute(
+			f"SELECT 1 FROM {self._table} WHERE {self._key_column} = ?", (key.decode(),)
+		).fetchone() is not None
+
+	def _select(self, where: str, parameters: tuple[Any, ...], join: str = "") -> Iterator[bytes]:
+		"""
+		Yields the rows that match a SQL condition, in insertion order. The
+		rows are fetched a chunk at a time, each with a fresh query, so that
+		no statement is left open while the caller handles them (possibly on
+		another thread). Rows inserted after the scan started are not
+		included.
+		"""
+		connection = self._connection()
+		last = connection.execute(f"SELECT max(rowid) FROM {self._table}").fetchone()[0]
+		if last is None:
+			return
+		position = 0
+		while position < last:
+			rows = self._connection().execute(
+				f"SELECT {self._table}.rowid, {self._qualified_column_list} FROM {self._table} {join} "
+				f"WHERE {self._table}.rowid > ? AND {self._table}.rowid <= ? {where} "
+				f"ORDER BY {self._table}.rowid LIMIT {_SCAN_CHUNK_SIZE}",
+				(position, last, *parameters)
+			).fetchall()
+			for row in rows:
+				yield self._row(row[1:])
+			if len(rows) < _SCAN_CHUNK_SIZE:
+				return
+			position = rows[-1][0]
+
+	def scan(self) -> Iterator[bytes]:
+		"""
+		Yields every row in the table, in the order they were inserted.
+		"""
+		return self._select("", ())
+
+	def select(self, predicates: dict[int, bytes]) -> Iterator[bytes]:
+		"""
+		Yields every row whose columns equal the given (encoded) values,
+		where `predicates` maps column positions to values, in the order
+		they were inserted. SQLite uses the primary key or an index to find
+		them if it can.
+		"""
+		if 0 in predicates:
+			row = self.read_row(predicates[0])
+			if row is None:
+				return iter(())
+			columns = row.removesuffix(b"\n").split(b",")
+			if all(
+				column < len(columns) and columns[column] == value
+				for column, value in predicates.items()
+			):
+				return iter((row,))
+			return iter(())
+		where = "".join(
+			f" AND {self._table}.{_quote(self.columns[column])} = ?"
+			for column in predicates
+		)
+		return self._select(where, tuple(value.decode() for value in predicates.values()))
+
+	@contextmanager
+	def _text_indexed(self) -> Generator[dict[int, TextIndex], None, None]:
+		"""
+		Yields the text indexes of `text_columns`, up to date with the
+		latest version of the table, holding the table's lock so that no
+		write of this process can change them for the duration of the
+		context. They are loaded on first use, and loaded again if another
+		process has written the table since.
+		"""
+		with self._lock.read():
+			if self._text_indexes is not None and self._text_indexes_version == self.version():
+				yield self._text_indexes
+				return
+		with self._lock.write():
+			if self._text_indexes is None or self._text_indexes_version != self.version():
+				text_indexes = {column: TextIndex() for column in self.text_columns}
+				connection = self._connection()
+				# The version and the rows are read in one transaction, so
+				# that they agree.
+				connection.execute("BEGIN")
+				try:
+					version = self.version()
+					for values in connection.execute(f"SELECT {self._column_list} FROM {self._table}"):
+						for column, text_index in text_indexes.items():
+							text_index.add(values[0].encode(), (values[column] or "").encode())
+				finally:
+					connection.execute("COMMIT")
+				self._text_indexes = text_indexes
+				self._text_indexes_version = version
+			yield self._text_indexes # type: ignore
+
+	def _update_text_indexes(
+		self,
+		replaced: dict[bytes, bytes | None],
+		changes: dict[bytes, bytes | None],
+		previous_version: int
+	) -> None:
+		"""
+		Applies written `changes`, which replaced the rows in `replaced`, to
+		the loaded text indexes. If the table was also written by another
+		process since they were loaded, they are dropped instead, to be
+		loaded again when next needed. Must be called holding the write
+		lock.
+		"""
+		text_indexes = self._text_indexes
+		if text_indexes is None:
+			return
+		if self._text_indexes_version != previous_version:
+			self._text_indexes = None
+			return
+		for key, row in changes.items():
+			old_row = replaced.get(key)
+			if old_row is not None:
+				values = self._values(key, old_row)
+				for column, text_index in text_indexes.items():
+					text_index.remove(key, (values[column] or "").encode())
+			if row is not None:
+				values = self._values(key, row)
+				for column, text_index in text_indexes.items():
+					text_index.add(key, (values[column] or "").encode())
+		self._text_indexes_version = previous_version + 1
+
+	def _rows_of(self, keys: list[bytes]) -> dict[bytes, tuple[int, bytes]]:
+		"""
+		Returns the stored rows of those of `keys` that exist, each with its
+		position in insertion order (its rowid).
+		"""
+		connection = self._connection()
+		rows: dict[bytes, tuple[int, bytes]] = {}
+		for start in range(0, len(keys), _KEY_CHUNK_SIZE):
+			chunk = [key.decode() for key in keys[start:start + _KEY_CHUNK_SIZE]]
+			for values in connection.execute(
+				f"SELECT rowid, {self._column_list} FROM {self._table} "
+				f"WHERE {self._key_column} IN ({', '.join('?' * len(chunk))})",
+				chunk
+			):
+				rows[values[1].encode()] = (values[0], self._row(values[1:]))
+		return rows
+
+	def text_statistics(
+		self,
+		patterns: dict[int, bytes],
+		min_similarity: float | None = None
+	) -> dict[int, TextStatistics]:
+		"""
+		Returns the statistics (see `TextStatistics`) of each of the given
+		(encoded) search values that `rank_like` would score rows by.
+		"""
+		with self._text_indexed() as text_indexes:
+			return {
+				column: text_indexes[column].statistics(value.decode(), min_similarity)
+				for column, value in patterns.items()
+				if column in text_indexes and loose_words(value.decode())
+			}
+
+	def rank_like(
+		self,
+		patterns: dict[int, bytes],
+		limit: int | None = None,
+		statistics: dict[int, TextStatistics] | None = None,
+		min_similarity: float | None = None
+	) -> list[tuple[float, bytes]]:
+		"""
+		Returns the `limit` rows (or all of them) that best match the given
+		(encoded) search values, with their scores, best first, scored and
+		put in order exactly as `CsvTable.rank_like` does.
+		"""
+		search_values = {column: value.decode() for column, value in patterns.items()}
+		looked_up: list[tuple[TextIndex, str, TextStatistics | None]] = []
+		unchecked: dict[int, str] = {}
+		with self._text_indexed() as text_indexes:
+			for column, search_value in search_values.items():
+				text_index = text_indexes.get(column)
+				if text_index is None or not loose_words(search_value):
+					unchecked[column] = search_value
+				else:
+					looked_up.append((
+						text_index,
+						search_value,
+						None if statistics is None else statistics[column]
+					))
+			if looked_up:
+				# Rows that fail the unchecked search values would leave
+				# the page short, so every candidate is put in order then.
+				best = rank(looked_up, None if unchecked else limit, min_similarity)
+
+		if not looked_up:
+			return [
+				(0.0, row) for row in
+				islice(self.select_like(patterns, min_similarity = min_similarity), limit)
+			]
+		rows = self._rows_of([key for _, key in best])
+		return list(islice(
+			(
+				(score, rows[key][1]) for score, key in best
+				if key in rows and (not unchecked or loosely_matches(rows[key][1], unchecked, min_similarity))
+			),
+			limit
+		))
+
+	def select_like(
+		self,
+		patterns: dict[int, bytes],
+		skip: int = 0,
+		limit: int | None = None,
+		ranked: bool = False,
+		min_similarity: float | None = None
+	) -> Iterator[bytes]:
+		"""
+		Yields every row that loosely matches (see `loose_compare`) the
+		given (encoded) search values, where `patterns` maps column positions
+		to values, in the order they were inserted, or best match first if
+		`ranked` (see `rank_like`). The first `skip` matching rows are left
+		out, and at most `limit` are yielded. If `min_similarity` is given,
+		the rows only have to match fuzzily (see `fuzzy_compare`).
+
+		Each row that loosely matches a value contains every word of it, so
+		the full-text index narrows the rows down to those that contain all
+		of the (long enough) words of the values in the indexed columns.
+		Fuzzy searches, and searches without FTS5, look the values up in the
+		text indexes instead, as `CsvTable.select_like` does.
+		"""
+		search_values = {column: value.decode() for column, value in patterns.items()}
+		stop = None if limit is None else skip + limit
+		if ranked:
+			return iter([row for _, row in self.rank_like(patterns, stop, None, min_similarity)[skip:]])
+
+		rows: Iterator[bytes] | None = None
+		unchecked = search_values
+		if self._fts and min_similarity is None:
+			terms = []
+			for column, value in search_values.items():
+				if column not in self.text_columns:
+					continue
+				words = {
+					word for word in re.findall(r"\b\w+\b", value.lower())
+					if len(word) >= _MIN_SEARCH_WORD_LENGTH and word.isascii()
+				}
+				terms.extend(f'{self.columns[column]} : "{word}"' for word in sorted(words))
+			if terms:
+				rows = self._select(
+					f"AND {self._fts_table} MATCH ?",
+					(" AND ".join(terms),),
+					join = f"JOIN {self._fts_table} ON {self._fts_table}.rowid = {self._table}.rowid"
+				)
+		elif any(column in self.text_columns for column in patterns):
+			candidates: set[bytes] | None = None
+			unchecked = {}
+			with self._text_indexed() as text_indexes:
+				for column, search_value in search_values.items():
+					text_index = text_indexes.get(column)
+					keys = None if text_index is None else text_index.matches(search_value, min_similarity)
+					if keys is None:
+						unchecked[column] = search_value
+						continue
+					candidates = keys if candidates is None else candidates & keys
+			if candidates is None:
+				unchecked = search_values
+			else:
+				rows = (row for _, row in sorted(self._rows_of(list(candidates)).values()))
+		if rows is None:
+			rows = self.scan()
+		return islice(
+			(row for row in rows if not unchecked or loosely_matches(row, unchecked, min_similarity)),
+			skip,
+			stop
+		)
+
+	def write(
+		self,
+		key: bytes,
+		row: bytes | None,
+		if_exists: bool | None = None,
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> bool:
+		"""
+		Stores `row` under `key`, or deletes the record with that key when
+		`row` is `None`, in the same way as `CsvTable.write`.
+		"""
+		connection = self._connection()
+		with self._lock.write():
+			with self._transaction(connection):
+				old_row = self.read_row(key)
+				exists = old_row is not None
+				if if_exists is not None and exists != if_exists:
+					return False
+				if row is None and not exists:
+					return False
+				if replaced is not None:
+					replaced[key] = old_row
+				self._store(connection, key, row)
+				previous_version = self._bump_version(connection)
+				self._log_changes(connection, (key,), previous_version + 1)
+			self._invalidate([key], previous_version)
+			self._update_text_indexes({key: old_row}, {key: row}, previous_version)
+			if committed is not None:
+				committed({key: row}, previous_version, previous_version + 1)
+		return True
+
+	def write_many(
+		self,
+		changes: dict[bytes, bytes | None],
+		replaced: dict[bytes, bytes | None] | None = None,
+		committed: Committed | None = None
+	) -> None:
+		"""
+		Applies several writes in a single transaction: each key is stored
+		with its row, or deleted when its row is `None`. `replaced` and
+		`committed` work as with `CsvTable.write`.
+		"""
+		if not changes:
+			return
+		connection = self._connection()
+		with self._lock.write():
+			old_rows: dict[bytes, bytes | None] = {}
+			with self._transaction(connection):
+				if replaced is not None or self._text_indexes is not None:
+					for key, row in changes.items():
+						old_row = self.read_row(key)
+						if row is not None or old_row is not None:
+							old_rows[key] = old_row
+				connection.executemany(self._delete, (
+					(key.decode(),) for key, row in changes.items()
+					if row is None or self.append_only
+				))
+				connection.executemany(self._insert if self.append_only else self._upsert, (
+					self._values(key, row) for key, row in changes.items() if row is not None
+				))
+				previous_version = self._bump_version(connection)
+				self._log_changes(connection, changes, previous_version + 1)
+			if replaced is not None:
+				replaced.update(old_rows)
+			self._invalidate(changes.keys(), previous_version)
+			self._update_text_indexes(old_rows, changes, previous_version)
+			if committed is not None:
+				committed(changes, previous_version, previous_version + 1)
+
+	def delete_where(self, predicate: Callable[[bytes], bool]) -> int:
+		"""
+		Deletes every row for which `predicate(row)` is True, in a single
+		transaction, and returns how many were deleted. No write can change
+		a row between it being checked and deleted.
+		"""
+		connection = self._connection()
+		with self._lock.write():
+			with self._transaction(connection):
+				deleted: dict[bytes, bytes | None] = {}
+				for values in connection.execute(f"SELECT {self._column_list} FROM {self._table}"):
+					row = self._row(values)
+					if predicate(row):
+						deleted[values[0].encode()] = row
+				if not deleted:
+					return 0
+				connection.executemany(self._delete, ((key.decode(),) for key in deleted))
+				previous_version = self._bump_version(connection)
+				self._log_changes(connection, deleted, previous_version + 1)
+			self._invalidate(deleted.keys(), previous_version)
+			self._update_text_indexes(deleted, dict.fromkeys(deleted), previous_version)
+		return len(deleted)
+
+	def _store(self, connection: sqlite3.Connection, key: bytes, row: bytes | None) -> None:
+		if row is None or self.append_only:
+			connection.execute(self._delete, (key.decode(),))
+		if row is not None:
+			connection.execute(self._insert if self.append_only else self._upsert, self._values(key, row))
+
+	def _invalidate(self, keys: Any, previous_version: int) -> None:
+		"""
+		Drops the written keys from the cache. If the table was also written
+		by another process since the cache was last checked, the whole cache
+		is dropped instead.
+		"""
+		if self.cache is None:
+			return
+		if self._cached_version != previous_version:
+			self.cache.clear()
+		else:
+			for key in keys:
+				self.cache.invalidate(key)
+		self._cached_version = previous_version + 1
+
+	def drop(self) -> None:
+		"""
+		Deletes the table, including its indexes, and bumps its version.
+		"""
+		connection = self._connection()
+		with self._lock.write():
+			with self._transaction(connection):
+				self._drop_fts(connection)
+				connection.execute(f"DROP TABLE IF EXISTS {self._table}")
+				# The version keeps counting up, so that nothing cached from
+				# before the drop can pass for the new table.
+				version = self._bump_version(connection) + 1
+				# Nothing can catch up with a drop from the change log.
+				connection.execute("DELETE FROM _changes WHERE name = ?", (self.name,))
+				connection.execute(
+					"INSERT INTO _changes_start (name, version) VALUES (?, ?) "
+					"ON CONFLICT (name) DO UPDATE SET version = excluded.version",
+					(self.name, version)
+				)
+			self._created = False
+			if self.cache is not None:
+				self.cache.clear()
+			self._cached_version = None
+			self._text_indexes = None
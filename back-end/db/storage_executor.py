@@ -0,0 +1,121 @@
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from itertools import islice
+import multiprocessing
+import os
+from threading import Lock
+from typing import Any, AsyncGenerator, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+CHUNK_SIZE = 256
+"""
+The number of records that `iterate_in_storage_executor` reads per trip to
+the executor.
+"""
+
+def _max_workers_from_env() -> int:
+	raw = os.getenv("STORAGE_MAX_WORKERS")
+	if not raw:
+		return 8
+	try:
+		value = int(raw)
+		return value if value > 0 else 8
+	except ValueError:
+		return 8
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = Lock()
+_scan_executor: Executor | None = None
+
+def storage_executor() -> ThreadPoolExecutor:
+	"""
+	Returns the thread pool that runs blocking storage work for async code.
+	Its size is set by the `STORAGE_MAX_WORKERS` environment variable
+	(8 by default), which bounds how many table reads and writes can be in
+	progress at once.
+	"""
+	global _executor
+	if _executor is None:
+		with _executor_lock:
+			if _executor is None:
+				_executor = ThreadPoolExecutor(
+					max_workers = _max_workers_from_env(),
+					thread_name_prefix = "storage"
+				)
+	return _executor
+
+def scan_workers() -> int:
+	"""
+	The number of workers in the scan pool (see `scan_executor`).
+	"""
+	raw = os.getenv("PARTITION_SCAN_WORKERS")
+	if raw and raw.isdigit() and int(raw) > 0:
+		return int(raw)
+	return os.cpu_count() or 1
+
+def scan_executor() -> Executor:
+	"""
+	Returns the pool that scans the partitions of a partitioned table (see
+	`PersistedModel.partitions`) in parallel. By default this is a pool of
+	processes, since scanning is CPU-bound; set `PARTITION_SCAN_POOL` to
+	`thread` to use threads instead. `PARTITION_SCAN_WORKERS` sets its size
+	(by default, the number of CPUs).
+	"""
+	global _scan_executor
+	if _scan_executor is None:
+		with _executor_lock:
+			if _scan_executor is None:
+				workers = scan_workers()
+				if os.getenv("PARTITION_SCAN_POOL") == "thread":
+					_scan_executor = ThreadPoolExecutor(
+						max_workers = workers,
+						thread_name_prefix = "scan"
+					)
+				else:
+					# Forking a process that has other threads running isn't
+					# safe, so the workers are started fresh.
+					_scan_executor = ProcessPoolExecutor(
+						max_workers = workers,
+						mp_context = multiprocessing.get_context("spawn")
+					)
+	return _scan_executor
+
+async def run_in_storage_executor(function: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+	"""
+	Runs a blocking function on the storage executor without blocking the
+	event loop, and returns its result.
+
+	The function runs in a copy of the caller's context, so that e.g. writes
+	made inside an open `PersistedModel.batch` still join that batch.
+	"""
+	loop = asyncio.get_running_loop()
+	context = copy_context()
+	return await loop.run_in_executor(
+		storage_executor(),
+		partial(context.run, function, *args, **kwargs)
+	)
+
+async def iterate_in_storage_executor(iterator: Iterator[T], chunk_size: int = CHUNK_SIZE) -> AsyncGenerator[T, None]:
+	"""
+	Asynchronously yields the items of a blocking iterator, reading them on
+	the storage executor `chunk_size` at a time.
+	"""
+	try:
+		while True:
+			chunk = await run_in_storage_executor(list, islice(iterator, chunk_size))
+			for item in chunk:
+				yield item
+			if len(chunk) < chunk_size:
+				return
+	finally:
+		close = getattr(iterator, "close", None)
+		if close is not None:
+			try:
+				close()
+			except ValueError:
+				# Still running on the executor, because this was cancelled
+				# mid-chunk; it will be cleaned up when it's collected.
+				pass
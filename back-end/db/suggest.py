@@ -0,0 +1,71 @@
+from threading import Lock
+
+from db.loose_compare import loose_words
+from db.models.Book import Book, title_terms
+from db.models.BookRating import BookRating
+
+_catching_up = Lock()
+"""
+Held while `title_terms` is loaded or caught up with the tables, so that
+it's only done once at a time.
+"""
+
+def _catch_up_title_terms() -> None:
+	"""
+	Loads `title_terms` when it's first used, and afterwards catches it up
+	with the books and ratings that were written without it (e.g. by another
+	process), if any. Only the rows that those writes changed are read and
+	decoded (see `PersistedModel._changes_since`), so e.g. another process
+	writing new average ratings doesn't make it reload every title.
+
+	The tables are read without holding its lock, since writes take the lock
+	while their table is locked (see `Book._committed`).
+	"""
+	with _catching_up:
+		versions = {"Book": Book.table_version(), "BookRating": BookRating.table_version()}
+		with title_terms.lock:
+			if title_terms.versions == versions:
+				return
+			loaded = dict(title_terms.versions)
+			positions = dict(title_terms.table_positions) if loaded else {}
+		changes: dict[str, list[tuple[bytes, bytes | None]] | None] = {}
+		for model in (Book, BookRating):
+			name = model.__name__
+			if loaded.get(name) != versions[name]:
+				versions[name], positions[name], changes[name] = model._changes_since(positions.get(name))
+		# The dictionary is loaded from both tables at once, so if either has
+		# to be read again, both are. The rows are read after the positions
+		# that the dictionary is caught up to, so they're at least as new.
+		reload = any(changed is None for changed in changes.values())
+		book_rows = Book._keyed_rows() if reload else changes.get("Book") or []
+		rating_rows = BookRating._keyed_rows() if reload else changes.get("BookRating") or []
+		documents = [(key, [] if row is None else Book.title_words(row)) for key, row in book_rows]
+		project = BookRating._projector(("review_count",))
+		weights = [(key, 0 if row is None else project(row.decode("latin-1"))[0]) for key, row in rating_rows]
+		with title_terms.lock:
+			if reload:
+				title_terms.load(documents, weights)
+			else:
+				for key, terms in documents:
+					title_terms.set(key, terms)
+				for key, weight in weights:
+					title_terms.weigh(key, weight)
+			title_terms.versions = versions
+			title_terms.table_positions = positions
+
+def suggest_title_words(prefix: str, limit: int = 10) -> list[str]:
+	"""
+	Returns up to `limit` title words that complete the last word of
+	`prefix`, most reviewed first.
+
+	A word's popularity is the number of reviews of all the books with it in
+	their titles; ties go to the word in the most titles. `prefix` is
+	compared in lower case, and an empty prefix (or one ending in a space or
+	punctuation) gets the most popular words overall.
+	"""
+	prefix = prefix.lower()
+	words = loose_words(prefix)
+	last_word = words[-1] if words and prefix.endswith(words[-1]) else ""
+	_catch_up_title_terms()
+	with title_terms.lock:
+		return title_terms.complete(last_word, limit)
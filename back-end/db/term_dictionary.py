@@ -0,0 +1,176 @@
+from bisect import bisect_left, insort
+from heapq import nsmallest
+from threading import Lock
+from typing import Any, Iterable
+
+_CACHED_RANGE = 256
+"""
+How many terms a prefix must have before its best completions are kept
+(see `TermDictionary.complete`); shorter ranges are quick to rank again.
+"""
+_CACHED_COMPLETIONS = 20
+"""
+How many of a prefix's best completions are kept.
+"""
+
+class TermDictionary:
+	"""
+	A sorted array of the terms (e.g. title words) of a set of documents,
+	each with a popularity: the total weight of the documents that have it.
+	The terms that start with a prefix are next to each other, so `complete`
+	finds them by binary search, and returns the most popular.
+
+	Documents and weights are changed one at a time with `set` and `weigh`,
+	which only touch the terms involved. The best completions of prefixes
+	with many terms are kept until one of their terms changes enough to
+	enter or leave them.
+
+	Nothing here is thread safe; hold `lock` while using it.
+	"""
+
+	def __init__(self) -> None:
+		self.terms: list[str] = []
+		self.documents: dict[bytes, tuple[str, ...]] = {}
+		"""
+		The distinct terms of each document, by key.
+		"""
+		self.weights: dict[bytes, int] = {}
+		"""
+		The weight of each document that has one, whether or not it has been
+		added yet.
+		"""
+		self.versions: dict[str, Any] = {}
+		"""
+		The versions (see `PersistedModel.table_version`) of the tables that
+		the dictionary reflects, as of its last change, for the owner to
+		tell whether it's still current; empty until it's been loaded.
+		"""
+		self.table_positions: dict[str, Any] = {}
+		"""
+		The positions in the tables' change logs that the dictionary was last
+		loaded or caught up at, for the owner to catch up with the writes
+		made since (see `PersistedModel._changes_since`).
+		"""
+		self.lock = Lock()
+		self._stats: dict[str, list[int]] = {}
+		"""
+		The `[popularity, documents]` of each term.
+		"""
+		self._best: dict[str, list[str]] = {}
+		"""
+		The best `_CACHED_COMPLETIONS` completions of the prefixes that have
+		been asked for and have more than `_CACHED_RANGE` terms.
+		"""
+
+	def load(self, documents: Iterable[tuple[bytes, Iterable[str]]], weights: Iterable[tuple[bytes, int]]) -> None:
+		"""
+		Replaces the contents of the dictionary with the given `(key, terms)`
+		documents and `(key, weight)` weights.
+		"""
+		self.weights = {key: weight for key, weight in weights if weight}
+		self.documents = {}
+		self._stats = {}
+		self._best = {}
+		for key, terms in documents:
+			distinct = tuple(dict.fromkeys(terms))
+			if not distinct:
+				continue
+			self.documents[key] = distinct
+			weight = self.weights.get(key, 0)
+			for term in distinct:
+				stats = self._stats.get(term)
+				if stats is None:
+					self._stats[term] = [weight, 1]
+				else:
+					stats[0] += weight
+					stats[1] += 1
+		self.terms = sorted(self._stats)
+
+	def set(self, key: bytes, terms: Iterable[str]) -> None:
+		"""
+		Replaces the terms of the document with the given key; no terms
+		removes it.
+		"""
+		new = tuple(dict.fromkeys(terms))
+		old = self.documents.get(key, ())
+		if new == old:
+			return
+		if new:
+			self.documents[key] = new
+		else:
+			del self.documents[key]
+		weight = self.weights.get(key, 0)
+		kept = set(new).intersection(old)
+		for term in old:
+			if term not in kept:
+				self._change(term, -weight, -1)
+		for term in new:
+			if term not in kept:
+				self._change(term, weight, 1)
+
+	def weigh(self, key: bytes, weight: int) -> None:
+		"""
+		Sets the weight of the document with the given key.
+		"""
+		change = weight - self.weights.get(key, 0)
+		if change == 0:
+			return
+		if weight:
+			self.weights[key] = weight
+		else:
+			del self.weights[key]
+		for term in self.documents.get(key, ()):
+			self._change(term, change, 0)
+
+	def popularity(self, term: str) -> int:
+		stats = self._stats.get(term)
+		return 0 if stats is None else stats[0]
+
+	def _rank(self, term: str) -> tuple[int, int, str]:
+		"""
+		Sorts the most popular terms first, then those in the most
+		documents, then alphabetically.
+		"""
+		popularity, documents = self._stats[term]
+		return (-popularity, -documents, term)
+
+	def _change(self, term: str, popularity: int, documents: int) -> None:
+		stats = self._stats.get(term)
+		if stats is None:
+			stats = self._stats[term] = [0, 0]
+			insort(self.terms, term)
+		stats[0] += popularity
+		stats[1] += documents
+		if stats[1] == 0:
+			del self._stats[term]
+			del self.terms[bisect_left(self.terms, term)]
+			rank = None
+		else:
+			rank = self._rank(term)
+
+		# Only the kept completions that the term is in, or now belongs in,
+		# are out of date.
+		for end in range(len(term) + 1):
+			best = self._best.get(term[:end])
+			if best is not None and (term in best or (rank is not None and rank < self._rank(best[-1]))):
+				del self._best[term[:end]]
+
+	def _range(self, prefix: str) -> tuple[int, int]:
+		start = bisect_left(self.terms, prefix)
+		if not prefix:
+			return start, len(self.terms)
+		return start, bisect_left(self.terms, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+
+	def complete(self, prefix: str, count: int) -> list[str]:
+		"""
+		Returns the `count` most popular terms that start with `prefix`.
+		"""
+		if count <= 0:
+			return []
+		start, end = self._range(prefix)
+		if end - start <= _CACHED_RANGE or count > _CACHED_COMPLETIONS:
+			return nsmallest(count, self.terms[start:end], key = self._rank)
+		best = self._best.get(prefix)
+		if best is None:
+			best = self._best[prefix] = nsmallest(_CACHED_COMPLETIONS, self.terms[start:end], key = self._rank)
+		return best[:count]
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+def pytest_collection_modifyitems(items: list[pytest.Item]) -> None:
+	# Tests that read or write table files directly can't run against the
+	# SQLite backend (see `PersistedModel.storage_backend`).
+	if os.getenv("STORAGE_BACKEND") != "sqlite":
+		return
+	skip = pytest.mark.skip(reason = "reads or writes table files directly")
+	for item in items:
+		if item.get_closest_marker("csv_only"):
+			item.add_marker(skip)
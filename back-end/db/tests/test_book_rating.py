@@ -0,0 +1,313 @@
+from threading import Thread
+
+import pytest
+
+from db.models.Book import Book, book_filters, title_terms
+from db.models.BookRating import BookRating, book_ranking, book_rating_sync
+from db.models.UserReview import UserReview, _journals
+from db.suggest import suggest_title_words
+
+MODELS = (Book, BookRating, UserReview)
+ORIGINAL_DATA_DIRS = [model.data_dir for model in MODELS]
+TEST_DATA_DIR = "./data/testing-data"
+
+
+def setup_function(_):
+	for model in MODELS:
+		model.data_dir = TEST_DATA_DIR
+		model._drop_table()
+
+
+def teardown_function(_):
+	book_rating_sync.flush()
+	for model, data_dir in zip(MODELS, ORIGINAL_DATA_DIRS):
+		model._drop_table()
+		model.data_dir = data_dir
+
+
+def test_ratings_follow_reviews():
+	Book.put_many(Book(id = book_id, title = book_id, authors = []) for book_id in ("b1", "b2"))
+	UserReview(id = "r1", user_id = "u1", book_id = "b1", rating = 8).put()
+	UserReview(id = "r2", user_id = "u2", book_id = "b1", rating = 4).put()
+	UserReview.put_many([
+		UserReview(id = "r3", user_id = "u3", book_id = "b1", rating = 9),
+		UserReview(id = "r4", user_id = "u3", book_id = "b2", rating = 10),
+	])
+
+	ratings = BookRating.of("b1")
+	assert (ratings.review_count, ratings.rating_total, ratings.average_rating) == (3, 21, 7.0)
+	assert ratings.histogram[4] == ratings.histogram[8] == ratings.histogram[9] == 1
+
+	# Updating a review replaces its rating, and deleting it removes it.
+	UserReview(id = "r2", user_id = "u2", book_id = "b1", rating = 10).put()
+	UserReview(id = "r1", user_id = "u1", book_id = "b1", rating = 8).delete()
+	assert not UserReview(id = "r5", user_id = "u5", book_id = "b1", rating = 0).patch()
+	ratings = BookRating.of("b1")
+	assert (ratings.review_count, ratings.rating_total) == (2, 19)
+	assert ratings.histogram[4] == ratings.histogram[8] == 0
+
+	UserReview(id = "r4", user_id = "u3", book_id = "b2", rating = 10).delete()
+	assert BookRating.get_by_primary_key("b2") == None
+	assert BookRating.of("b2").average_rating == None
+
+	book_rating_sync.flush()
+	assert Book.get_by_primary_key("b1").average_rating == 9.5 # type: ignore
+	assert Book.get_by_primary_key("b2").average_rating == None # type: ignore
+
+
+def test_concurrent_review_updates():
+	Book(id = "b1", title = "b1", authors = []).put()
+
+	def rewrite(thread: int) -> None:
+		for i in range(20):
+			UserReview(id = f"r{i % 3}", user_id = "u1", book_id = "b1", rating = (thread + i) % 11).put()
+
+	threads = [Thread(target = rewrite, args = (thread,)) for thread in range(4)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	# However the writes interleave, the ratings are those of the reviews
+	# that ended up stored.
+	reviews = list(UserReview.get_all())
+	ratings = BookRating.of("b1")
+	assert ratings.review_count == len(reviews) == 3
+	assert ratings.rating_total == sum(review.rating for review in reviews)
+
+
+def test_average_sync_keeps_book_edits():
+	Book(id = "b1", title = "b1", authors = []).put()
+	UserReview(id = "r1", user_id = "u1", book_id = "b1", rating = 6).put()
+
+	# The book is edited after its new average is queued, but before it's
+	# written.
+	book = Book.get_by_primary_key("b1")
+	book.description = "A new description" # type: ignore
+	book.put() # type: ignore
+
+	book_rating_sync.flush()
+	book = Book.get_by_primary_key("b1")
+	assert book.average_rating == 6.0 # type: ignore
+	assert book.description == "A new description" # type: ignore
+
+
+def test_rebuild_book_ratings():
+	Book(id = "b1", title = "b1", authors = [], average_rating = 1.0).put()
+	Book(id = "b2", title = "b2", authors = [], average_rating = 1.0).put()
+	UserReview.put_many(
+		UserReview(id = f"r{i}", user_id = f"u{i}", book_id = "b1", rating = i)
+		for i in range(5)
+	)
+	BookRating._drop_table()
+
+	assert UserReview.rebuild_book_ratings() == 1
+	ratings = BookRating.of("b1")
+	assert (ratings.review_count, ratings.rating_total) == (5, 10)
+	assert Book.get_by_primary_key("b1").average_rating == 2.0 # type: ignore
+	assert Book.get_by_primary_key("b2").average_rating == None # type: ignore
+
+
+def test_failed_rebuild_keeps_book_ratings(monkeypatch):
+	Book(id = "b1", title = "b1", authors = []).put()
+	UserReview(id = "r1", user_id = "u1", book_id = "b1", rating = 6).put()
+
+	def fail(*args, **kwargs):
+		raise OSError("disk full")
+
+	monkeypatch.setattr(BookRating._table(), "write_many", fail)
+	with pytest.raises(OSError):
+		UserReview.rebuild_book_ratings()
+	monkeypatch.undo()
+
+	ratings = BookRating.of("b1")
+	assert (ratings.review_count, ratings.rating_total) == (1, 6)
+
+
+def test_ratings_recover_from_a_crash(monkeypatch):
+	Book(id = "b1", title = "b1", authors = []).put()
+	UserReview(id = "r1", user_id = "u1", book_id = "b1", rating = 6).put()
+
+	# The process "crashes" after writing a review, before updating the
+	# ratings to match.
+	def crash(*args, **kwargs):
+		raise RuntimeError("crashed")
+
+	monkeypatch.setattr(BookRating, "apply", crash)
+	with pytest.raises(RuntimeError):
+		UserReview(id = "r2", user_id = "u2", book_id = "b1", rating = 8).put()
+	monkeypatch.undo()
+	assert UserReview.get_by_primary_key("r2") is not None
+	assert BookRating.of("b1").review_count == 1
+
+	# The next process to start finds the unfinished update in the journal.
+	_journals.pop(BookRating.data_dir).close()
+	UserReview.recover_book_ratings()
+	ratings = BookRating.of("b1")
+	assert (ratings.review_count, ratings.rating_total) == (2, 14)
+
+	# Once it's recovered, another restart has nothing to do.
+	_journals.pop(BookRating.data_dir).close()
+	monkeypatch.setattr(BookRating, "rebuild", crash)
+	UserReview.recover_book_ratings()
+
+
+def test_title_suggestions_follow_books_and_reviews(monkeypatch):
+	Book.put_many([
+		Book(id = "b1", title = "The Frankenstein Diaries", authors = []),
+		Book(id = "b2", title = "Franklin", authors = []),
+		Book(id = "b3", title = "Frank and Frankenstein", authors = []),
+	])
+	UserReview(id = "r1", user_id = "u1", book_id = "b2", rating = 5).put()
+	assert suggest_title_words("frank") == ["franklin", "frankenstein", "frank"]
+	assert suggest_title_words("the Frank", limit = 1) == ["franklin"]
+	assert suggest_title_words("frank ", limit = 2) == ["franklin", "frankenstein"]
+
+	# Written books and reviews are applied to the loaded words as they go.
+	UserReview.put_many(
+		UserReview(id = f"r{i}", user_id = f"u{i}", book_id = "b3", rating = 5)
+		for i in range(2, 4)
+	)
+	Book(id = "b4", title = "Frankly", authors = []).put()
+	Book(id = "b1", title = "The Diaries", authors = []).put()
+	assert title_terms.versions == {"Book": Book.table_version(), "BookRating": BookRating.table_version()}
+	assert suggest_title_words("frank") == ["frank", "frankenstein", "franklin", "frankly"]
+	assert title_terms.popularity("frankenstein") == 2
+
+	# Books written without them (e.g. by another process) are caught up
+	# with too, from the change log.
+	def reload():
+		raise AssertionError("reloaded every book")
+
+	monkeypatch.setattr(Book, "_keyed_rows", reload)
+	terms = title_terms.terms
+	Book._table().write(Book._encode_value("b2"), Book(id = "b2", title = "Frankish", authors = [])._row_bytes())
+	assert suggest_title_words("frank") == ["frank", "frankenstein", "frankish", "frankly"]
+	assert title_terms.terms is terms
+	monkeypatch.undo()
+
+	# The result is the same as loading them from scratch.
+	incremental = (title_terms.terms, title_terms.documents, title_terms.weights)
+	title_terms.versions = {}
+	assert suggest_title_words("frank") == ["frank", "frankenstein", "frankish", "frankly"]
+	assert (title_terms.terms, title_terms.documents, title_terms.weights) == incremental
+
+
+def test_filtered_books_follow_ratings(monkeypatch):
+	Book.put_many(
+		Book(id = f"b{i}", title = f"Book {i}", authors = [f"Author {i % 3}"], year = 2000 + i % 2)
+		for i in range(12)
+	)
+	UserReview.put_many(
+		UserReview(id = f"r{i}", user_id = "u1", book_id = f"b{i}", rating = i % 11)
+		for i in range(12)
+	)
+	book_rating_sync.flush()
+
+	def brute_force(author: str | None, year: int | None, low: float | None, high: float | None) -> list[str]:
+		books = [
+			book for book in Book.get_all()
+			if (author is None or author in book.authors)
+			and (year is None or book.year == year)
+			and (low is None and high is None or book.average_rating is not None
+				and (low is None or book.average_rating >= low)
+				and (high is None or book.average_rating <= high))
+		]
+		return [book.id for book in books]
+
+	def check() -> None:
+		for author in (None, "Author 1", "author 2", "Nobody"):
+			for year in (None, 2001):
+				for low, high in ((None, None), (5, None), (None, 4.5), (2, 8)):
+					expected = brute_force(author and author.title(), year, low, high)
+					found = Book.get_filtered(author = author, year = year, rating_min = low, rating_max = high)
+					assert [book.id for book in found] == expected
+					found = Book.get_filtered(author = author, year = year, rating_min = low, rating_max = high, limit = 2)
+					assert [book.id for book in found] == expected[:2]
+
+	check()
+	UserReview(id = "r11", user_id = "u1", book_id = "b11", rating = 3).put()
+	UserReview(id = "r5", user_id = "u1", book_id = "b5", rating = 0).delete()
+	UserReview(id = "r12", user_id = "u2", book_id = "b0", rating = 9).put()
+	book_rating_sync.flush()
+	Book(id = "b3", title = "Book 3", authors = ["Author 2"], year = 2001).patch()
+	# The writes were applied to the loaded index rather than reloading it.
+	assert book_filters.versions == {"Book": Book.table_version()}
+	check()
+
+	# So are books written without it (e.g. by another process), which are
+	# read from the change log rather than by reading every book again.
+	def reload():
+		raise AssertionError("reloaded every book")
+
+	monkeypatch.setattr(Book, "_keyed_rows", reload)
+	sets = book_filters.sets
+	book = Book.get_by_primary_key("b4")
+	book.average_rating = 1.0 # type: ignore
+	Book._table().write(book._key_bytes(), book._row_bytes()) # type: ignore
+	Book._table().write(Book._encode_value("b6"), None)
+	check()
+	assert book_filters.sets is sets
+
+
+def test_best_rated_follows_ratings(monkeypatch):
+	UserReview.put_many(
+		UserReview(id = f"r{i}", user_id = "u1", book_id = f"b{i}", rating = i % 4)
+		for i in range(12)
+	)
+
+	def check() -> None:
+		expected = sorted(
+			(
+				(ratings.book_id, ratings.average_rating)
+				for ratings in BookRating.get_all() if ratings.average_rating is not None
+			),
+			key = lambda item: item[1],
+			reverse = True
+		)
+		assert BookRating.best_rated() == expected
+		assert BookRating.best_rated(3) == expected[:3]
+		assert BookRating.best_rated(3, exclude = ["b3"]) == [item for item in expected if item[0] != "b3"][:3]
+
+	check()
+	entries = book_ranking.entries
+	UserReview(id = "r12", user_id = "u2", book_id = "b1", rating = 10).put()
+	UserReview(id = "r3", user_id = "u1", book_id = "b3", rating = 3).delete()
+	UserReview(id = "r13", user_id = "u2", book_id = "b12", rating = 2).put()
+	# The writes moved the books within the loaded ranking rather than
+	# sorting them all again.
+	assert book_ranking.versions == {"BookRating": BookRating.table_version()}
+	assert book_ranking.entries is entries
+	check()
+
+	# So are ratings written without it (e.g. by another process), which
+	# are read from the change log rather than by reading every book again.
+	def reload():
+		raise AssertionError("reloaded every rating")
+
+	monkeypatch.setattr(BookRating, "_keyed_rows", reload)
+	ratings = BookRating(book_id = "b5", review_count = 1, rating_total = 9)
+	BookRating._table().write(ratings._key_bytes(), ratings._row_bytes())
+	BookRating._table().write(BookRating._encode_value("b7"), None)
+	check()
+	assert book_ranking.entries is entries
+
+def test_filtered_books_follow_concurrent_writes():
+	Book(id = "b0", title = "Book 0", authors = ["Author 0"]).put()
+	assert [book.id for book in Book.get_filtered(author = "Author 0")] == ["b0"]
+
+	def write(thread: int) -> None:
+		for i in range(10):
+			Book(id = f"b{thread}-{i}", title = "Book", authors = [f"Author {thread}"]).put()
+
+	threads = [Thread(target = write, args = (thread,)) for thread in range(1, 5)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	# However the writes interleave, none of them is left out of the index,
+	# which is still up to date without being reloaded.
+	assert book_filters.versions == {"Book": Book.table_version()}
+	for thread in range(1, 5):
+		assert len(Book.get_filtered(author = f"Author {thread}")) == 10
@@ -1,4 +1,4 @@
-from db.loose_compare import loose_compare
+from db.loose_compare import fuzzy_compare, loose_compare, similarity
 
 def test_loose_compare():
     assert loose_compare("Hello World", "hello") == True
@@ -23,5 +23,18 @@ def test_loose_compare():
     assert loose_compare("Python", "java") == False
     
     assert loose_compare("MiXeD CaSe", "mixed case") == True
-    
-    assert loose_compare("Version 2.0", "version 2") == True
\ No newline at end of file
+
+    assert loose_compare("Version 2.0", "version 2") == True
+
+
+def test_fuzzy_compare():
+    assert similarity("frankenstein", "frankenstein") == 1.0
+    assert similarity("frankenstien", "frankenstein") > 0.4
+    assert similarity("frankenstein", "dracula") == 0.0
+
+    assert fuzzy_compare("Frankenstein", "frankenstien", 0.4) == True
+    assert fuzzy_compare("The Modern Prometheus", "moderm promethues", 0.4) == True
+    assert fuzzy_compare("The Modern Prometheus", "moderm promethues", 0.9) == False
+    # Loose matches are always fuzzy matches too.
+    assert fuzzy_compare("Hello, World!", "o, w", 0.9) == True
+    assert fuzzy_compare("Dracula", "frankenstein", 0.4) == False
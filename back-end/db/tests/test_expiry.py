@@ -0,0 +1,68 @@
+import pytest
+from time import time
+from typing import ClassVar
+
+from db.expiry_sweeper import ExpirySweeper
+from db.persisted_model import PersistedModel
+
+class ExpiringModel(PersistedModel):
+	ttl_field: ClassVar[str | None] = "cached_at"
+	ttl_seconds: ClassVar[float] = 60
+	indexed_fields: ClassVar[tuple[str, ...]] = ("shelf",)
+
+	pk: int
+	shelf: str
+	cached_at: float
+
+class CachedExpiringModel(ExpiringModel):
+	append_only: ClassVar[bool] = True
+	cache_max_entries: ClassVar[int] = 16
+
+ExpiringModel.data_dir = "./data/testing-data"
+CachedExpiringModel.data_dir = "./data/testing-data"
+
+def test_expired_records_are_missing():
+	for model in (ExpiringModel, CachedExpiringModel):
+		model._drop_table() # type: ignore
+		now = time()
+		model.put_many(
+			model(pk = i, shelf = "ab"[i % 2], cached_at = now - 90 if i < 3 else now)
+			for i in range(6)
+		)
+
+		assert model.get_by_primary_key(1) == None
+		assert model.get_by_primary_key(4).shelf == "a" # type: ignore
+		assert not model.exists(2)
+		assert model.exists(3)
+		assert [instance.pk for instance in model.get_all()] == [3, 4, 5]
+		assert [pk for (pk,) in model.get_all(fields = ["pk"])] == [3, 4, 5]
+		assert [instance.pk for instance in model.get_where(shelf = "b")] == [3, 5]
+		assert model.get_first_where(shelf = "a").pk == 4 # type: ignore
+		assert [instance.pk for instance in model.get_where_like(shelf = "a")] == [4]
+
+		# A record that is renewed comes back.
+		model(pk = 1, shelf = "b", cached_at = now).put()
+		assert model.get_by_primary_key(1).shelf == "b" # type: ignore
+
+		model._drop_table() # type: ignore
+
+@pytest.mark.csv_only
+def test_sweeper_deletes_expired_records():
+	ExpiringModel._drop_table() # type: ignore
+	CachedExpiringModel._drop_table() # type: ignore
+	now = time()
+	ExpiringModel.put_many(
+		ExpiringModel(pk = i, shelf = "a", cached_at = now - 90 if i % 2 else now)
+		for i in range(10)
+	)
+	CachedExpiringModel(pk = 1, shelf = "a", cached_at = now).put()
+
+	sweeper = ExpirySweeper([ExpiringModel, CachedExpiringModel])
+	assert sweeper.sweep() == {"ExpiringModel": 5, "CachedExpiringModel": 0}
+	assert sweeper.sweep() == {"ExpiringModel": 0, "CachedExpiringModel": 0}
+
+	with ExpiringModel._read_csv_file() as r: # type: ignore
+		assert [line.split(",")[0] for line in r.readlines()[1:]] == ["0", "2", "4", "6", "8"]
+
+	ExpiringModel._drop_table() # type: ignore
+	CachedExpiringModel._drop_table() # type: ignore
@@ -0,0 +1,48 @@
+from multiprocessing import get_context
+from typing import ClassVar
+
+from db.persisted_model import PersistedModel
+
+class SharedModel(PersistedModel):
+	pk: int
+	worker: int
+
+class SharedLogModel(PersistedModel):
+	append_only: ClassVar[bool] = True
+	indexed_fields: ClassVar[tuple[str, ...]] = ("worker",)
+
+	pk: int
+	worker: int
+
+SharedModel.data_dir = "./data/testing-data"
+SharedLogModel.data_dir = "./data/testing-data"
+
+def _write_rows(worker: int) -> None:
+	for pk in range(worker * 25, worker * 25 + 25):
+		SharedModel(pk = pk, worker = worker).put()
+		SharedLogModel(pk = pk, worker = worker).put()
+
+def test_writes_from_several_processes():
+	"""
+	Several processes writing to the same tables at once must not lose each
+	other's writes, and a process that already has a table open must see
+	the rows the others wrote.
+	"""
+	SharedModel._drop_table() # type: ignore
+	SharedLogModel._drop_table() # type: ignore
+	assert list(SharedLogModel.get_where(worker = 0)) == []
+
+	context = get_context("spawn")
+	processes = [context.Process(target = _write_rows, args = (worker,)) for worker in range(4)]
+	for process in processes:
+		process.start()
+	for process in processes:
+		process.join()
+		assert process.exitcode == 0
+
+	assert sorted(m.pk for m in SharedModel.get_all()) == list(range(100))
+	assert sorted(m.pk for m in SharedLogModel.get_where(worker = 2)) == list(range(50, 75))
+	assert SharedLogModel.get_by_primary_key(99).worker == 3 # type: ignore
+
+	SharedModel._drop_table() # type: ignore
+	SharedLogModel._drop_table() # type: ignore
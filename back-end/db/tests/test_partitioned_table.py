@@ -0,0 +1,135 @@
+import pytest
+from pathlib import Path
+from typing import Any, ClassVar
+
+from db.partitioned_table import existing_partition_paths, repartition
+from db.persisted_model import PersistedModel, _tables
+
+pytestmark = pytest.mark.csv_only
+
+class PartitionedModel(PersistedModel):
+	partitions: ClassVar[int] = 4
+	append_only: ClassVar[bool] = True
+	indexed_fields: ClassVar[tuple[str, ...]] = ("shelf",)
+	text_indexed_fields: ClassVar[tuple[str, ...]] = ("title",)
+
+	pk: int
+	title: str
+	shelf: str
+
+PartitionedModel.data_dir = "./data/testing-data"
+
+def test_partitioned_writes():
+	PartitionedModel._drop_table() # type: ignore
+	PartitionedModel.put_many(
+		PartitionedModel(pk = i, title = f"Book {i}", shelf = "ab"[i % 2])
+		for i in range(200)
+	)
+	assert PartitionedModel(pk = 200, title = "Emma", shelf = "a").post()
+	assert not PartitionedModel(pk = 200, title = "Emma", shelf = "b").post()
+	PartitionedModel(pk = 3, title = "", shelf = "").delete()
+
+	# Every partition got some of the records.
+	paths = existing_partition_paths(Path(PartitionedModel.data_dir), "PartitionedModel")
+	assert len(paths) == 4
+	assert all(path.stat().st_size > len("pk,title,shelf\n") for path in paths)
+
+	assert PartitionedModel.get_by_primary_key(200).title == "Emma" # type: ignore
+	assert PartitionedModel.get_by_primary_key(3) == None
+	assert sorted(instance.pk for instance in PartitionedModel.get_all()) == [i for i in range(201) if i != 3]
+	assert sorted(instance.pk for instance in PartitionedModel.get_where(shelf = "b")) == \
+		[i for i in range(200) if i % 2 == 1 and i != 3]
+
+	# Each partition logs the keys written to it.
+	table = PartitionedModel._table()
+	_, position, _ = table.changes_since()
+	PartitionedModel.put_many(PartitionedModel(pk = i, title = "Emma", shelf = "a") for i in (5, 6, 7))
+	version, position, keys = table.changes_since(position)
+	assert version == PartitionedModel.table_version()
+	assert sorted(keys) == [b"5", b"6", b"7"] # type: ignore
+
+	PartitionedModel._drop_table() # type: ignore
+
+def test_partitioned_scans():
+	PartitionedModel._drop_table() # type: ignore
+	PartitionedModel.put_many(
+		PartitionedModel(pk = i, title = f"Book {i}", shelf = "ab"[i % 2])
+		for i in range(200)
+	)
+	PartitionedModel(pk = 7, title = "Book 7, revised", shelf = "b").put()
+
+	assert [instance.pk for instance in PartitionedModel.get_where(title = "Book 42")] == [42]
+	assert [instance.pk for instance in PartitionedModel.get_where(title = "Book 7")] == []
+	assert sorted(instance.pk for instance in PartitionedModel.get_where_like(title = "book 19")) == \
+		[i for i in range(200) if "19" in str(i)]
+	assert [instance.pk for instance in PartitionedModel.get_where_like(title = "revised")] == [7]
+	assert [instance.pk for instance in PartitionedModel.get_where_like(title = "book 1", skip = 3, limit = 5)] == \
+		[instance.pk for instance in PartitionedModel.get_where_like(title = "book 1")][3:8]
+	# Ranked searches score every partition's rows alike.
+	ranked = [instance.pk for instance in PartitionedModel.get_where_like(title = "book 19", ranked = True)]
+	assert ranked[0] == 19 and sorted(ranked) == [i for i in range(200) if "19" in str(i)]
+	assert [instance.pk for instance in PartitionedModel.get_where_like(title = "book 19", ranked = True, skip = 2, limit = 3)] == \
+		ranked[2:5]
+
+	PartitionedModel._drop_table() # type: ignore
+
+def test_partitioned_write_many_is_all_or_nothing(monkeypatch):
+	PartitionedModel._drop_table() # type: ignore
+	PartitionedModel.put_many(
+		PartitionedModel(pk = i, title = f"Book {i}", shelf = "a")
+		for i in range(20)
+	)
+
+	# Writing the second partition fails, after the first has been written.
+	writes: list[Any] = []
+	for partition in PartitionedModel._table().partitions: # type: ignore
+		def log_and_apply(table_file: Any, changes: Any, original: Any = partition._log_and_apply) -> None:
+			writes.append(changes)
+			if len(writes) == 2:
+				raise OSError("disk full")
+			original(table_file, changes)
+		monkeypatch.setattr(partition, "_log_and_apply", log_and_apply)
+	with pytest.raises(OSError):
+		PartitionedModel.put_many(
+			PartitionedModel(pk = i, title = f"Book {i}, revised", shelf = "b")
+			for i in range(20)
+		)
+	monkeypatch.undo()
+
+	# The partition written before the one that failed was put back.
+	assert sorted((instance.pk, instance.title) for instance in PartitionedModel.get_all()) == \
+		[(i, f"Book {i}") for i in range(20)]
+	assert list(PartitionedModel.get_where(shelf = "b")) == []
+
+	PartitionedModel._drop_table() # type: ignore
+
+def test_repartition():
+	PartitionedModel._drop_table() # type: ignore
+	_tables.clear()
+	data_dir = Path(PartitionedModel.data_dir)
+	PartitionedModel.partitions = 1
+	try:
+		PartitionedModel.put_many(
+			PartitionedModel(pk = i, title = f"Book {i}", shelf = "a")
+			for i in range(100)
+		)
+		PartitionedModel(pk = 5, title = "", shelf = "").delete()
+
+		# The table can't be opened with partitions it isn't stored in.
+		PartitionedModel.partitions = 3
+		_tables.clear()
+		with pytest.raises(RuntimeError):
+			PartitionedModel.get_by_primary_key(1)
+
+		for partitions in (3, 2, 1):
+			_tables.clear()
+			header = PartitionedModel._to_csv_header() # type: ignore
+			assert repartition(data_dir, "PartitionedModel", header, partitions, append_only = True) == 99
+			PartitionedModel.partitions = partitions
+			assert sorted(instance.pk for instance in PartitionedModel.get_all()) == [i for i in range(100) if i != 5]
+			assert PartitionedModel.get_by_primary_key(42).title == "Book 42" # type: ignore
+		assert existing_partition_paths(data_dir, "PartitionedModel") == []
+	finally:
+		PartitionedModel._drop_table() # type: ignore
+		PartitionedModel.partitions = 4
+		_tables.clear()
@@ -0,0 +1,30 @@
+import asyncio
+from threading import Event
+
+import pytest
+
+from db.password_executor import PasswordHashingBusy, run_in_password_executor
+
+def test_backpressure(monkeypatch: pytest.MonkeyPatch):
+	monkeypatch.setenv("PASSWORD_HASH_QUEUE", "2")
+	release = Event()
+
+	def slow_hash() -> str:
+		release.wait(5)
+		return "hashed"
+
+	async def main() -> None:
+		first = asyncio.ensure_future(run_in_password_executor(slow_hash))
+		second = asyncio.ensure_future(run_in_password_executor(slow_hash))
+		await asyncio.sleep(0)
+
+		# Both slots are taken, so the next hash is turned away.
+		with pytest.raises(PasswordHashingBusy):
+			await run_in_password_executor(slow_hash)
+
+		release.set()
+		assert await first == "hashed"
+		assert await second == "hashed"
+		assert await run_in_password_executor(str.upper, "pw") == "PW"
+
+	asyncio.run(main())
@@ -1,3 +1,11 @@
+import asyncio
+import pytest
+from typing import ClassVar
+from threading import Thread
+
+from db.csv_table import CsvTable
+from db.encode_str import encode_str
+from db.loose_compare import fuzzy_compare, loose_compare
 from db.persisted_model import PersistedModel
 
 class RandomModel(PersistedModel):
@@ -44,6 +52,7 @@ def test_primary_key():
 	)
 	assert model_instance._primary_key() == 1 # type: ignore
 
+@pytest.mark.csv_only
 def test_post():
 	instances = [
 		RandomModel(pk = 1, field_1 = "orange", field_2 = 1234),
@@ -96,6 +105,7 @@ def test_patch():
 
 	RandomModel._drop_table() # type: ignore
 
+@pytest.mark.csv_only
 def test_put():
 	"""
 	Check that the `put` operations can be used to idempotently create and
@@ -278,4 +288,569 @@ def test_get_where_like():
 	assert retrieved_instances[0].pk == 1
 	assert retrieved_instances[1].pk == 4
 
-	RandomModel._drop_table() # type: ignore
\ No newline at end of file
+	RandomModel._drop_table() # type: ignore
+def test_get_by_primary_key_matches_exactly():
+	"""
+	Keys that are prefixes of one another must not be confused (e.g., a
+	lookup for `1` should not return the record with the key `10`).
+	"""
+	RandomModel(pk = 10, field_1 = "ten", field_2 = 10).put()
+	RandomModel(pk = 1, field_1 = "one", field_2 = 1).put()
+
+	assert RandomModel.get_by_primary_key(1).field_1 == "one" # type: ignore
+	assert RandomModel.get_by_primary_key(10).field_1 == "ten" # type: ignore
+
+	RandomModel(pk = 1, field_1 = "uno", field_2 = 1).put()
+	RandomModel(pk = 10, field_1 = "ten", field_2 = 10).delete()
+
+	assert RandomModel.get_by_primary_key(1).field_1 == "uno" # type: ignore
+	assert RandomModel.get_by_primary_key(10) == None # type: ignore
+	assert RandomModel.exists(1) # type: ignore
+	assert not RandomModel.exists(10) # type: ignore
+
+	RandomModel._drop_table() # type: ignore
+
+@pytest.mark.csv_only
+def test_index_sees_external_writes():
+	"""
+	The primary key index must notice when the table file is modified by
+	something other than the model's own methods.
+	"""
+	RandomModel(pk = 1, field_1 = "apple", field_2 = 1).put()
+	assert RandomModel.get_by_primary_key(2) == None # type: ignore
+
+	with RandomModel._append_csv_file() as w: # type: ignore
+		w.write(RandomModel(pk = 2, field_1 = "banana", field_2 = 2)._to_csv_row() + "\n") # type: ignore
+
+	assert RandomModel.get_by_primary_key(2).field_1 == "banana" # type: ignore
+	assert RandomModel.get_by_primary_key(1).field_1 == "apple" # type: ignore
+
+	RandomModel._drop_table() # type: ignore
+
+class AppendModel(PersistedModel):
+	append_only: ClassVar[bool] = True
+	compaction_garbage_ratio: ClassVar[float] = 2.0 # never compact on its own
+
+	pk: int
+	field_1: str
+
+AppendModel.data_dir = "./data/testing-data"
+
+@pytest.mark.csv_only
+def test_append_only_writes():
+	"""
+	Append-only tables never rewrite existing lines; updates and deletes are
+	appended, and reads resolve the latest version of each record.
+	"""
+	AppendModel._drop_table() # type: ignore
+
+	AppendModel(pk = 1, field_1 = "apple").put()
+	AppendModel(pk = 2, field_1 = "banana").put()
+	AppendModel(pk = 1, field_1 = "orange").put()
+	AppendModel(pk = 2, field_1 = "banana").delete()
+	assert not AppendModel(pk = 3, field_1 = "papaya").patch()
+	assert AppendModel(pk = 3, field_1 = "papaya").post()
+	assert not AppendModel(pk = 3, field_1 = "mango").post()
+
+	with AppendModel._read_csv_file() as r: # type: ignore
+		assert r.readline() == "pk,field_1\n"
+		assert r.readline() == "1,apple\n"
+		assert r.readline() == "2,banana\n"
+		assert r.readline() == "1,orange\n"
+		assert r.readline() == "2,,\n"
+		assert r.readline() == "3,papaya\n"
+		assert r.readline() == ""
+
+	assert AppendModel.get_by_primary_key(1).field_1 == "orange" # type: ignore
+	assert AppendModel.get_by_primary_key(2) == None # type: ignore
+	assert [model.pk for model in AppendModel.get_all()] == [1, 3]
+	assert [model.pk for model in AppendModel.get_where(field_1 = "orange")] == [1]
+
+	AppendModel._drop_table() # type: ignore
+
+@pytest.mark.csv_only
+def test_append_only_compaction():
+	AppendModel._drop_table() # type: ignore
+
+	for i in range(5):
+		AppendModel(pk = i, field_1 = "apple").put()
+	for i in range(5):
+		AppendModel(pk = i, field_1 = "orange").put()
+	AppendModel(pk = 0, field_1 = "orange").delete()
+
+	AppendModel._table().compact() # type: ignore
+
+	with AppendModel._read_csv_file() as r: # type: ignore
+		assert r.readline() == "pk,field_1\n"
+		for i in range(1, 5):
+			assert r.readline() == f"{i},orange\n"
+		assert r.readline() == ""
+
+	assert AppendModel.get_by_primary_key(0) == None # type: ignore
+	assert AppendModel.get_by_primary_key(4).field_1 == "orange" # type: ignore
+	AppendModel(pk = 0, field_1 = "peach").put()
+	assert AppendModel.get_by_primary_key(0).field_1 == "peach" # type: ignore
+
+	AppendModel._drop_table() # type: ignore
+
+@pytest.mark.csv_only
+def test_changes_since(monkeypatch):
+	AppendModel._drop_table() # type: ignore
+	AppendModel.put_many(AppendModel(pk = i, field_1 = "apple") for i in range(5))
+	table = AppendModel._table()
+	version, position, keys = table.changes_since()
+	assert version == AppendModel.table_version() and keys is None
+
+	# The keys written since, in the order they were first written.
+	AppendModel(pk = 3, field_1 = "orange").put()
+	AppendModel.put_many([AppendModel(pk = 7, field_1 = "pear"), AppendModel(pk = 3, field_1 = "plum")])
+	AppendModel(pk = 1, field_1 = "").delete()
+	version, position, keys = table.changes_since(position)
+	assert keys == [b"3", b"7", b"1"]
+	assert table.changes_since(position)[2] == []
+
+	# Compacting changes the version, but no rows.
+	table.compact() # type: ignore
+	version, position, keys = table.changes_since(position)
+	assert version == AppendModel.table_version() and keys == []
+
+	# A change that wasn't logged can't be caught up with.
+	with AppendModel._append_csv_file() as w: # type: ignore
+		w.write("8,fig\n")
+	AppendModel(pk = 9, field_1 = "lime").put()
+	version, position, keys = table.changes_since(position)
+	assert keys is None
+	assert table.changes_since(position)[2] == []
+
+	# Nor can a log that was started again.
+	monkeypatch.setattr(table._change_log, "max_size", 1) # type: ignore
+	AppendModel(pk = 10, field_1 = "kiwi").put()
+	AppendModel(pk = 11, field_1 = "date").put()
+	assert table.changes_since(position)[2] is None
+
+	AppendModel._drop_table() # type: ignore
+
+def test_scan_is_a_snapshot():
+	"""
+	A scan yields the records as they were when it started, even if they
+	are updated, deleted or added to while it runs.
+	"""
+	for model in (RandomModel, AppendModel):
+		model._drop_table() # type: ignore
+		model.put_many(model(pk = i, field_1 = "apple", field_2 = i) for i in range(6)) # type: ignore
+		model(pk = 1, field_1 = "apple", field_2 = 1).put() # type: ignore
+
+		scan = model.get_all()
+		assert next(scan).pk == 0
+		model(pk = 0, field_1 = "orange", field_2 = 0).put() # type: ignore
+		model(pk = 3, field_1 = "orange", field_2 = 3).put() # type: ignore
+		model(pk = 4, field_1 = "", field_2 = 0).delete() # type: ignore
+		model(pk = 6, field_1 = "orange", field_2 = 6).put() # type: ignore
+		assert sorted((instance.pk, instance.field_1) for instance in scan) == [(i, "apple") for i in range(1, 6)]
+
+		assert sorted(instance.pk for instance in model.get_all()) == [0, 1, 2, 3, 5, 6]
+		model._drop_table() # type: ignore
+
+class IndexedModel(PersistedModel):
+	append_only: ClassVar[bool] = True
+	indexed_fields: ClassVar[tuple[str, ...]] = ("field_1", "field_2")
+
+	pk: int
+	field_1: str
+	field_2: int
+	field_3: str = ""
+
+IndexedModel.data_dir = "./data/testing-data"
+
+def test_get_where_indexed():
+	"""
+	Queries on indexed fields must give the same results as a scan, and the
+	indexes must follow updates and deletes.
+	"""
+	IndexedModel._drop_table() # type: ignore
+
+	instances = [
+		IndexedModel(pk = 1, field_1 = "orange", field_2 = 1, field_3 = "a"),
+		IndexedModel(pk = 2, field_1 = "papaya", field_2 = 1, field_3 = "b"),
+		IndexedModel(pk = 3, field_1 = "orange", field_2 = 2, field_3 = "a"),
+		IndexedModel(pk = 4, field_1 = "peach,nectarine", field_2 = 2, field_3 = "b"),
+	]
+	for instance in instances:
+		instance.put()
+
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "orange")] == [1, 3]
+	assert [m.pk for m in IndexedModel.get_where(field_2 = 2)] == [3, 4]
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "orange", field_2 = 2)] == [3]
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "orange", field_3 = "a")] == [1, 3]
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "peach,nectarine")] == [4]
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "orange", field_3 = "b")] == []
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "mango")] == []
+	assert IndexedModel.get_first_where(field_2 = 1, field_3 = "b").pk == 2 # type: ignore
+
+	instances[0].field_1 = "mango"
+	instances[0].put()
+	instances[2].delete()
+
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "orange")] == []
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "mango")] == [1]
+	assert [m.pk for m in IndexedModel.get_where(field_2 = 2)] == [4]
+
+	# A fresh index built from the file must agree.
+	IndexedModel._table()._current = None # type: ignore
+	assert [m.pk for m in IndexedModel.get_where(field_1 = "mango")] == [1]
+	assert [m.pk for m in IndexedModel.get_where(field_2 = 1)] == [2, 1]
+
+	IndexedModel._drop_table() # type: ignore
+
+class TextIndexedModel(PersistedModel):
+	text_indexed_fields: ClassVar[tuple[str, ...]] = ("title",)
+
+	pk: int
+	title: str
+	shelf: str = ""
+
+class AppendTextIndexedModel(TextIndexedModel):
+	append_only: ClassVar[bool] = True
+
+TextIndexedModel.data_dir = "./data/testing-data"
+AppendTextIndexedModel.data_dir = "./data/testing-data"
+
+def test_get_where_like_text_indexed():
+	"""
+	Searches on text indexed fields must give the same results as checking
+	every record with `loose_compare`, and the index must follow writes.
+	"""
+	titles = [
+		"Frankenstein", "Frankenstein; or, The Modern Prometheus", "The Prometheus Deception",
+		"Pride and Prejudice", "Prejudice & Pride: A Novel", "Emma", "Dr. Jekyll and Mr. Hyde",
+		"Mrs. Dalloway", "MODERN TIMES", "The Time Machine", "Frankenstein Unbound", "",
+		"...And Then There Were None", "Stranger in a Strange Land", "Land-Ho!", "C++ Primer",
+	]
+	searches = [
+		"frankenstein", "frank", "stein", "modern prometheus", "prometheus, modern", "pride prejudice",
+		"and", "an", "mr. hyde", "mrs", "time", "ime mach", "strange land", "xyz", "!", "++", "c++",
+		"Frankenstein; or", "e", "the the", "land-ho", ", or,",
+	]
+	for model in (TextIndexedModel, AppendTextIndexedModel):
+		model._drop_table() # type: ignore
+		model.put_many(model(pk = i, title = title, shelf = "ab"[i % 2]) for i, title in enumerate(titles))
+		model(pk = 3, title = "Sense and Sensibility", shelf = "b").put()
+		model(pk = 5, title = "", shelf = "").delete()
+
+		for fresh in (False, True):
+			if fresh:
+				model._table()._current = None # type: ignore
+			stored = list(model.get_all())
+			for search in searches:
+				expected = [m.pk for m in stored if loose_compare(encode_str(m.title), encode_str(search))]
+				assert [m.pk for m in model.get_where_like(title = search)] == expected, search
+				assert [m.pk for m in model.get_where_like(title = search, skip = 1, limit = 2)] == expected[1:3]
+				assert [m.pk for m in model.get_where_like(title = search, shelf = "a")] == \
+					[pk for pk in expected if pk % 2 == 0]
+
+		model._drop_table() # type: ignore
+
+def test_get_where_like_fuzzy():
+	"""
+	Fuzzy searches on text indexed fields must give the same results as
+	checking every record with `fuzzy_compare`.
+	"""
+	titles = [
+		"Frankenstein", "Frankenstein; or, The Modern Prometheus", "The Prometheus Deception",
+		"Pride and Prejudice", "Dr. Jekyll and Mr. Hyde", "The Time Machine", "Frank Herbert", "",
+	]
+	searches = ["frankenstien", "frankenstein", "promethues modren", "prejudise", "tme machin", "xyz", "!", "dr"]
+	for model in (TextIndexedModel, AppendTextIndexedModel):
+		model._drop_table() # type: ignore
+		model.put_many(model(pk = i, title = title, shelf = "ab"[i % 2]) for i, title in enumerate(titles))
+		model(pk = 2, title = "", shelf = "").delete()
+
+		stored = list(model.get_all())
+		for min_similarity in (0.3, 0.4, 0.6):
+			for search in searches:
+				expected = [
+					m.pk for m in stored
+					if fuzzy_compare(encode_str(m.title), encode_str(search), min_similarity)
+				]
+				found = model.get_where_like(title = search, min_similarity = min_similarity)
+				assert [m.pk for m in found] == expected, (search, min_similarity)
+				ranked = model.get_where_like(title = search, min_similarity = min_similarity, ranked = True)
+				assert sorted(m.pk for m in ranked) == expected
+
+		# The exact spelling still ranks first.
+		assert [m.pk for m in model.get_where_like(title = "frankenstien", min_similarity = 0.4, ranked = True)] == [0, 1]
+		assert [m.pk for m in model.get_where_like(title = "frankenstien")] == []
+
+		model._drop_table() # type: ignore
+
+def test_get_where_like_ranked():
+	titles = [
+		"Frankenstein; or, The Modern Prometheus", "Young Frankenstein", "Frankenstein",
+		"Frankenstein Frankenstein", "Frank Herbert", "The Time Machine", "Time",
+		"The Prometheus Deception", "Frankly, My Dear", "",
+	]
+	for model in (TextIndexedModel, AppendTextIndexedModel):
+		model._drop_table() # type: ignore
+		model.put_many(model(pk = i, title = title, shelf = "ab"[i % 2]) for i, title in enumerate(titles))
+
+		def ranked(**search_fields: str | int) -> list[int]:
+			return [m.pk for m in model.get_where_like(ranked = True, **search_fields)]
+
+		for search in ("frankenstein", "frank", "prometheus", "the time", "e", "!"):
+			found = ranked(title = search)
+			assert sorted(found) == sorted(m.pk for m in model.get_where_like(title = search))
+			assert ranked(title = search, skip = 1, limit = 2) == found[1:3]
+			assert ranked(title = search, limit = 3) == found[:3]
+
+		# Repeats count, and whole words count for more than parts of them.
+		assert ranked(title = "frankenstein")[:3] == [3, 2, 1]
+		assert ranked(title = "frank")[0] == 4
+		assert ranked(title = "the time") == [5]
+		assert ranked(title = "time")[0] == 6
+		assert ranked(title = "prometheus", shelf = "b") == [7]
+
+		model._drop_table() # type: ignore
+
+def test_put_many_and_delete_many():
+	instances = [
+		RandomModel(pk = i, field_1 = "fruit", field_2 = i) for i in range(1, 6)
+	]
+	RandomModel.put_many(instances)
+	assert [instance.pk for instance in RandomModel.get_all()] == [1, 2, 3, 4, 5]
+
+	RandomModel.delete_many(instances[1:4])
+	assert [instance.pk for instance in RandomModel.get_all()] == [1, 5]
+
+	RandomModel._drop_table() # type: ignore
+
+def test_batch():
+	RandomModel(pk = 1, field_1 = "orange", field_2 = 1).put()
+
+	with RandomModel.batch():
+		RandomModel(pk = 2, field_1 = "apple", field_2 = 2).put()
+		assert not RandomModel(pk = 2, field_1 = "apple", field_2 = 2).post()
+		assert RandomModel(pk = 3, field_1 = "banana", field_2 = 3).post()
+		assert RandomModel(pk = 1, field_1 = "grape", field_2 = 1).patch()
+		assert not RandomModel(pk = 4, field_1 = "mango", field_2 = 4).patch()
+		RandomModel(pk = 3, field_1 = "banana", field_2 = 3).delete()
+
+		# Nothing is written until the batch ends.
+		assert RandomModel.get_by_primary_key(2) == None # type: ignore
+
+	assert [(m.pk, m.field_1) for m in RandomModel.get_all()] == [(1, "grape"), (2, "apple")]
+
+	RandomModel._drop_table() # type: ignore
+
+def test_batch_is_all_or_nothing():
+	RandomModel(pk = 1, field_1 = "orange", field_2 = 1).put()
+
+	try:
+		with RandomModel.batch():
+			RandomModel(pk = 2, field_1 = "apple", field_2 = 2).put()
+			RandomModel(pk = 1, field_1 = "orange", field_2 = 1).delete()
+			raise ValueError()
+	except ValueError:
+		pass
+
+	assert [m.pk for m in RandomModel.get_all()] == [1]
+
+	RandomModel._drop_table() # type: ignore
+
+def test_concurrent_writes():
+	"""
+	Each table has its own lock, so writers on different tables run in
+	parallel, while writers on the same table still never lose an update.
+	"""
+	threads = [
+		Thread(target = lambda start = start, model = model: [
+			model(pk = pk, field_1 = "x", field_2 = pk).put() # type: ignore
+			for pk in range(start, start + 50)
+		])
+		for model in (RandomModel, IndexedModel)
+		for start in (0, 50, 100)
+	]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert sorted(m.pk for m in RandomModel.get_all()) == list(range(150))
+	assert len(list(IndexedModel.get_where(field_1 = "x"))) == 150
+
+	RandomModel._drop_table() # type: ignore
+	IndexedModel._drop_table() # type: ignore
+
+class TypedModel(PersistedModel):
+	pk: str
+	flag: bool
+	ratio: float
+	tags: list[str]
+	extra: dict[str, int] | None = None
+	note: str | None = None
+
+TypedModel.data_dir = "./data/testing-data"
+
+@pytest.mark.csv_only
+def test_stored_rows_round_trip():
+	TypedModel._drop_table() # type: ignore
+	instances = [
+		TypedModel(pk = "a", flag = True, ratio = 0.5, tags = ["x, y", "z"], extra = {"n": 1}, note = "hi"),
+		TypedModel(pk = "b", flag = False, ratio = 2, tags = []),
+	]
+	TypedModel.put_many(instances)
+
+	assert list(TypedModel.get_all()) == instances
+	assert TypedModel.get_by_primary_key("b").ratio == 2.0 # type: ignore
+
+	# Rows that don't match the current fields are validated instead, so
+	# missing trailing fields get their defaults.
+	with TypedModel._append_csv_file() as w: # type: ignore
+		w.write("c,True,1,[]\n")
+	assert TypedModel.get_by_primary_key("c") == TypedModel(pk = "c", flag = True, ratio = 1, tags = []) # type: ignore
+
+	TypedModel._drop_table() # type: ignore
+
+def test_projection():
+	TypedModel._drop_table() # type: ignore
+	TypedModel.put_many([
+		TypedModel(pk = "a", flag = True, ratio = 0.5, tags = ["x"]),
+		TypedModel(pk = "b", flag = False, ratio = 2, tags = [], note = "hi, there"),
+	])
+
+	assert list(TypedModel.get_all(fields = ["note", "pk"])) == [(None, "a"), ("hi, there", "b")]
+	assert list(TypedModel.get_where(flag = False, fields = ["ratio", "tags"])) == [(2.0, [])]
+
+	try:
+		list(TypedModel.get_all(fields = ["nope"]))
+		assert False
+	except ValueError:
+		pass
+
+	TypedModel._drop_table() # type: ignore
+
+def test_async_api():
+	async def scenario() -> None:
+		await RandomModel.aput_many(
+			RandomModel(pk = pk, field_1 = "even" if pk % 2 == 0 else "odd", field_2 = pk)
+			for pk in range(600)
+		)
+		assert (await RandomModel.aget_by_primary_key(7)).field_1 == "odd" # type: ignore
+		assert await RandomModel.aexists(599)
+		assert [m.pk async for m in RandomModel.aget_all()] == list(range(600))
+		assert [pk async for (pk,) in RandomModel.aget_where(field_1 = "even", fields = ["pk"])] == list(range(0, 600, 2))
+
+		# Writes made on the executor still join the caller's batch.
+		with RandomModel.batch():
+			await RandomModel(pk = 600, field_1 = "even", field_2 = 600).aput()
+			assert await RandomModel.aget_by_primary_key(600) == None
+		assert (await RandomModel.aget_first_where(field_2 = 600)).pk == 600 # type: ignore
+
+		await RandomModel(pk = 600, field_1 = "even", field_2 = 600).adelete()
+		assert not await RandomModel.aexists(600)
+
+	asyncio.run(scenario())
+
+	RandomModel._drop_table() # type: ignore
+
+class CachedModel(PersistedModel):
+	cache_max_entries: ClassVar[int] = 2
+
+	pk: int
+	tags: list[str]
+
+CachedModel.data_dir = "./data/testing-data"
+
+@pytest.mark.csv_only
+def test_cache():
+	CachedModel._drop_table() # type: ignore
+	CachedModel(pk = 1, tags = ["a"]).put()
+
+	first = CachedModel.get_by_primary_key(1)
+	assert first == CachedModel(pk = 1, tags = ["a"])
+	# Changing a returned instance must not change the cached one.
+	first.tags.append("b") # type: ignore
+	assert CachedModel.get_by_primary_key(1) == CachedModel(pk = 1, tags = ["a"])
+	assert CachedModel.get_by_primary_key(2) == None
+	assert CachedModel.get_by_primary_key(2) == None
+	info = CachedModel.cache_info()
+	assert info is not None
+	assert (info["hits"], info["negative_hits"], info["misses"]) == (2, 1, 2)
+
+	# Writes invalidate the cached record, including a cached miss.
+	CachedModel(pk = 1, tags = ["c"]).put()
+	CachedModel(pk = 2, tags = []).put()
+	assert CachedModel.get_by_primary_key(1).tags == ["c"] # type: ignore
+	assert CachedModel.get_by_primary_key(2).tags == [] # type: ignore
+
+	CachedModel.get_by_primary_key(3)
+	info = CachedModel.cache_info()
+	assert info is not None
+	assert info["entries"] == 2
+	assert info["evictions"] == 1
+
+	# Changes made outside of the model are noticed too.
+	with CachedModel._append_csv_file() as w: # type: ignore
+		w.write(CachedModel(pk = 3, tags = ["d"])._to_csv_row() + "\n") # type: ignore
+	assert CachedModel.get_by_primary_key(3).tags == ["d"] # type: ignore
+
+	CachedModel._drop_table() # type: ignore
+
+def test_get_where_scan():
+	"""
+	Unindexed `get_where` scans compare the stored columns in place; values
+	that only occur as part of another column, or in a different column,
+	must not match, and superseded or deleted rows must be skipped.
+	"""
+	AppendModel._drop_table() # type: ignore
+	AppendModel(pk = 1, field_1 = "pear").put()
+	AppendModel(pk = 2, field_1 = "pearl").put()
+	AppendModel(pk = 3, field_1 = "3").put()
+	AppendModel(pk = 4, field_1 = "pear").put()
+	AppendModel(pk = 4, field_1 = "plum").put()
+	AppendModel(pk = 5, field_1 = "pear").put()
+	AppendModel(pk = 5, field_1 = "pear").delete()
+	AppendModel(pk = 6, field_1 = "apple, pear").put()
+
+	assert [instance.pk for instance in AppendModel.get_where(field_1 = "pear")] == [1]
+	assert [instance.pk for instance in AppendModel.get_where(field_1 = "3")] == [3]
+	assert [instance.pk for instance in AppendModel.get_where(field_1 = "plum")] == [4]
+	assert [instance.pk for instance in AppendModel.get_where(field_1 = "apple, pear")] == [6]
+	assert list(AppendModel.get_where(field_1 = "")) == []
+
+	AppendModel._drop_table() # type: ignore
+
+class FilteredModel(PersistedModel):
+	append_only: ClassVar[bool] = True
+	key_filter: ClassVar[bool] = True
+
+	pk: int
+	field_1: str
+
+FilteredModel.data_dir = "./data/testing-data"
+
+@pytest.mark.csv_only
+def test_key_filter():
+	"""
+	A table that hasn't been read yet in this process answers lookups of
+	missing keys from the saved key filter, without indexing the table.
+	"""
+	FilteredModel._drop_table() # type: ignore
+	for pk in range(100):
+		FilteredModel(pk = pk, field_1 = "x").put()
+	FilteredModel.get_by_primary_key(0) # saves the filter
+
+	# A fresh table object stands in for another process.
+	cold = CsvTable(FilteredModel._table().file_path, FilteredModel._to_csv_header(), append_only = True, key_filter = True) # type: ignore
+	assert not cold.contains(b"1000")
+	assert cold._current is None # type: ignore
+	assert cold.contains(b"50")
+
+	# Rows appended after the filter was saved are picked up.
+	FilteredModel(pk = 1000, field_1 = "y").put()
+	cold = CsvTable(FilteredModel._table().file_path, FilteredModel._to_csv_header(), append_only = True, key_filter = True) # type: ignore
+	assert not cold.contains(b"1001")
+	assert cold._current is None # type: ignore
+	assert cold.contains(b"1000")
+
+	FilteredModel._drop_table() # type: ignore
+	assert not FilteredModel.exists(1)
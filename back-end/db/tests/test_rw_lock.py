@@ -0,0 +1,86 @@
+from threading import Thread
+import time
+
+from db.file_lock import FileLock
+from db.rw_lock import ReadWriteLock
+
+def test_readers_share_the_lock():
+	lock = ReadWriteLock()
+	events: list[str] = []
+
+	def reader() -> None:
+		with lock.read():
+			events.append("read")
+
+	with lock.read():
+		thread = Thread(target = reader)
+		thread.start()
+		thread.join(timeout = 1)
+		assert events == ["read"]
+
+def test_writer_excludes_readers():
+	lock = ReadWriteLock()
+	events: list[str] = []
+
+	def reader() -> None:
+		with lock.read():
+			events.append("read")
+
+	with lock.write():
+		thread = Thread(target = reader)
+		thread.start()
+		time.sleep(0.05)
+		events.append("write")
+	thread.join()
+
+	assert events == ["write", "read"]
+
+def test_waiting_writer_blocks_new_readers():
+	lock = ReadWriteLock()
+	events: list[str] = []
+
+	def writer() -> None:
+		with lock.write():
+			events.append("write")
+
+	def reader() -> None:
+		with lock.read():
+			events.append("read")
+
+	with lock.read():
+		writer_thread = Thread(target = writer)
+		writer_thread.start()
+		time.sleep(0.05)
+		reader_thread = Thread(target = reader)
+		reader_thread.start()
+		time.sleep(0.05)
+		assert events == []
+	writer_thread.join()
+	reader_thread.join()
+
+	assert events == ["write", "read"]
+
+def test_file_lock_waits_without_blocking_other_threads(tmp_path):
+	path = tmp_path / "table.lock"
+	lock = FileLock(path)
+	# A second instance has a file descriptor of its own, so its `flock`
+	# conflicts with the first's as if it were another process's.
+	other_process = FileLock(path)
+	events: list[str] = []
+
+	def reader() -> None:
+		with lock.shared():
+			events.append("read")
+
+	with other_process.exclusive():
+		thread = Thread(target = reader)
+		thread.start()
+		time.sleep(0.05)
+		# The waiting reader doesn't hold up the rest of the process.
+		assert lock._condition.acquire(timeout = 1) # type: ignore
+		lock._condition.release() # type: ignore
+		assert lock.generation() == 0
+		assert events == []
+	thread.join()
+
+	assert events == ["read"]
@@ -0,0 +1,221 @@
+import pytest
+from typing import ClassVar
+
+from db.persisted_model import PersistedModel
+from db.sqlite_table import SqliteTable
+
+class SqliteModel(PersistedModel):
+	storage_backend: ClassVar[str | None] = "sqlite"
+	indexed_fields: ClassVar[tuple[str, ...]] = ("shelf",)
+	text_indexed_fields: ClassVar[tuple[str, ...]] = ("title",)
+	cache_max_entries: ClassVar[int] = 16
+
+	pk: int
+	title: str
+	shelf: str
+	rating: int
+	tags: list[str] = []
+
+SqliteModel.data_dir = "./data/testing-data"
+
+class CsvTwinModel(SqliteModel):
+	storage_backend: ClassVar[str | None] = "csv"
+
+class AppendSqliteModel(SqliteModel):
+	append_only: ClassVar[bool] = True
+
+def test_writes():
+	SqliteModel._drop_table() # type: ignore
+	assert SqliteModel(pk = 1, title = "Dune", shelf = "a", rating = 5).post()
+	assert not SqliteModel(pk = 1, title = "Dune", shelf = "b", rating = 5).post()
+	assert SqliteModel(pk = 1, title = "Dune, Messiah", shelf = "b", rating = 4).patch()
+	assert not SqliteModel(pk = 2, title = "Emma", shelf = "b", rating = 4).patch()
+	SqliteModel(pk = 2, title = "Emma", shelf = "a", rating = 3, tags = ["x,y"]).put()
+
+	assert SqliteModel.get_by_primary_key(1) == SqliteModel(pk = 1, title = "Dune, Messiah", shelf = "b", rating = 4)
+	assert SqliteModel.get_by_primary_key(2).tags == ["x,y"] # type: ignore
+	assert SqliteModel.get_by_primary_key(3) == None
+	assert SqliteModel.exists(2)
+
+	SqliteModel(pk = 1, title = "", shelf = "", rating = 0).delete()
+	assert not SqliteModel.exists(1)
+	assert SqliteModel.get_by_primary_key(1) == None
+	assert [instance.pk for instance in SqliteModel.get_all()] == [2]
+
+	# Versions never repeat, even across drops.
+	versions = [SqliteModel.table_version()]
+	for _ in range(2):
+		SqliteModel._drop_table() # type: ignore
+		SqliteModel(pk = 3, title = "Emma", shelf = "a", rating = 3).put()
+		versions.append(SqliteModel.table_version())
+	assert versions[0] < versions[1] < versions[2]
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_get_where():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel.put_many(
+		SqliteModel(pk = i, title = f"Book {i}", shelf = "ab"[i % 2], rating = i % 3)
+		for i in range(3000)
+	)
+
+	found = list(SqliteModel.get_where(shelf = "a", rating = 1))
+	assert [instance.pk for instance in found] == [i for i in range(3000) if i % 2 == 0 and i % 3 == 1]
+	assert len(list(SqliteModel.get_where(rating = 2))) == 1000
+	assert list(SqliteModel.get_where(fields = ["title"], pk = 7)) == [("Book 7",)]
+	assert list(SqliteModel.get_where(pk = 7, shelf = "a")) == []
+	assert SqliteModel.get_first_where(shelf = "b").pk == 1 # type: ignore
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_get_where_like():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel(pk = 1, title = "Frankenstein; or, The Modern Prometheus", shelf = "a", rating = 5).put()
+	SqliteModel(pk = 2, title = "Young Frankenstein", shelf = "b", rating = 4).put()
+	SqliteModel(pk = 3, title = "Dracula", shelf = "a", rating = 3).put()
+
+	def like(**search_fields: str | int | bool | float) -> list[int]:
+		return [instance.pk for instance in SqliteModel.get_where_like(**search_fields)]
+
+	assert like(title = "frankenstein") == [1, 2]
+	assert like(title = "prometheus frankenstein") == [1]
+	assert like(title = "or, the") == [1]
+	assert like(title = "drac") == [3]
+	assert like(title = "Dr") == [3]
+	assert like(title = "frankenstein", shelf = "b") == [2]
+	assert like(title = "werewolf") == []
+	assert like(title = "frankenstein", ranked = True) == [2, 1]
+	assert like(title = "frankenstein", ranked = True, skip = 1) == [1]
+	assert like(title = "frankenstien", min_similarity = 0.4) == [1, 2]
+	assert like(title = "frankenstien") == []
+
+	# The full-text index follows updates and deletes.
+	SqliteModel(pk = 3, title = "Frankenstein Unbound", shelf = "a", rating = 3).put()
+	SqliteModel(pk = 2, title = "", shelf = "", rating = 0).delete()
+	assert like(title = "frankenstein") == [1, 3]
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_batch_is_a_transaction():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel(pk = 1, title = "Dune", shelf = "a", rating = 5).put()
+
+	with pytest.raises(RuntimeError):
+		with SqliteModel.batch():
+			SqliteModel(pk = 2, title = "Emma", shelf = "a", rating = 3).put()
+			raise RuntimeError()
+	assert not SqliteModel.exists(2)
+
+	with SqliteModel.batch():
+		SqliteModel(pk = 2, title = "Emma", shelf = "a", rating = 3).put()
+		SqliteModel(pk = 1, title = "Dune", shelf = "a", rating = 5).delete()
+	assert [instance.pk for instance in SqliteModel.get_all()] == [2]
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_cache_sees_other_connections():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel(pk = 1, title = "Dune", shelf = "a", rating = 5).put()
+	assert SqliteModel.get_by_primary_key(1).rating == 5 # type: ignore
+
+	# A second table object stands in for another process.
+	table = SqliteModel._table()
+	assert isinstance(table, SqliteTable)
+	other = SqliteTable(table.database_path, table.name, table.columns)
+	other.write(b"1", SqliteModel(pk = 1, title = "Dune", shelf = "a", rating = 2)._row_bytes()) # type: ignore
+
+	assert SqliteModel.get_by_primary_key(1).rating == 2 # type: ignore
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_searches_match_csv():
+	titles = [
+		"Frankenstein", "Young Frankenstein", "Frankenstein Unbound", "The Franklin Papers",
+		"Dracula", "Dracula's Guest", "Frank and Frankenstein, Frankenstein", "Prometheus",
+	]
+	for model in (SqliteModel, CsvTwinModel):
+		model._drop_table() # type: ignore
+		model.put_many(
+			model(pk = i, title = f"{titles[i % len(titles)]} {i // len(titles)}", shelf = "ab"[i % 2], rating = i % 5)
+			for i in range(40)
+		)
+		model(pk = 3, title = "Frankenstein Revisited", shelf = "a", rating = 1).put()
+		model(pk = 4, title = "", shelf = "", rating = 0).delete()
+
+	# Ranked and fuzzy searches find, score and order rows exactly as they
+	# would in a table file.
+	for search in ("frankenstein", "frank", "franknstein", "dracula 2", "the", "", "frankenstein 1"):
+		for options in (
+			{}, {"ranked": True}, {"ranked": True, "skip": 2, "limit": 3},
+			{"min_similarity": 0.4}, {"min_similarity": 0.4, "ranked": True}, {"shelf": "b"},
+			{"shelf": "a", "ranked": True, "limit": 2},
+		):
+			assert [instance.pk for instance in SqliteModel.get_where_like(title = search, **options)] == \
+				[instance.pk for instance in CsvTwinModel.get_where_like(title = search, **options)]
+
+	for model in (SqliteModel, CsvTwinModel):
+		model._drop_table() # type: ignore
+
+def test_text_indexes_follow_writes():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel(pk = 1, title = "Frankenstein", shelf = "a", rating = 5).put()
+	SqliteModel(pk = 2, title = "Dracula", shelf = "a", rating = 5).put()
+	assert [instance.pk for instance in SqliteModel.get_where_like(title = "frankenstien", min_similarity = 0.4)] == [1]
+	text_indexes = SqliteModel._table()._text_indexes # type: ignore
+
+	SqliteModel.put_many([
+		SqliteModel(pk = 2, title = "Young Frankenstein", shelf = "a", rating = 5),
+		SqliteModel(pk = 3, title = "Frankenstein Unbound", shelf = "a", rating = 5),
+	])
+	SqliteModel(pk = 1, title = "", shelf = "", rating = 0).delete()
+	assert [instance.pk for instance in SqliteModel.get_where_like(title = "frankenstien", min_similarity = 0.4)] == [2, 3]
+	# The writes were applied to the loaded indexes rather than reloading
+	# them.
+	assert SqliteModel._table()._text_indexes is text_indexes # type: ignore
+
+	# So do writes by other processes.
+	table = SqliteModel._table()
+	assert isinstance(table, SqliteTable)
+	other = SqliteTable(table.database_path, table.name, table.columns)
+	other.write(b"4", SqliteModel(pk = 4, title = "Frankenstein", shelf = "a", rating = 2)._row_bytes()) # type: ignore
+	assert [instance.pk for instance in SqliteModel.get_where_like(title = "frankenstien", min_similarity = 0.4, ranked = True)] == [4, 2, 3]
+
+	SqliteModel._drop_table() # type: ignore
+
+def test_append_only_order():
+	AppendSqliteModel._drop_table() # type: ignore
+	AppendSqliteModel.put_many(
+		AppendSqliteModel(pk = i, title = f"Book {i}", shelf = "a", rating = 1)
+		for i in range(4)
+	)
+	AppendSqliteModel(pk = 1, title = "Book 1, revised", shelf = "a", rating = 2).put()
+	AppendSqliteModel.put_many([
+		AppendSqliteModel(pk = 0, title = "Book 0, revised", shelf = "a", rating = 2),
+		AppendSqliteModel(pk = 5, title = "Book 5", shelf = "a", rating = 2),
+	])
+
+	# Updated records move to the end, as they would in a table file.
+	assert [instance.pk for instance in AppendSqliteModel.get_all()] == [2, 3, 1, 0, 5]
+	assert [instance.pk for instance in AppendSqliteModel.get_where_like(title = "revised")] == [1, 0]
+
+	AppendSqliteModel._drop_table() # type: ignore
+
+def test_changes_since():
+	SqliteModel._drop_table() # type: ignore
+	SqliteModel.put_many(SqliteModel(pk = i, title = "Dune", shelf = "a", rating = 1) for i in range(5))
+	table = SqliteModel._table()
+	version, position, keys = table.changes_since()
+	assert version == SqliteModel.table_version() and keys is None
+
+	SqliteModel(pk = 3, title = "Emma", shelf = "a", rating = 2).put()
+	other = SqliteTable(table.database_path, table.name, table.columns) # type: ignore
+	other.write_many({b"7": SqliteModel(pk = 7, title = "Emma", shelf = "b", rating = 2)._row_bytes(), b"3": None}) # type: ignore
+	version, position, keys = table.changes_since(position)
+	assert version == SqliteModel.table_version() and keys == [b"3", b"7"]
+	assert table.changes_since(position)[2] == []
+
+	# Dropping the table can't be caught up with.
+	SqliteModel._drop_table() # type: ignore
+	assert table.changes_since(position)[2] is None
+
+	SqliteModel._drop_table() # type: ignore
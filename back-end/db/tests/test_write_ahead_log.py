@@ -0,0 +1,78 @@
+import pytest
+from pathlib import Path
+from threading import Thread
+from typing import ClassVar
+
+from db.csv_table import CsvTable
+from db.persisted_model import PersistedModel, _tables
+from db.write_ahead_log import WriteAheadLog
+
+class LoggedModel(PersistedModel):
+	write_ahead_log: ClassVar[bool] = True
+	wal_durability: ClassVar[str | None] = "batched"
+
+	pk: int
+	field_1: str
+
+LoggedModel.data_dir = "./data/testing-data"
+
+def test_group_commit():
+	LoggedModel._drop_table() # type: ignore
+
+	# Written before the threads start, since nothing makes the first of
+	# them write it before another one posts it.
+	LoggedModel(pk = 0, field_1 = "x").put()
+	results: list[bool] = []
+
+	def write(start: int) -> None:
+		for pk in range(start, start + 50):
+			LoggedModel(pk = pk, field_1 = "x").put()
+		results.append(LoggedModel(pk = 0, field_1 = "y").post())
+
+	threads = [Thread(target = write, args = (start,)) for start in (0, 50, 100, 150)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert sorted(instance.pk for instance in LoggedModel.get_all()) == list(range(200))
+	assert results == [False] * 4
+	assert LoggedModel(pk = 7, field_1 = "").delete() is None
+	assert not LoggedModel.exists(7)
+	assert not LoggedModel(pk = 7, field_1 = "z").patch()
+
+	LoggedModel._drop_table() # type: ignore
+
+@pytest.mark.csv_only
+def test_replay():
+	"""
+	Changes left in the log by a process that crashed are applied by the
+	next process to open the table, and a frame that was only partly
+	written is ignored.
+	"""
+	LoggedModel._drop_table() # type: ignore
+	LoggedModel(pk = 1, field_1 = "apple").put()
+	LoggedModel(pk = 2, field_1 = "banana").put()
+
+	table = LoggedModel._table()
+	assert isinstance(table, CsvTable) and table.wal is not None
+	log_path = table.wal.path
+	# Closing the log stands in for the process exiting.
+	table.wal.close()
+	_tables.clear()
+	CsvTable._tables.clear()
+
+	log = WriteAheadLog(log_path)
+	log.append({b"1": None, b"3": b"3,cherry"})
+	log.append({b"2": b"2,blueberry"})
+	with log_path.open("ab") as w:
+		w.write(b"\x20\x00\x00\x00torn")
+	assert log.read() == {b"1": None, b"3": b"3,cherry", b"2": b"2,blueberry"}
+	log.close()
+
+	assert LoggedModel.get_by_primary_key(1) == None
+	assert LoggedModel.get_by_primary_key(2).field_1 == "blueberry" # type: ignore
+	assert LoggedModel.get_by_primary_key(3).field_1 == "cherry" # type: ignore
+	assert Path(log_path).stat().st_size == 0
+
+	LoggedModel._drop_table() # type: ignore
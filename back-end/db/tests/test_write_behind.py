@@ -0,0 +1,50 @@
+from db.persisted_model import PersistedModel
+from db.write_behind import WriteBehind
+
+class DeferredModel(PersistedModel):
+	pk: int
+	field_1: str
+	field_2: str = ""
+
+DeferredModel.data_dir = "./data/testing-data"
+
+def test_write_behind():
+	DeferredModel._drop_table() # type: ignore
+	DeferredModel(pk = 1, field_1 = "apple").put()
+	DeferredModel(pk = 2, field_1 = "banana").put()
+
+	writes = WriteBehind(DeferredModel, delay = 60)
+	writes.patch(DeferredModel(pk = 1, field_1 = "orange"))
+	writes.patch(DeferredModel(pk = 1, field_1 = "peach"))
+	writes.patch(DeferredModel(pk = 2, field_1 = "mango"))
+	writes.patch(DeferredModel(pk = 3, field_1 = "papaya"))
+
+	# Nothing is written until the updates are flushed.
+	assert DeferredModel.get_by_primary_key(1).field_1 == "apple" # type: ignore
+	assert writes.get(1).field_1 == "peach" # type: ignore
+	assert writes.get(4) == None
+
+	writes.discard(2)
+	writes.flush()
+	assert writes.get(1) == None
+	assert DeferredModel.get_by_primary_key(1).field_1 == "peach" # type: ignore
+	assert DeferredModel.get_by_primary_key(2).field_1 == "banana" # type: ignore
+	# Records that don't exist aren't created.
+	assert DeferredModel.get_by_primary_key(3) == None
+
+	DeferredModel._drop_table() # type: ignore
+
+def test_write_behind_fields():
+	DeferredModel._drop_table() # type: ignore
+	DeferredModel(pk = 1, field_1 = "apple", field_2 = "red").put()
+
+	writes = WriteBehind(DeferredModel, delay = 60, fields = ("field_1",))
+	writes.patch(DeferredModel(pk = 1, field_1 = "peach", field_2 = "stale"))
+	# The other fields are written straight away, before the queued update.
+	DeferredModel(pk = 1, field_1 = "apple", field_2 = "green").put()
+	assert writes.get(1) == DeferredModel(pk = 1, field_1 = "peach", field_2 = "green")
+
+	writes.flush()
+	assert DeferredModel.get_by_primary_key(1) == DeferredModel(pk = 1, field_1 = "peach", field_2 = "green")
+
+	DeferredModel._drop_table() # type: ignore
@@ -0,0 +1,404 @@
+from collections import Counter
+from heapq import nsmallest
+from itertools import chain
+from math import log
+
+from db.loose_compare import loose_words, trigrams
+
+_K1 = 1.2
+"""
+How quickly repeating a word in a value stops adding to its score (see
+`TextIndex.scores`).
+"""
+_B = 0.75
+"""
+How much a value's score is scaled down for having more words than average,
+from 0 (not at all) to 1 (in proportion to its length).
+"""
+
+class TextIndex:
+	"""
+	An inverted index of the words in one column of a table: each word (as
+	split by `loose_words`, in lower case) maps to the primary keys of the
+	rows whose value in the column contains it.
+
+	A search value loosely matches a stored value (see `loose_compare`)
+	exactly when every word of the search value is part of one of the stored
+	value's words, as long as the search value has any words at all. So the
+	rows that match are found by looking up the words of the index that
+	contain each searched word, and intersecting their keys; see `matches`.
+	The words of the index are themselves indexed by their trigrams, which
+	is how the ones that contain a search word, or (for fuzzy searches) are
+	similar to it, are found.
+
+	Like `CsvTable`'s other secondary indexes, this holds keys rather than
+	offsets and is shared by every version of the table file. Updates must
+	be made while holding the table's write lock, and lookups while holding
+	at least its read lock.
+	"""
+
+	def __init__(self) -> None:
+		self.postings: dict[str, set[bytes]] = {}
+		self.trigrams: dict[str, set[str]] = {}
+		"""
+		The words of `postings` that have each trigram (see `trigrams`).
+		"""
+		self.lengths: dict[bytes, int] = {}
+		"""
+		The number of words in each indexed value, counting repeats.
+		"""
+		self.by_length: dict[int, set[bytes]] = {}
+		"""
+		The keys of the rows with each number of words; see `best`.
+		"""
+		self.repeats: dict[str, dict[bytes, int]] = {}
+		"""
+		The number of times each word appears in the values where it appears
+		more than once, which is rare enough in titles to store separately.
+		"""
+		self._total_length = 0
+
+	@staticmethod
+	def words(value: bytes) -> list[str]:
+		return loose_words(value.decode("latin-1").lower())
+
+	def add(self, key: bytes, value: bytes) -> None:
+		words = self.words(value)
+		distinct = set(words)
+		for word in distinct:
+			keys = self.postings.get(word)
+			if keys is None:
+				self.postings[word] = {key}
+				for trigram in trigrams(word):
+					self.trigrams.setdefault(trigram, set()).add(word)
+			else:
+				keys.add(key)
+		if len(distinct) < len(words):
+			for word, count in Counter(words).items():
+				if count > 1:
+					self.repeats.setdefault(word, {})[key] = count
+		self.lengths[key] = len(words)
+		self.by_length.setdefault(len(words), set()).add(key)
+		self._total_length += len(words)
+
+	def remove(self, key: bytes, value: bytes) -> None:
+		words = self.words(value)
+		distinct = set(words)
+		for word in distinct:
+			keys = self.postings.get(word)
+			if keys is not None:
+				keys.discard(key)
+				if not keys:
+					del self.postings[word]
+					for trigram in trigrams(word):
+						words_with_trigram = self.trigrams[trigram]
+						words_with_trigram.discard(word)
+						if not words_with_trigram:
+							del self.trigrams[trigram]
+		if len(distinct) < len(words):
+			for word in distinct:
+				repeats = self.repeats.get(word)
+				if repeats is not None:
+					repeats.pop(key, None)
+					if not repeats:
+						del self.repeats[word]
+		length = self.lengths.pop(key, None)
+		if length is not None:
+			self._total_length -= length
+			keys = self.by_length[length]
+			keys.discard(key)
+			if not keys:
+				del self.by_length[length]
+
+	def _words_containing(self, search_word: str) -> set[str]:
+		if len(search_word) < 3:
+			# Every appearance of it is within one of a word's (padded)
+			# trigrams.
+			found: set[str] = set()
+			for trigram, words in self.trigrams.items():
+				if search_word in trigram:
+					found |= words
+			return found
+		# A word that contains it has all of its trigrams.
+		sets = sorted(
+			(self.trigrams.get(search_word[i:i + 3], set()) for i in range(len(search_word) - 2)),
+			key = len
+		)
+		found = sets[0].intersection(*sets[1:])
+		if len(search_word) == 3:
+			return found
+		return {word for word in found if search_word in word}
+
+	def _similar_words(self, search_word: str, min_similarity: float) -> dict[str, float]:
+		"""
+		Returns the words of the index that are at least `min_similarity`
+		similar to `search_word` (see `similarity`), with their similarity.
+		"""
+		search_trigrams = trigrams(search_word)
+		shared = Counter(chain.from_iterable(
+			self.trigrams.get(trigram, ()) for trigram in search_trigrams
+		))
+		# Two words can only be that similar if they share at least this
+		# many trigrams.
+		least_shared = min_similarity * len(search_trigrams)
+		similar: dict[str, float] = {}
+		for word, count in shared.items():
+			if count >= least_shared:
+				word_similarity = count / (len(search_trigrams) + len(trigrams(word)) - count)
+				if word_similarity >= min_similarity:
+					similar[word] = word_similarity
+		return similar
+
+	def _shares(self, search_word: str, min_similarity: float | None = None) -> dict[str, float]:
+		"""
+		Returns the words of the index that `search_word` matches, each with
+		how much of it the search word makes up: the share of its length if
+		it contains the search word, or otherwise, for fuzzy searches (when
+		`min_similarity` is given), how similar the two are.
+		"""
+		shares = {word: len(search_word) / len(word) for word in self._words_containing(search_word)}
+		if min_similarity is not None:
+			for word, word_similarity in self._similar_words(search_word, min_similarity).items():
+				shares.setdefault(word, word_similarity)
+		return shares
+
+	def matches(self, search_value: str, min_similarity: float | None = None) -> set[bytes] | None:
+		"""
+		Returns the keys of the rows whose value loosely matches
+		`search_value`, or `None` if the index can't tell because the
+		search value has no words (e.g. it is empty, or only punctuation).
+		If `min_similarity` is given, words of the search value also match
+		words that are at least that similar to them (see `fuzzy_compare`).
+		"""
+		search_words = set(loose_words(search_value.lower()))
+		if not search_words:
+			return None
+		# Look up the longest words first; they tend to be the rarest.
+		matched: set[bytes] | None = None
+		for search_word in sorted(search_words, key = len, reverse = True):
+			keys: set[bytes] = set()
+			for word in self._shares(search_word, min_similarity):
+				postings = self.postings[word]
+				keys |= postings if matched is None else postings & matched
+			matched = keys
+			if not matched:
+				break
+		return matched
+
+	def statistics(self, search_value: str, min_similarity: float | None = None) -> "TextStatistics":
+		"""
+		Returns the numbers that scores for `search_value` depend on (see
+		`TextStatistics`), for this index alone.
+		"""
+		return TextStatistics(len(self.lengths), self._total_length, {
+			search_word: sum(len(self.postings[word]) for word in self._shares(search_word, min_similarity))
+			for search_word in set(loose_words(search_value.lower()))
+		})
+
+	def _frequencies(self, shares: dict[str, float], keys: set[bytes]) -> dict[bytes, float]:
+		"""
+		Returns how often a search word appears in the value of each of
+		`keys` that it matches, where `shares` are the words it matches (see
+		`_shares`). An appearance as part of a longer word counts for the
+		part of that word it makes up, and only the word it counts most for
+		in each value is counted.
+		"""
+		frequencies: dict[bytes, float] = {}
+		for word in sorted(shares, key = shares.__getitem__, reverse = True):
+			share = shares[word]
+			matched = self.postings[word] & keys
+			frequencies.update(dict.fromkeys(matched.difference(frequencies), share))
+			for key, count in self.repeats.get(word, {}).items():
+				if key in keys and share * count > frequencies[key]:
+					frequencies[key] = share * count
+		return frequencies
+
+	def scores(
+		self,
+		search_value: str,
+		keys: set[bytes],
+		statistics: "TextStatistics | None" = None,
+		min_similarity: float | None = None
+	) -> dict[bytes, float]:
+		"""
+		Scores how well each of `keys` (which should be among those that
+		`matches` returned for `search_value` and `min_similarity`) matches
+		the search value, using BM25: words of the search value that few
+		values contain count for more, and so do short values. `statistics`
+		can be given to score them against more rows than those in this
+		index.
+
+		A search word counts in proportion to how much of the value's word
+		it makes up, so "frank" scores higher against "Frank" than against
+		"Frankenstein", and a misspelled one in proportion to how similar
+		the two are (see `_shares`).
+		"""
+		if statistics is None:
+			statistics = self.statistics(search_value, min_similarity)
+		if not statistics.rows:
+			return {}
+		lengths = self.lengths
+		scores = dict.fromkeys(keys, 0.0)
+		for search_word in set(loose_words(search_value.lower())):
+			weight = statistics.weight(search_word)
+			norm, norm_per_word = statistics.norms()
+			frequencies = self._frequencies(self._shares(search_word, min_similarity), keys)
+			for key, frequency in frequencies.items():
+				scores[key] += weight * frequency / (frequency + norm + norm_per_word * lengths[key])
+		return scores
+
+	def best(
+		self,
+		search_value: str,
+		keys: set[bytes] | None,
+		count: int | None,
+		statistics: "TextStatistics | None" = None,
+		min_similarity: float | None = None
+	) -> list[tuple[float, bytes]]:
+		"""
+		Returns the `count` of `keys` (or of all of the rows that `matches`
+		finds, if `keys` is `None`) that best match `search_value`, as
+		`best_scores` would pick them out of `scores`.
+
+		A search for a single word scores each row by the word of the row
+		that it matches best. The rows that contain a word once all score
+		the same for it if they have as many words, and higher the fewer
+		they have, so rather than scoring rows one by one, this goes through
+		the words, best first, taking their rows by length, shortest first,
+		until no more can make the top `count`.
+		"""
+		if count == 0:
+			return []
+		if statistics is None:
+			statistics = self.statistics(search_value, min_similarity)
+		if count is None or len(statistics.containing) != 1 or not self.lengths:
+			if keys is None:
+				keys = self.matches(search_value, min_similarity) or set()
+			return best_scores(self.scores(search_value, keys, statistics, min_similarity), count)
+		[search_word] = statistics.containing
+		shares = self._shares(search_word, min_similarity)
+		weight = statistics.weight(search_word)
+		norm, norm_per_word = statistics.norms()
+		lengths = sorted(self.by_length)
+
+		def score(frequency: float, length: int) -> float:
+			return weight * frequency / (frequency + norm + norm_per_word * length)
+
+		def highest_score(word: str) -> float:
+			repeats = self.repeats.get(word)
+			most = max(repeats.values()) if repeats else 1
+			return score(shares[word] * most, lengths[0])
+
+		candidates: dict[bytes, float] = {}
+		threshold = 0.0
+		for word in sorted(shares, key = highest_score, reverse = True):
+			if len(candidates) >= count and highest_score(word) < threshold:
+				break
+			matched = self.postings[word] if keys is None else self.postings[word] & keys
+			share = shares[word]
+			repeats = self.repeats.get(word, {})
+			# Rows with the word more than once are scored on their own.
+			for key, repeated in repeats.items():
+				if key in matched:
+					repeated_score = score(share * repeated, self.lengths[key])
+					if repeated_score > candidates.get(key, 0.0):
+						candidates[key] = repeated_score
+			# A row that only comes up here for a word that it contains
+			# better has already been scored for that word, higher.
+			found = 0
+			for length in lengths:
+				if found >= count:
+					break
+				rows = matched & self.by_length[length]
+				if repeats:
+					rows.difference_update(repeats)
+				if not rows:
+					continue
+				row_score = score(share, length)
+				for key in nsmallest(count, rows):
+					if row_score > candidates.get(key, 0.0):
+						candidates[key] = row_score
+				found += len(rows)
+			if len(candidates) >= count:
+				best = best_scores(candidates, count)
+				candidates = {key: row_score for row_score, key in best}
+				threshold = best[-1][0]
+		return best_scores(candidates, count)
+
+class TextStatistics:
+	"""
+	The numbers, besides those of the row itself, that a row's score for a
+	search value depends on: how many rows there are, how many words they
+	have in all, and how many contain each word of the search value. The
+	statistics of several indexes (e.g. of the partitions of a table) can
+	be added up, so that rows are scored the same whichever one they're in.
+	"""
+
+	def __init__(self, rows: int, total_length: int, containing: dict[str, int]) -> None:
+		self.rows = rows
+		self.total_length = total_length
+		self.containing = containing
+
+	def __add__(self, other: "TextStatistics") -> "TextStatistics":
+		return TextStatistics(
+			self.rows + other.rows,
+			self.total_length + other.total_length,
+			{
+				search_word: containing + other.containing.get(search_word, 0)
+				for search_word, containing in self.containing.items()
+			}
+		)
+
+	def weight(self, search_word: str) -> float:
+		"""
+		Returns how much `search_word` counts for (its inverse document
+		frequency): the fewer rows contain it, the more.
+		"""
+		containing = min(self.rows, self.containing[search_word])
+		return log(1 + (self.rows - containing + 0.5) / (containing + 0.5)) * (_K1 + 1)
+
+	def norms(self) -> tuple[float, float]:
+		"""
+		Returns the parts of the BM25 length normalization: the constant,
+		and the amount added for each word of a value.
+		"""
+		return _K1 * (1 - _B), _K1 * _B * self.rows / max(self.total_length, 1)
+
+def best_scores(scores: dict[bytes, float], count: int | None = None) -> list[tuple[float, bytes]]:
+	"""
+	Returns the `count` highest of `scores` (or all of them, if `count` is
+	`None`) as pairs of score and key, best first, with ties broken by key.
+	Picking the best few this way takes O(n log count) time, rather than the
+	O(n log n) of sorting all of them.
+	"""
+	if count is None:
+		best = sorted((-score, key) for key, score in scores.items())
+	else:
+		best = nsmallest(count, ((-score, key) for key, score in scores.items()))
+	return [(-score, key) for score, key in best]
+
+def rank(
+	searches: list[tuple[TextIndex, str, TextStatistics | None]],
+	count: int | None = None,
+	min_similarity: float | None = None
+) -> list[tuple[float, bytes]]:
+	"""
+	Returns the `count` keys (or all of them) that best match every one of
+	`searches`, each a text index with the value to search it for (which
+	must have words) and the statistics to score the rows against (or
+	`None` for the index's own), with their scores, best first, as
+	`best_scores` would pick them. A key's score is the sum of its scores
+	for each search.
+	"""
+	if len(searches) == 1:
+		text_index, search_value, statistics = searches[0]
+		return text_index.best(search_value, None, count, statistics, min_similarity)
+	candidates = set.intersection(*(
+		text_index.matches(search_value, min_similarity) # type: ignore
+		for text_index, search_value, _ in searches
+	))
+	scores: dict[bytes, float] = {}
+	for text_index, search_value, statistics in searches:
+		for key, score in text_index.scores(search_value, candidates, statistics, min_similarity).items():
+			scores[key] = scores.get(key, 0.0) + score
+	return best_scores(scores, count)
@@ -0,0 +1,176 @@
+import os
+from pathlib import Path
+import struct
+from threading import Lock
+import time
+import zlib
+
+try:
+	import fcntl
+except ImportError: # Windows
+	fcntl = None
+
+DURABILITY_MODES = ("fsync", "batched", "buffered")
+"""
+How a `WriteAheadLog` makes each group commit durable:
+
+- `"fsync"`: the log is synced to disk before the commit returns, so no
+  write that has returned can be lost, even if the machine crashes.
+- `"batched"`: the log is synced at most once every `SYNC_INTERVAL`
+  seconds, so a machine crash can lose the writes of the last interval.
+- `"buffered"`: the log is never synced, and the operating system writes
+  it out when it sees fit. Writes survive the process crashing, but not
+  the machine.
+"""
+
+SYNC_INTERVAL = 0.05
+
+_FRAME_HEADER = struct.Struct("<II")
+"""
+The length and CRC-32 of a frame's payload.
+"""
+_CHANGE_HEADER = struct.Struct("<II")
+"""
+The lengths of a change's key and row.
+"""
+_DELETED = 0xFFFFFFFF
+"""
+The row length that marks a change as a delete.
+"""
+
+class WriteAheadLog:
+	"""
+	A log of the changes made to one table, kept in a file next to it. Each
+	group commit is appended as one frame, holding every change in the
+	group, with a checksum so that a frame that was only partly written
+	when the process crashed is recognised and ignored.
+
+	Frames stay in the log until a checkpoint, after the table file itself
+	has been synced to disk, truncates it. Replaying the log applies every
+	change in it again, in order, which is harmless for changes that had
+	already been applied since each one replaces the whole record.
+
+	Every process that has the table open holds a shared `flock` on the
+	log for as long as it does. The first process to open the log while no
+	other process holds it knows that the log's frames were left by
+	processes that have since exited (or crashed), and replays them.
+	"""
+
+	def __init__(self, path: Path, durability: str = "fsync") -> None:
+		if durability not in DURABILITY_MODES:
+			raise ValueError(f"unknown durability mode {durability!r}")
+		self.path = path
+		self.durability = durability
+		self._fd: int | None = None
+		self._mutex = Lock()
+		self._last_sync = 0.0
+		self._unsynced = False
+
+	def open(self) -> bool:
+		"""
+		Opens the log, and returns True if no other process has it open, in
+		which case any frames in it need to be replayed.
+		"""
+		with self._mutex:
+			if self._fd is not None:
+				return False
+			self.path.parent.mkdir(parents = True, exist_ok = True)
+			self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+			if fcntl is None:
+				return True
+			try:
+				fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+				alone = True
+			except BlockingIOError:
+				alone = False
+			# Converting the lock to shared mode lets other processes open the
+			# log too, without them thinking that they are alone.
+			fcntl.flock(self._fd, fcntl.LOCK_SH)
+			return alone
+
+	def _fileno(self) -> int:
+		if self._fd is None:
+			self.open()
+		return self._fd # type: ignore
+
+	def size(self) -> int:
+		return os.fstat(self._fileno()).st_size
+
+	def append(self, changes: dict[bytes, bytes | None]) -> None:
+		"""
+		Appends one frame holding `changes`, and syncs the log according to
+		its durability mode. The table's locks must be held in exclusive
+		mode, so that frames are appended in the order they are applied.
+		"""
+		payload = bytearray()
+		for key, row in changes.items():
+			payload += _CHANGE_HEADER.pack(len(key), _DELETED if row is None else len(row))
+			payload += key
+			if row is not None:
+				payload += row
+		fd = self._fileno()
+		os.write(fd, _FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+		self._unsynced = True
+		if self.durability == "fsync":
+			self.sync()
+		elif self.durability == "batched" and time.monotonic() - self._last_sync >= SYNC_INTERVAL:
+			self.sync()
+
+	def sync(self) -> None:
+		"""
+		Syncs the log to disk, if anything has been appended since it was
+		last synced.
+		"""
+		if self._unsynced:
+			# Clearing the flag first means that a frame appended while this
+			# sync runs is left for the next one.
+			self._unsynced = False
+			os.fsync(self._fileno())
+		self._last_sync = time.monotonic()
+
+	def needs_sync(self) -> bool:
+		return self._unsynced and self.durability == "batched"
+
+	def read(self) -> dict[bytes, bytes | None]:
+		"""
+		Returns the changes in the log, with the later change to each key
+		replacing the earlier ones, stopping at the first frame that wasn't
+		completely written.
+		"""
+		data = os.pread(self._fileno(), self.size(), 0)
+		changes: dict[bytes, bytes | None] = {}
+		position = 0
+		while position + _FRAME_HEADER.size <= len(data):
+			length, checksum = _FRAME_HEADER.unpack_from(data, position)
+			start = position + _FRAME_HEADER.size
+			payload = data[start:start + length]
+			if len(payload) < length or zlib.crc32(payload) != checksum:
+				break
+			offset = 0
+			while offset < length:
+				key_length, row_length = _CHANGE_HEADER.unpack_from(payload, offset)
+				offset += _CHANGE_HEADER.size
+				key = payload[offset:offset + key_length]
+				offset += key_length
+				changes.pop(key, None)
+				if row_length == _DELETED:
+					changes[key] = None
+				else:
+					changes[key] = payload[offset:offset + row_length]
+					offset += row_length
+			position = start + length
+		return changes
+
+	def truncate(self, size: int = 0) -> None:
+		"""
+		Cuts the log back to `size` bytes, emptying it by default. To empty
+		it, the table file must already have been synced, so that the
+		changes in the log are no longer needed.
+		"""
+		os.ftruncate(self._fileno(), size)
+
+	def close(self) -> None:
+		with self._mutex:
+			if self._fd is not None:
+				os.close(self._fd)
+				self._fd = None
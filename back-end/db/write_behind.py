@@ -0,0 +1,130 @@
+import atexit
+import os
+from threading import Lock, Timer
+from typing import Generic, TypeVar
+
+from db.persisted_model import PersistedModel
+
+M = TypeVar("M", bound = PersistedModel)
+
+def _delay_from_env() -> float:
+	raw = os.getenv("WRITE_BEHIND_DELAY")
+	if not raw:
+		return 5.0
+	try:
+		value = float(raw)
+		return value if value >= 0 else 5.0
+	except ValueError:
+		return 5.0
+
+class WriteBehind(Generic[M]):
+	"""
+	Updates to records of one model that are kept in memory and written to
+	the table in the background, a few seconds later, instead of by the
+	request that makes them. Updates queued for the same record replace
+	each other, so a record that is updated many times in a row is only
+	written once.
+
+	Queued updates are applied together, in one batch, with `patch`, so a
+	record that was deleted in the meantime (by this or any other process)
+	stays deleted. Reads should check `get` before the table, to see the
+	queued version of a record. Whatever is still queued when the process
+	exits is written then.
+
+	Given `fields`, only the values of those fields are queued, and they are
+	written over the record as it is stored when the updates are flushed,
+	so changes made to its other fields in the meantime are kept.
+
+	The delay is set by the `WRITE_BEHIND_DELAY` environment variable (5
+	seconds by default); 0 writes each update straight away.
+	"""
+
+	def __init__(self, model: type[M], delay: float | None = None, fields: tuple[str, ...] | None = None) -> None:
+		self.model = model
+		self.delay = _delay_from_env() if delay is None else delay
+		self.fields = fields
+		self._pending: dict[bytes, M] = {}
+		"""
+		The queued version of each record, by key; with `fields`, only its
+		primary key and those fields are set.
+		"""
+		self._lock = Lock()
+		self._timer: Timer | None = None
+		atexit.register(self.flush)
+
+	def patch(self, instance: M) -> None:
+		"""
+		Queues `instance` to be written over the stored record with the same
+		primary key.
+		"""
+		if self.fields is not None:
+			primary_key = next(iter(self.model.model_fields))
+			instance = self.model.model_construct(**{
+				field: getattr(instance, field) for field in (primary_key, *self.fields)
+			})
+		if self.delay == 0:
+			self._write({instance._key_bytes(): instance})
+			return
+		with self._lock:
+			self._pending[instance._key_bytes()] = instance.model_copy()
+			if self._timer is None:
+				self._timer = Timer(self.delay, self.flush)
+				self._timer.daemon = True
+				self._timer.start()
+
+	def get(self, search_key: object) -> M | None:
+		"""
+		Returns a copy of the queued version of the record with the given
+		primary key, or `None` if no update to it is queued.
+		"""
+		with self._lock:
+			instance = self._pending.get(self.model._encode_value(search_key))
+		if instance is None:
+			return None
+		if self.fields is None:
+			return instance.model_copy()
+		stored = self.model.get_by_primary_key(search_key)
+		return None if stored is None else self._updated(stored, instance)
+
+	def discard(self, search_key: object) -> None:
+		"""
+		Drops any queued update to the record with the given primary key,
+		e.g. because it is being deleted.
+		"""
+		with self._lock:
+			self._pending.pop(self.model._encode_value(search_key), None)
+
+	def flush(self) -> None:
+		"""
+		Writes every queued update now.
+		"""
+		with self._lock:
+			pending = self._pending
+			self._pending = {}
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+		if pending:
+			self._write(pending)
+
+	def _updated(self, stored: M, update: M) -> M:
+		"""
+		Returns `stored` with the values of `fields` from `update`.
+		"""
+		assert self.fields is not None
+		for field in self.fields:
+			setattr(stored, field, getattr(update, field))
+		return stored
+
+	def _write(self, pending: dict[bytes, M]) -> None:
+		"""
+		Writes the given queued updates, by key, in one batch.
+		"""
+		with self.model.batch():
+			for key, instance in pending.items():
+				if self.fields is not None:
+					stored = self.model.get_by_primary_key(instance._primary_key())
+					if stored is None:
+						continue
+					instance = self._updated(stored, instance)
+				instance.patch()
@@ -10,6 +10,8 @@ from db.models.Report import Report
 from db.models.Penalty import Penalty
 from db.models.AuditLog import AuditLog
 
+from db.storage_executor import run_in_storage_executor
+
 from handlers.admin_reports import ReportDetails
 
 
@@ -40,9 +42,9 @@ class PenaltyBody(CamelizedModel):
 # ============================================================
 # AUTH HELPERS
 # ============================================================
-def require_admin(req: Request) -> AdminUserDetails:
+async def require_admin(req: Request) -> AdminUserDetails:
     """Return authenticated admin user details or throw 401."""
-    admin = AdminUser.from_session(req)
+    admin = await AdminUser.afrom_session(req)
     if admin is None:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
@@ -57,20 +59,20 @@ def require_admin(req: Request) -> AdminUserDetails:
 
 @admin_router.post("/session")
 async def admin_log_in(credentials: AdminCredentials, resp: Response):
-    admin = AdminUser.get_first_where(email=credentials.email)
+    admin = await AdminUser.aget_first_where(email=credentials.email)
     if admin is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail="Administrator account not found."
         )
 
-    if not admin.verify_password(credentials.password):
+    if not await admin.averify_password(credentials.password):
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
             detail="Password is incorrect."
         )
 
-    admin.create_session(resp)
+    await run_in_storage_executor(admin.create_session, resp)
 
 # ============================================================
 # DASHBOARD (test_admin_auth)
@@ -78,8 +80,8 @@ async def admin_log_in(credentials: AdminCredentials, resp: Response):
 # ============================================================
 @admin_router.get("/dashboard")
 async def get_dashboard(req: Request) -> list[Report]:
-    require_admin(req)
-    return list(Report.get_all())
+    await require_admin(req)
+    return [report async for report in Report.aget_all()]
 
 
 # ============================================================
@@ -88,8 +90,8 @@ async def get_dashboard(req: Request) -> list[Report]:
 # ============================================================
 @admin_router.get("/audit")
 async def get_audit(req: Request) -> list[AuditLog]:
-    require_admin(req)
-    return list(AuditLog.get_all())
+    await require_admin(req)
+    return [log async for log in AuditLog.aget_all()]
     
 # ============================================================
 # 1. USER SUBMITS A REPORT
@@ -98,22 +100,22 @@ async def get_audit(req: Request) -> list[AuditLog]:
 @admin_router.post("/report/{review_id}")
 @admin_router.post("/reports/{review_id}")
 async def report_review(review_id: str, body: ReportBody, req: Request) -> Report:
-    user = User.from_session(req)
+    user = await User.afrom_session(req)
     if user is None:
         raise HTTPException(HTTPStatus.UNAUTHORIZED, "Login required.")
 
-    review = UserReview.get_by_primary_key(review_id)
+    review = await UserReview.aget_by_primary_key(review_id)
     if review is None:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Review not found.")
 
     report = Report(
-        id=Report.new_id(),
+        id=await run_in_storage_executor(Report.new_id),
         review_id=review_id,
         user_id=user.id,
         reason=body.reason,
         text=body.text
     )
-    report.put()
+    await report.aput()
 
     return report
 
@@ -124,22 +126,22 @@ async def report_review(review_id: str, body: ReportBody, req: Request) -> Repor
 # ============================================================
 @admin_router.post("/reports")
 async def submit_report(data: ReportDetails, req: Request) -> Report:
-    user = User.from_session(req)
+    user = await User.afrom_session(req)
     if user is None:
         raise HTTPException(HTTPStatus.UNAUTHORIZED, "Login required.")
 
-    review = UserReview.get_by_primary_key(data.review_id)
+    review = await UserReview.aget_by_primary_key(data.review_id)
     if review is None:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Review not found.")
 
     report = Report(
-        id=Report.new_id(),
+        id=await run_in_storage_executor(Report.new_id),
         review_id=data.review_id,
         user_id=user.id,
         reason=data.reason,
         text=data.text
     )
-    report.put()
+    await report.aput()
 
     return report
 
@@ -149,8 +151,8 @@ async def submit_report(data: ReportDetails, req: Request) -> Report:
 # ============================================================
 @admin_router.get("/reports")
 async def get_reports(req: Request) -> list[Report]:
-    require_admin(req)
-    return list(Report.get_all())
+    await require_admin(req)
+    return [report async for report in Report.aget_all()]
 
 # ============================================================
 # 4. ADMIN – DELETE REPORT (IDEMPOTENT)
@@ -158,18 +160,18 @@ async def get_reports(req: Request) -> list[Report]:
 # ============================================================
 @admin_router.delete("/reports/{report_id}")
 async def delete_report(report_id: str, req: Request):
-    admin = require_admin(req)
+    admin = await require_admin(req)
 
-    report = Report.get_by_primary_key(report_id)
+    report = await Report.aget_by_primary_key(report_id)
     if report:
-        report.delete()
+        await report.adelete()
 
-        AuditLog(
-            id=AuditLog.new_id(),
+        await AuditLog(
+            id=await run_in_storage_executor(AuditLog.new_id),
             admin_id=admin.id,
             action="delete_report",
             target_id=report_id
-        ).put()
+        ).aput()
 
 
 # ============================================================
@@ -178,23 +180,23 @@ async def delete_report(report_id: str, req: Request):
 # ============================================================
 @admin_router.post("/penalty/{user_id}")
 async def apply_penalty(user_id: str, body: PenaltyBody, req: Request) -> Penalty:
-    admin = require_admin(req)
+    admin = await require_admin(req)
 
     penalty = Penalty(
-        id=Penalty.new_id(),
+        id=await run_in_storage_executor(Penalty.new_id),
         user_id=user_id,
         penalty_type=body.penalty_type,
         reason=body.reason,
         duration_days=body.duration_days
     )
-    penalty.put()
+    await penalty.aput()
 
-    AuditLog(
-        id=AuditLog.new_id(),
+    await AuditLog(
+        id=await run_in_storage_executor(AuditLog.new_id),
         admin_id=admin.id,
         action="apply_penalty",
         target_id=user_id
-    ).put()
+    ).aput()
 
     return penalty
 
@@ -204,15 +206,15 @@ async def apply_penalty(user_id: str, body: PenaltyBody, req: Request) -> Penalt
 # ============================================================
 @admin_router.delete("/reviews/{review_id}")
 async def admin_delete_review(review_id: str, req: Request):
-    admin = require_admin(req)
+    admin = await require_admin(req)
 
-    review = UserReview.get_by_primary_key(review_id)
+    review = await UserReview.aget_by_primary_key(review_id)
     if review:
-        review.delete()
-        AuditLog(
-            id=AuditLog.new_id(),
+        await review.adelete()
+        await AuditLog(
+            id=await run_in_storage_executor(AuditLog.new_id),
             admin_id=admin.id,
             action="delete_review",
             target_id=review_id,
-        ).put()
+        ).aput()
 
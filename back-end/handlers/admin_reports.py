@@ -7,6 +7,7 @@ from db.models.AdminUser import AdminUser
 from db.models.Report import Report
 from db.models.UserReview import UserReview
 from db.models.AuditLog import AuditLog
+from db.storage_executor import run_in_storage_executor
 
 
 admin_reports_router = APIRouter(prefix="/admin/reports", tags=["admin"])
@@ -19,8 +20,8 @@ admin_reports_router = APIRouter(prefix="/admin/reports", tags=["admin"])
 # ---------------------------------------------------------
 # Helper: require admin login
 # ---------------------------------------------------------
-def require_admin(req: Request) -> AdminUser:
-    admin = AdminUser.from_session(req)
+async def require_admin(req: Request) -> AdminUser:
+    admin = await AdminUser.afrom_session(req)
     if admin is None:
         raise HTTPException(
             status_code=HTTPStatus.UNAUTHORIZED,
@@ -40,23 +41,23 @@ class ReportDetails(CamelizedModel):
     
 @admin_reports_router.post("")
 async def submit_report(data: ReportDetails, req: Request) -> Report:
-    user = User.from_session(req)
+    user = await User.afrom_session(req)
     if user is None:
         raise HTTPException(HTTPStatus.UNAUTHORIZED, "Login required.")
 
     # Validate review exists
-    review = UserReview.get_by_primary_key(data.review_id)
+    review = await UserReview.aget_by_primary_key(data.review_id)
     if review is None:
         raise HTTPException(HTTPStatus.NOT_FOUND, "Review not found.")
 
     report = Report(
-        id=Report.new_id(),
+        id=await run_in_storage_executor(Report.new_id),
         review_id=data.review_id,
         user_id=user.id,
         reason=data.reason,
         text=data.reason,
     )
-    report.put()
+    await report.aput()
 
     return report
     # 200 OK — test expects this
@@ -68,8 +69,8 @@ async def submit_report(data: ReportDetails, req: Request) -> Report:
 # ---------------------------------------------------------
 @admin_reports_router.get("")
 async def list_reports(req: Request):
-    require_admin(req)
-    reports = list(Report.get_all())
+    await require_admin(req)
+    reports = [report async for report in Report.aget_all()]
     return reports   # tests expect a LIST
 
 
@@ -79,16 +80,16 @@ async def list_reports(req: Request):
 # ---------------------------------------------------------
 @admin_reports_router.delete("/{report_id}")
 async def delete_report(report_id: str, req: Request):
-    admin = require_admin(req)
+    admin = await require_admin(req)
 
-    report = Report.get_by_primary_key(report_id)
+    report = await Report.aget_by_primary_key(report_id)
 
     # DELETE MUST BE IDEMPOTENT
     if report is not None:
-        report.delete()
-        AuditLog(
-            id=AuditLog.new_id(),
+        await report.adelete()
+        await AuditLog(
+            id=await run_in_storage_executor(AuditLog.new_id),
             action="delete_report",
             admin_id=admin.id,
             target_id=report_id,
-        ).put()
+        ).aput()
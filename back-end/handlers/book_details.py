@@ -1,8 +1,10 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from db.camelized_model import CamelizedModel
 from typing import List
 
 from db.models.Book import Book
+from db.models.BookRating import BookRating
 from db.models.UserReview import UserReview
 
 book_router = APIRouter(prefix="/books", tags=["books"])
@@ -17,7 +19,7 @@ class BookDetails(CamelizedModel):
 async def list_books(limit: int = Query(default = 50, ge=1)) -> List[Book]:
 	"""Allow guests to browse available books."""
 	books: List[Book] = []
-	for book in Book.get_all():
+	async for book in Book.aget_all():
 		books.append(book)
 		if len(books) >= limit:
 			break
@@ -35,9 +37,10 @@ async def get_book_details(book_id: str, basic: bool = False) -> BookDetails | B
 	If you don't need the book reviews included, then specify the query
 	parameter `basic=True` to omit it and get a slightly faster response.
 	"""
-	book = Book.get_by_primary_key(book_id)
+	book = await Book.aget_by_primary_key(book_id)
 	if book is None:
-		book = Book.fetch_from_google_books(book_id)
+		# A network call, so it's kept off the storage executor
+		book = await asyncio.to_thread(Book.fetch_from_google_books, book_id)
 		if book is None:
 			raise HTTPException(status_code=404, detail="Book not found")
 
@@ -45,16 +48,14 @@ async def get_book_details(book_id: str, basic: bool = False) -> BookDetails | B
 		return book
 
 	# Collect reviews for this book
-	reviews = list(UserReview.get_where(book_id=book_id))
+	reviews = [review async for review in UserReview.aget_where(book_id=book_id)]
 
-	# Compute average rating if reviews exist
-	avg = 0
-	if reviews:
-		avg = sum(float(r.rating) for r in reviews) / len(reviews)
+	# The average and count are kept up to date as reviews are written
+	book_rating = await BookRating.aof(book_id)
 
 	return BookDetails(
 		book = book,
-		average_rating = avg,
-		review_count = len(reviews),
+		average_rating = book_rating.average_rating or 0,
+		review_count = book_rating.review_count,
 		reviews = reviews,
 	)
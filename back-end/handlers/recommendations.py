@@ -1,3 +1,4 @@
+import asyncio
 from typing import List
 from fastapi import APIRouter, HTTPException, Query
 from db.camelized_model import CamelizedModel
@@ -14,22 +15,25 @@ recommend_router = APIRouter(prefix="/recommendations", tags=["recommendations"]
 
 @recommend_router.get("/{user_id}", response_model=List[RecommendationItem])
 async def get_recommendations(user_id: str, n: int = Query(default = 10), k: int = Query(5)) -> List[RecommendationItem]:
-	recs = recommend_for_user(user_id, k_neighbors=k, n_recs=n)
+	# Ranking is CPU-bound and fetching from Google Books waits on the
+	# network, so both run outside the storage executor, which is kept for
+	# table reads and writes.
+	recs = await asyncio.to_thread(recommend_for_user, user_id, k_neighbors=k, n_recs=n)
 	if not recs:
 		raise HTTPException(status_code=404, detail="No recommendations available")
 
 	results: List[RecommendationItem] = []
 	for book_id, score in recs:
-		book = Book.get_by_primary_key(book_id)
+		book = await Book.aget_by_primary_key(book_id)
 		if book:
 			results.append(RecommendationItem(book=book, score=score))
 			continue
 
 		try:
-			enriched = Book.fetch_from_google_books(book_id)
+			enriched = await asyncio.to_thread(Book.fetch_from_google_books, book_id)
 			if enriched:
 				try:
-					enriched.put()
+					await enriched.aput()
 				except Exception:
 					pass
 				results.append(RecommendationItem(book=enriched, score=score))
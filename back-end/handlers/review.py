@@ -6,6 +6,7 @@ from db.camelized_model import CamelizedModel
 from db.models.UserReview import UserReview
 from db.models.User import User
 from db.models.Book import Book
+from db.storage_executor import run_in_storage_executor
 
 review_router = APIRouter(prefix = "/review", tags = ["reviews"])
 
@@ -29,7 +30,7 @@ class ReviewDetails(CamelizedModel):
 #
 @review_router.get("/{review_id}")
 async def get_review(review_id: str) -> UserReview:
-	review = UserReview.get_by_primary_key(review_id)
+	review = await UserReview.aget_by_primary_key(review_id)
 	if review == None:
 		raise HTTPException(
 			status_code = HTTPStatus.NOT_FOUND,
@@ -51,7 +52,7 @@ async def get_reviews(
 ) -> list[UserReview]:
 	
 	if author_display_name != None:
-		author = User.get_first_where(display_name = author_display_name)
+		author = await User.aget_first_where(display_name = author_display_name)
 		if author == None:
 			raise HTTPException(
 				status_code = 404,
@@ -60,7 +61,7 @@ async def get_reviews(
 		author_id = author.id
 
 	if book_id != None:
-		book = Book.get_by_primary_key(book_id)
+		book = await Book.aget_by_primary_key(book_id)
 		if book == None:
 			raise HTTPException(
 				status_code = 404,
@@ -68,19 +69,19 @@ async def get_reviews(
 			)
 
 	if author_id != None and book_id != None:
-		reviews = UserReview.get_where(book_id = book_id, user_id = author_id)
+		reviews = UserReview.aget_where(book_id = book_id, user_id = author_id)
 	elif author_id != None:
-		reviews = UserReview.get_where(user_id = author_id)
+		reviews = UserReview.aget_where(user_id = author_id)
 	elif book_id != None:
-		reviews = UserReview.get_where(book_id = book_id)
+		reviews = UserReview.aget_where(book_id = book_id)
 	else:
-		reviews = UserReview.get_all()
+		reviews = UserReview.aget_all()
 
 	results: list[UserReview] = []
 	result_count = 0
 
 	if require_text:
-		for review in reviews:
+		async for review in reviews:
 			if review.text == "":
 				continue
 
@@ -90,7 +91,7 @@ async def get_reviews(
 			if result_count >= limit:
 				break
 	else:
-		for review in reviews:
+		async for review in reviews:
 			results.append(review)
 			result_count += 1
 
@@ -109,14 +110,14 @@ async def post_review(
 	req: Request, 
 	resp: Response
 ) -> UserReview:
-	user = User.from_session(req)
+	user = await User.afrom_session(req)
 	if user == None:
 		raise HTTPException(
 			status_code = HTTPStatus.UNAUTHORIZED,
 			detail = "You must be logged in to post a review."
 		)
 	
-	book = Book.get_by_primary_key(book_id)
+	book = await Book.aget_by_primary_key(book_id)
 	if book == None:
 		raise HTTPException(
 			status_code = 404,
@@ -133,8 +134,8 @@ async def post_review(
 		rating = review.rating,
 		text = review.text
 	)
-	new_review.put()
-	user.record_activity()
+	await new_review.aput()
+	await run_in_storage_executor(user.record_activity)
 
 	resp.status_code = HTTPStatus.CREATED
 
@@ -145,23 +146,23 @@ async def post_review(
 #
 @review_router.delete("/{book_id}")
 async def delete_review(book_id: str, req: Request):
-	user = User.from_session(req)
+	user = await User.afrom_session(req)
 	if user == None:
 		raise HTTPException(
 			status_code = HTTPStatus.UNAUTHORIZED,
 			detail = "You must be logged in to delete a review."
 		)
 	
-	book = Book.get_by_primary_key(book_id)
+	book = await Book.aget_by_primary_key(book_id)
 	if book == None:
 		raise HTTPException(
 			status_code = 404,
 			detail = f"No book with ID {book_id} was found."
 		)
 	
-	review = UserReview.get_first_where(
+	review = await UserReview.aget_first_where(
 		user_id = user.id,
 		book_id = book.id
 	)
 	if review != None:
-		review.delete()
+		await review.adelete()
@@ -48,11 +48,13 @@ def get_saved_books(req: Request) -> list[Book]:
 	user = _require_user(req, "view saved")
 
 	saved_books: list[Book] = []
+	stale_records: list[SavedBook] = []
 	for record in SavedBook.get_where(user_id=user.id):
 		book = Book.get_by_primary_key(record.book_id)
 		if book is None:
-			record.delete()
+			stale_records.append(record)
 		else:
 			saved_books.append(book)
+	SavedBook.delete_many(stale_records)
 
 	return saved_books
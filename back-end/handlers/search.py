@@ -1,32 +1,16 @@
-from typing import Generator, List
+from typing import List
 from fastapi import APIRouter, HTTPException, Query
 
 from db.models.Book import Book
+from db.storage_executor import run_in_storage_executor
+from db.suggest import suggest_title_words
 
 search_router = APIRouter(prefix="/search", tags=["search"])
 
 DEFAULT_LIMIT = 50
 DEFAULT_PAGE_LIMIT = 20
-
-def _matches(book: Book, author: str | None, year: int | None) -> bool:
-	if author is not None:
-		if not book.authors or author not in book.authors:
-			return False
-	if year is not None:
-		book_year = getattr(book, "year", None)
-		if book_year != year:
-			return False
-	return True
-
-def _matches_rating(book: Book, rating_min: float | None, rating_max: float | None) -> bool:
-	if rating_min is not None:
-		if book.average_rating is None or book.average_rating < rating_min:
-			return False
-	if rating_max is not None:
-		if book.average_rating is None or book.average_rating > rating_max:
-			return False
-	return True
-
+FUZZY_MIN_SIMILARITY = 0.4
+DEFAULT_SUGGEST_LIMIT = 10
 
 @search_router.get("/", responses = {
         404: {
@@ -40,34 +24,56 @@ def _matches_rating(book: Book, rating_min: float | None, rating_max: float | No
     })
 async def search_books(
 	author: str | None = Query(None),
+	category: str | None = Query(None),
 	year: int | None = Query(None),
 	rating_min: float | None = Query(None),
 	rating_max: float | None = Query(None),
 	limit: int = Query(DEFAULT_LIMIT),
 ) -> List[Book]:
-	results: Generator[Book, None, None] = Book.get_all()
-
-	final_results: List[Book] = []
-	for book in results:
-		if not _matches(book, author, year):
-			continue
-		if not _matches_rating(book, rating_min, rating_max):
-			continue
+	"""
+	Finds the books by the given author, in the given category, published
+	in the given year, and with an average rating between `rating_min` and
+	`rating_max` (inclusive), in the order they're stored in. Authors and
+	categories are matched ignoring case. Any of the filters can be left
+	out.
 
-		final_results.append(book)
-		if len(final_results) >= limit:
-			break
+	The filters are looked up in in-memory indexes (see `Book.get_filtered`),
+	so only the books that are returned are read.
+	"""
+	final_results = await Book.aget_filtered(
+		author = author,
+		category = category,
+		year = year,
+		rating_min = rating_min,
+		rating_max = rating_max,
+		limit = max(limit, 0)
+	)
 
 	if not final_results:
 		raise HTTPException(status_code=404, detail="No matching books found.")
 
 	return final_results
 
+@search_router.get("/suggest")
+async def suggest(
+	prefix: str = Query(""),
+	limit: int = Query(DEFAULT_SUGGEST_LIMIT)
+) -> list[str]:
+	"""
+	Suggests words to complete the last word of `prefix` with, as the user
+	types a title to search for: the words of book titles that start with
+	it, those of the most reviewed books first. For example,
+	`GET /search/suggest?prefix=the%20frank` might return
+	`["frankenstein", "frank", "franklin"]`.
+	"""
+	return await run_in_storage_executor(suggest_title_words, prefix, max(limit, 0))
+
 @search_router.get("/book/{book_title}")
 async def search_book_title(
 	book_title: str, 
 	limit: int = DEFAULT_LIMIT, 
-	skip: int = 0
+	skip: int = 0,
+	fuzzy: bool = False
 ) -> list[Book]:
 	"""
 	Searches the book records for one whos title roughly matches the 
@@ -75,18 +81,23 @@ async def search_book_title(
 	might return books with the titles "Frankenstein", "Frankenstein;
 	or The Modern Prometheus", and so on.
 
+	The best matches come first: titles that contain the rarer words of
+	`book_title`, as whole words, and few other words.
+
+	With `fuzzy=true`, words of `book_title` also match similar words, so
+	that e.g. `GET /search/book/frankenstien?fuzzy=true` still finds
+	"Frankenstein".
+
 	If no results are found, this endpoint still returns an empty list
 	with a status code of 200 (instead of 404).
 	"""
-	books: list[Book] = []
-	skipped = 0
-
-	for book in Book.get_where_like(title = book_title):
-		if skipped < skip:
-			skipped += 1
-			continue
-		if len(books) >= limit:
-			break
-		books.append(book)
-		
-	return books
+	return [
+		book async for book in
+		Book.aget_where_like(
+			title = book_title,
+			skip = max(skip, 0),
+			limit = max(limit, 0),
+			ranked = True,
+			min_similarity = FUZZY_MIN_SIMILARITY if fuzzy else None
+		)
+	]
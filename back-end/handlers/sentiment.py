@@ -6,6 +6,7 @@ from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from db.models.Book import Book
 from db.models.UserReview import UserReview
 from db.models.SentimentCache import SentimentCache
+from db.storage_executor import run_in_storage_executor
 
 import os
 
@@ -35,21 +36,21 @@ def _analyze_sentiment(text: str) -> dict[str, object]:
 
 @sentiment_router.get("/{book_id}")
 async def get_sentiment(book_id: str) -> SentimentCache:
-	book = Book.get_by_primary_key(book_id)
+	book = await Book.aget_by_primary_key(book_id)
 	if book is None:
 		raise HTTPException(
 			status_code=404,
 			detail=f"No book with ID {book_id} was found.",
 		)
 
-	cached = SentimentCache.get_cached(book_id)
+	cached = await run_in_storage_executor(SentimentCache.get_cached, book_id)
 	if cached is not None:
 		return cached
 
 	reviews = [
-		review.text.strip()
-		for review in UserReview.get_where(book_id=book_id)
-		if review.text.strip() != ""
+		text.strip()
+		async for (text,) in UserReview.aget_where(book_id=book_id, fields=["text"])
+		if text.strip() != ""
 	]
 
 	if len(reviews) == 0:
@@ -61,7 +62,8 @@ async def get_sentiment(book_id: str) -> SentimentCache:
 	aggregate_reviews = " ".join(reviews)
 	sentiment = _analyze_sentiment(aggregate_reviews)
 
-	cache_entry = SentimentCache.upsert(
+	cache_entry = await run_in_storage_executor(
+		SentimentCache.upsert,
 		book_id=book_id,
 		sentiment=sentiment["sentiment"],  # type: ignore
 		score=sentiment["score"],  # type: ignore
@@ -5,13 +5,14 @@ from db.models.Penalty import Penalty
 from db.models.Report import Report
 from db.models.User import User, UserSession
 from db.models.UserReview import UserReview
+from db.models.BookRating import BookRating
 from db.models.AdminUser import AdminUser, AdminSession
 
 
 @pytest.fixture(autouse=True)
 def reset_persistent_tables():
     # Keep test state isolated by clearing mutable tables before each test.
-    tables = (AuditLog, Penalty, Report, AdminSession, AdminUser, UserSession, User, UserReview)
+    tables = (AuditLog, Penalty, Report, AdminSession, AdminUser, UserSession, User, UserReview, BookRating)
     original_data_dir = tables[0].data_dir
     for model in tables:
         model.data_dir = "data/testing-data"
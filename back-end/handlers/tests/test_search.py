@@ -4,6 +4,7 @@ from fastapi.testclient import TestClient
 
 from server import app
 from db.models.Book import Book
+from db.models.UserReview import UserReview
 
 def with_temp_books(func: Callable[[TestClient], None]):
     def wrapper():
@@ -52,3 +53,72 @@ def test_search_returns_404_when_no_match(client: TestClient):
 
     resp = client.get("/search?author=Missing")
     assert resp.status_code == 404
+
+
+@with_temp_books
+def test_search_book_title_ranks_best_match_first(client: TestClient):
+    Book(id="t1", title="Frankenstein; or, The Modern Prometheus", authors=["Mary Shelley"]).put()
+    Book(id="t2", title="Young Frankenstein", authors=["Mel Brooks"]).put()
+    Book(id="t3", title="Frankenstein", authors=["Mary Shelley"]).put()
+    Book(id="t4", title="Dracula", authors=["Bram Stoker"]).put()
+
+    resp = client.get("/search/book/frankenstein")
+    assert resp.status_code == 200
+    assert [book["id"] for book in resp.json()] == ["t3", "t2", "t1"]
+
+    resp = client.get("/search/book/frankenstein?skip=1&limit=1")
+    assert [book["id"] for book in resp.json()] == ["t2"]
+
+
+@with_temp_books
+def test_search_book_title_fuzzy(client: TestClient):
+    Book(id="t1", title="Frankenstein", authors=["Mary Shelley"]).put()
+    Book(id="t2", title="Dracula", authors=["Bram Stoker"]).put()
+
+    assert client.get("/search/book/frankenstien").json() == []
+    resp = client.get("/search/book/frankenstien?fuzzy=true")
+    assert [book["id"] for book in resp.json()] == ["t1"]
+
+
+@with_temp_books
+def test_search_suggest_completes_last_word(client: TestClient):
+    Book(id="p1", title="Frankenstein", authors=["Mary Shelley"]).put()
+    Book(id="p2", title="Franny and Zooey", authors=["J. D. Salinger"]).put()
+    Book(id="p3", title="The Fran Lebowitz Reader", authors=["Fran Lebowitz"]).put()
+    UserReview(id="pr1", user_id="u1", book_id="p2", rating=9).put()
+
+    resp = client.get("/search/suggest?prefix=the%20fran")
+    assert resp.status_code == 200
+    assert resp.json() == ["franny", "fran", "frankenstein"]
+
+    resp = client.get("/search/suggest?prefix=FRANK&limit=1")
+    assert resp.json() == ["frankenstein"]
+
+    resp = client.get("/search/suggest?prefix=zzz")
+    assert resp.status_code == 200
+    assert resp.json() == []
+
+
+@with_temp_books
+def test_search_combines_author_category_and_year(client: TestClient):
+    Book(id="f1", title="Emma", authors=["Jane Austen"], categories=["Fiction"], year=1815, average_rating=8).put()
+    Book(id="f2", title="Persuasion", authors=["Jane Austen"], categories=["Fiction"], year=1817, average_rating=9).put()
+    Book(id="f3", title="Letters", authors=["Jane  Austen", "Cassandra Austen"], categories=["Letters"], year=1817).put()
+    Book(id="f4", title="Frankenstein", authors=["Mary Shelley"], categories=["Fiction"], year=1818, average_rating=7).put()
+
+    resp = client.get("/search?author=jane%20austen")
+    assert [book["id"] for book in resp.json()] == ["f1", "f2", "f3"]
+
+    resp = client.get("/search?author=Jane%20Austen&category=fiction&year=1817")
+    assert [book["id"] for book in resp.json()] == ["f2"]
+
+    resp = client.get("/search?category=Fiction&rating_max=8&limit=1")
+    assert [book["id"] for book in resp.json()] == ["f1"]
+
+    # Written books are found (and no longer found) straight away.
+    Book(id="f1", title="Emma", authors=["Jane Austen"], categories=["Classics"], year=1815, average_rating=8).put()
+    Book(id="f4", title="Frankenstein", authors=["Mary Shelley"]).delete()
+    resp = client.get("/search?category=fiction")
+    assert [book["id"] for book in resp.json()] == ["f2"]
+    resp = client.get("/search?year=1818")
+    assert resp.status_code == 404
@@ -1,7 +1,9 @@
 from http import HTTPStatus
 
 from handlers.user import UserDetails, RegistrationDetails, UserCredentials
-from db.models.User import User, UserSession, TOKEN_NAME
+from time import time_ns
+
+from db.models.User import User, UserSession, TOKEN_NAME, TOKEN_DURATION_NS, session_renewals
 from fastapi.testclient import TestClient
 from server import app
 
@@ -113,3 +115,32 @@ def test_user_recognition():
 
 	new_user.delete()
 	new_session.delete()
+
+def test_session_renewal_is_lazy():
+	new_client = TestClient(app)
+	new_client.post(
+		"/user",
+		content = RegistrationDetails(
+			display_name = "jimi_hendrix",
+			email = "jhendrix42@gmail.com",
+			password = "stratocaster123"
+		).model_dump_json()
+	)
+	session = UserSession.get_first_where()
+	assert session != None
+
+	# A fresh session isn't written again by authenticated requests.
+	version = UserSession.table_version()
+	for _ in range(3):
+		assert new_client.get("/user/me").status_code == 200
+	assert UserSession.table_version() == version
+
+	# Once most of it has passed, it is renewed in the background.
+	session.expiration_timestamp = time_ns() + TOKEN_DURATION_NS // 2
+	session.put()
+	assert new_client.get("/user/me").status_code == 200
+	renewed = session_renewals.get(session.session_id)
+	assert renewed != None and renewed.expiration_timestamp > session.expiration_timestamp
+	session_renewals.flush()
+	assert UserSession.get_by_primary_key(session.session_id).expiration_timestamp == \
+		renewed.expiration_timestamp # type: ignore
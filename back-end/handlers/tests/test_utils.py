@@ -3,6 +3,7 @@ from fastapi.testclient import TestClient
 
 from db.models.Book import Book
 from db.models.UserReview import UserReview
+from db.models.BookRating import BookRating
 from server import app
 
 @contextmanager
@@ -13,6 +14,8 @@ def client_with_temp_app_state(include_reviews: bool = False):
 	Book._drop_table()
 	UserReview.data_dir = "./data/testing-data"
 	UserReview._drop_table()
+	BookRating.data_dir = "./data/testing-data"
+	BookRating._drop_table()
 	try:
 		yield client
 	finally:
@@ -20,4 +23,6 @@ def client_with_temp_app_state(include_reviews: bool = False):
 		Book.data_dir = original_book_dir
 		UserReview._drop_table()
 		UserReview.data_dir = original_book_dir
+		BookRating._drop_table()
+		BookRating.data_dir = original_book_dir
 
@@ -9,6 +9,7 @@ from db.models.SavedBook import SavedBook
 from db.models.User import User, UserSession, TOKEN_NAME
 from db.models.UserReview import UserReview
 from db.models.Book import Book
+from db.storage_executor import run_in_storage_executor
 
 user_router = APIRouter(prefix = "/user", tags = ["users"])
 
@@ -69,12 +70,12 @@ class UserStreak(CamelizedModel):
 async def register_user(user_details: RegistrationDetails, resp: Response) \
 	-> None:
 	# Validate the data:
-	if User.get_first_where(email = user_details.email) != None:
+	if await User.aget_first_where(email = user_details.email) != None:
 		raise HTTPException(
 			status_code = HTTPStatus.CONFLICT, 
 			detail = "That email is already registered."
 		)
-	if User.get_first_where(display_name = user_details.display_name) != None:
+	if await User.aget_first_where(display_name = user_details.display_name) != None:
 		raise HTTPException(
 			status_code = HTTPStatus.CONFLICT,
 			detail = "That display name is taken."
@@ -82,11 +83,11 @@ async def register_user(user_details: RegistrationDetails, resp: Response) \
 	
 	# Generate a unique ID.
 	unique_id = str(uuid4())
-	while User.get_by_primary_key(unique_id) != None:
+	while await User.aget_by_primary_key(unique_id) != None:
 		unique_id = str(uuid4())
 	
 	# Hash the password
-	hashed_password = User.hash_password(user_details.password)
+	hashed_password = await User.ahash_password(user_details.password)
 
 	# Store the user record in the database
 	new_user = User(
@@ -95,7 +96,7 @@ async def register_user(user_details: RegistrationDetails, resp: Response) \
 		email = user_details.email,
 		password = hashed_password
 	)
-	success = new_user.post()
+	success = await new_user.apost()
 
 	# Check for an unexpected error
 	if not success:
@@ -105,7 +106,7 @@ async def register_user(user_details: RegistrationDetails, resp: Response) \
 		)
 	
 	# Create a session for the new user
-	new_user.create_session(resp)
+	await run_in_storage_executor(new_user.create_session, resp)
 	resp.status_code = HTTPStatus.CREATED
 
 # 
@@ -117,7 +118,7 @@ async def update_account_details(req: Request, new_details: UserDetailsUpdate):
 	Updates mutable properties of the currently logged-in user, then returns 
 	their complete details.
 	"""
-	user = User.from_session(req)
+	user = await User.afrom_session(req)
 	if user == None:
 		raise HTTPException(
 			status_code = HTTPStatus.UNAUTHORIZED, 
@@ -125,7 +126,7 @@ async def update_account_details(req: Request, new_details: UserDetailsUpdate):
 		)
 	
 	if new_details.email != None and new_details.email != user.email:
-		conflicting_user = User.get_first_where(email = new_details.email)
+		conflicting_user = await User.aget_first_where(email = new_details.email)
 		if conflicting_user != None:
 			raise HTTPException(
 				HTTPStatus.CONFLICT,
@@ -134,7 +135,7 @@ async def update_account_details(req: Request, new_details: UserDetailsUpdate):
 		user.email = new_details.email
 
 	if new_details.display_name != None and new_details.display_name != user.display_name:
-		conflicting_user = User.get_first_where(display_name = new_details.display_name)
+		conflicting_user = await User.aget_first_where(display_name = new_details.display_name)
 		if conflicting_user != None:
 			raise HTTPException(
 				HTTPStatus.CONFLICT,
@@ -146,16 +147,16 @@ async def update_account_details(req: Request, new_details: UserDetailsUpdate):
 		user.profile_picture_path = new_details.profile_picture_path
 
 	if new_details.password != None:
-		user.password = User.hash_password(new_details.password)
+		user.password = await User.ahash_password(new_details.password)
 
-	user.put()
+	await user.aput()
 
 #
 # Gets the data about the currently logged in user.
 #
 @user_router.get("/me")
 async def account_info(req: Request) -> UserDetails:
-	user = User.from_session(req)
+	user = await User.afrom_session(req)
 	if user == None:
 		raise HTTPException(
 			status_code = HTTPStatus.NOT_FOUND, 
@@ -163,16 +164,18 @@ async def account_info(req: Request) -> UserDetails:
 		)
 	
 	user_reviews: list[UserReview] = []
-	for review in UserReview.get_where(user_id = user.id):
+	async for review in UserReview.aget_where(user_id = user.id):
 		user_reviews.append(review)
 
 	saved_books: list[Book] = []
-	for saved_book in SavedBook.get_where(user_id = user.id):
-		book = Book.get_by_primary_key(saved_book.book_id)
+	stale_saved_books: list[SavedBook] = []
+	async for saved_book in SavedBook.aget_where(user_id = user.id):
+		book = await Book.aget_by_primary_key(saved_book.book_id)
 		if book == None:
-			saved_book.delete()
+			stale_saved_books.append(saved_book)
 			continue
 		saved_books.append(book)
+	await SavedBook.adelete_many(stale_saved_books)
 	
 	return UserDetails(
 		id = user.id,
@@ -193,7 +196,7 @@ async def public_account_info(user_id: str, basic: bool = False) -> UserProfile
 	a little faster, you can set the `basic=true` query string parameter to
 	omit the `reviews` from the object.
 	"""
-	user = User.get_by_primary_key(user_id)
+	user = await User.aget_by_primary_key(user_id)
 	if user == None:
 		raise HTTPException(
 			status_code = HTTPStatus.NOT_FOUND,
@@ -208,7 +211,7 @@ async def public_account_info(user_id: str, basic: bool = False) -> UserProfile
 		)
 	
 	reviews: list[UserReview] = []
-	for review in UserReview.get_where(user_id = user.id):
+	async for review in UserReview.aget_where(user_id = user.id):
 		reviews.append(review)
 	
 	return UserProfile(
@@ -220,7 +223,7 @@ async def public_account_info(user_id: str, basic: bool = False) -> UserProfile
 
 @user_router.get("/{user_id}/streak", response_model=UserStreak)
 async def get_user_streak(user_id: str) -> UserStreak:
-	user = User.get_by_primary_key(user_id)
+	user = await User.aget_by_primary_key(user_id)
 	if user is None:
 		raise HTTPException(
 			status_code = HTTPStatus.NOT_FOUND,
@@ -234,10 +237,10 @@ async def get_user_streak(user_id: str) -> UserStreak:
 #
 @user_router.delete("/session")
 async def log_out(req: Request, resp: Response) -> None:
-	session = UserSession.from_request(req)
+	session = await UserSession.afrom_request(req)
 	if session == None:
 		return
-	session.delete()
+	await session.adelete()
 	resp.delete_cookie(TOKEN_NAME)
 
 #
@@ -245,7 +248,7 @@ async def log_out(req: Request, resp: Response) -> None:
 #
 @user_router.post("/session")
 async def log_in(credentials: UserCredentials, resp: Response):
-	user = User.get_first_where(email = credentials.email)
+	user = await User.aget_first_where(email = credentials.email)
 
 	if user == None:
 		raise HTTPException(
@@ -253,10 +256,10 @@ async def log_in(credentials: UserCredentials, resp: Response):
 			detail = "That email is not recognized."
 		)
 
-	if not user.verify_password(credentials.password):
+	if not await user.averify_password(credentials.password):
 		raise HTTPException(
 			status_code = HTTPStatus.UNAUTHORIZED,
 			detail = "Password is incorrect."
 		)
 
-	user.create_session(resp)
+	await run_in_storage_executor(user.create_session, resp)
@@ -0,0 +1,83 @@
+"""
+Benchmark comparing a single `UserReview` table file with the same records
+split into partitions (see `PersistedModel.partitions`), for scans that
+can't use an index and for writes. Set `PARTITION_SCAN_POOL=thread` to fan
+the scans out on threads instead of processes.
+
+The tables are written to temporary directories, not the real data
+directory.
+
+Usage:
+    python -m scripts.bench_partitions [ratings] [partitions]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from db.models.UserReview import UserReview
+from db.persisted_model import _tables
+from db.storage_executor import scan_executor, scan_workers
+
+CHUNK_SIZE = 100_000
+TEXTS = ["Loved it.", "Not for me.", "A slow start, but worth it.", "Couldn't put it down!"]
+
+
+def review_row(i: int) -> bytes:
+    return f"review{i},user{i * 31 % 100_000},book{i * 17 % 270_000},{i % 11},{TEXTS[i % 4]}".encode()
+
+
+def timed(work: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    work()
+    return time.perf_counter() - start
+
+
+def run(ratings: int, partitions: int) -> dict[str, float]:
+    UserReview.partitions = partitions
+    UserReview.data_dir = tempfile.mkdtemp()
+    _tables.clear()
+    table = UserReview._table()
+    for chunk_start in range(0, ratings, CHUNK_SIZE):
+        table.write_many({
+            f"review{i}".encode(): review_row(i)
+            for i in range(chunk_start, min(ratings, chunk_start + CHUNK_SIZE))
+        })
+
+    results = {
+        "get_where(rating)": timed(lambda: sum(1 for _ in UserReview.get_where(rating = 10))),
+        "get_where(text)": timed(lambda: sum(1 for _ in UserReview.get_where(text = "Loved it."))),
+        "get_where_like(text)": timed(lambda: sum(1 for _ in UserReview.get_where_like(text = "worth"))),
+        "get_all(rating)": timed(lambda: sum(1 for _ in UserReview.get_all(fields = ["rating"]))),
+    }
+    # Compaction rewrites a whole table file, and holds up writes to it
+    # while it does; with partitions, each one is rewritten separately.
+    table.write_many({f"review{i}".encode(): None for i in range(0, ratings, 10)})
+    rewrites = [
+        timed(partition.compact) for partition in getattr(table, "partitions", [table])
+    ]
+    results["compact (longest rewrite)"] = max(rewrites)
+    UserReview._drop_table()
+    return results
+
+
+def main() -> None:
+    ratings = int(sys.argv[1]) if len(sys.argv) > 1 else 1_149_780
+    partitions = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    if scan_workers() > 1:
+        # Start the scan pool's workers before timing anything.
+        scan_executor().submit(int).result()
+
+    single = run(ratings, 1)
+    partitioned = run(ratings, partitions)
+    pool = os.getenv("PARTITION_SCAN_POOL") or "process"
+    print(f"UserReview ({ratings:,} ratings, {partitions} partitions, {scan_workers()} {pool} workers):")
+    print(f"  {'':24} {'1 file':>10} {'partitioned':>12}")
+    for name in single:
+        print(f"  {name:24} {single[name]:>9.3f}s {partitioned[name]:>11.3f}s")
+
+
+if __name__ == "__main__":
+    main()
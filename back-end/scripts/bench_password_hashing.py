@@ -0,0 +1,90 @@
+"""
+Benchmark of how a storm of concurrent logins affects the latency of an
+unrelated endpoint (`GET /user/{id}/streak`), with argon2 running inline on
+the event loop (as the login handlers used to) and on the password executor
+(see `db.password_executor`).
+
+Requests go through the app in this process, and the tables are written to
+a temporary directory, not the real data directory.
+
+Usage:
+    python -m scripts.bench_password_hashing [logins] [probes]
+"""
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from db.models.User import User, UserSession
+from server import app
+
+
+async def inline_verify(self: User, raw_password: str) -> bool:
+    return self.verify_password(raw_password)
+
+
+async def run(logins: int, probes: int, user: User) -> dict[str, float]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        credentials = {"email": user.email, "password": "stratocaster123"}
+
+        async def log_in() -> int:
+            resp = await client.post("/user/session", json=credentials)
+            return resp.status_code
+
+        async def probe() -> list[float]:
+            latencies = []
+            for _ in range(probes):
+                start = time.perf_counter()
+                await client.get(f"/user/{user.id}/streak")
+                latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+            return latencies
+
+        start = time.perf_counter()
+        statuses, latencies = await asyncio.gather(
+            asyncio.gather(*(log_in() for _ in range(logins))),
+            probe(),
+        )
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "probe p50 (ms)": statistics.median(latencies) * 1000,
+        "probe p99 (ms)": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "probe max (ms)": latencies[-1] * 1000,
+        "logins ok": sum(status == 200 for status in statuses),
+        "logins busy (503)": sum(status == 503 for status in statuses),
+        "total (s)": elapsed,
+    }
+
+
+def main() -> None:
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    probes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    User.data_dir = UserSession.data_dir = tempfile.mkdtemp()
+    user = User(
+        id="bench-user",
+        display_name="jimi_hendrix",
+        email="jhendrix42@gmail.com",
+        password=User.hash_password("stratocaster123"),
+    )
+    user.put()
+
+    offloaded_verify = User.averify_password
+    User.averify_password = inline_verify  # type: ignore
+    inline = asyncio.run(run(logins, probes, user))
+    User.averify_password = offloaded_verify  # type: ignore
+    offloaded = asyncio.run(run(logins, probes, user))
+
+    print(f"{logins} concurrent logins, {probes} probes of an unrelated endpoint:")
+    print(f"  {'':20} {'inline':>10} {'executor':>10}")
+    for name in inline:
+        print(f"  {name:20} {inline[name]:>10,.1f} {offloaded[name]:>10,.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Microbenchmark for decoding stored rows, comparing the original
+`_from_csv_row` (kept below as `legacy_from_csv_row`) with the compiled
+`RowCodec`, both validated and trusted.
+
+Usage:
+    python -m scripts.bench_row_codec [rows]
+"""
+
+import ast
+import json
+import sys
+import time
+from typing import Any, Callable, Union, get_args, get_origin
+from types import UnionType
+
+from db.encode_str import decode_str
+from db.models.Book import Book
+from db.models.UserReview import UserReview
+from db.row_codec import RowCodec
+
+
+def legacy_from_csv_row(cls: Any, csv_row: str) -> Any:
+    if csv_row.endswith("\n"):
+        csv_row = csv_row[:-1]
+    fields = {}
+    values = csv_row.split(",")
+    keys = cls.model_fields.keys()
+    for key, value in zip(keys, values):
+        field_info = cls.model_fields[key]
+        annotation = field_info.annotation
+        origin = get_origin(annotation)
+        decoded_value = decode_str(value)
+
+        args = get_args(annotation)
+        allows_none = any(arg is type(None) for arg in args)
+
+        if origin in (UnionType, Union):
+            non_none_args = [arg for arg in args if arg is not type(None)]
+            if len(non_none_args) == 1:
+                annotation = non_none_args[0]
+                origin = get_origin(annotation)
+            else:
+                origin = None
+
+        if decoded_value == "None" and allows_none:
+            fields[key] = None
+            continue
+
+        if origin in (list, dict, tuple, set):
+            try:
+                json_value = json.loads(decoded_value)
+            except json.JSONDecodeError:
+                json_value = decoded_value
+
+            if origin is tuple:
+                fields[key] = tuple(json_value) if isinstance(json_value, list) else json_value
+            elif origin is set:
+                fields[key] = set(json_value) if isinstance(json_value, list) else json_value
+            else:
+                fields[key] = json_value
+        else:
+            fields[key] = decoded_value
+    values = csv_row.removesuffix("\n").split(",")
+    keys = cls.model_fields.keys()
+    for key, value in zip(keys, values):
+        decoded = decode_str(value)
+        ann = cls.model_fields[key].annotation
+        if ann is str:
+            fields[key] = decoded
+        else:
+            if decoded == "None" or decoded == "":
+                fields[key] = None
+            else:
+                try:
+                    val = ast.literal_eval(decoded)
+                except Exception:
+                    try:
+                        val = float(decoded)
+                        if ann is int:
+                            val = int(val)
+                    except Exception:
+                        val = decoded
+                fields[key] = val
+    return cls.model_validate(fields)
+
+
+def sample_rows(count: int) -> dict[str, list[str]]:
+    books = [
+        Book(
+            id = f"book{i}",
+            title = f"Title, number {i}",
+            authors = [f"Author {i % 97}"],
+            categories = ["Fiction"] if i % 2 else None,
+            description = "A description of the book." if i % 3 else None,
+            average_rating = (i % 10) / 2,
+        )._to_csv_row()
+        for i in range(count)
+    ]
+    reviews = [
+        UserReview(
+            id = f"review{i}",
+            user_id = f"user{i % 1000}",
+            book_id = f"book{i % 5000}",
+            rating = i % 11,
+            text = "Loved it, mostly.",
+        )._to_csv_row()
+        for i in range(count)
+    ]
+    return {"Book": books, "UserReview": reviews}
+
+
+def rows_per_second(decode: Callable[[str], Any], rows: list[str]) -> float:
+    start = time.perf_counter()
+    for row in rows:
+        decode(row)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    models = {"Book": Book, "UserReview": UserReview}
+    for name, rows in sample_rows(count).items():
+        model = models[name]
+        codec = RowCodec.for_model(model)
+        legacy = rows_per_second(lambda row: legacy_from_csv_row(model, row), rows)
+        validated = rows_per_second(codec.validate, rows)
+        trusted = rows_per_second(codec.construct, rows)
+        print(f"{name} ({count} rows):")
+        print(f"  legacy _from_csv_row: {legacy:>12,.0f} rows/s")
+        print(f"  RowCodec.validate:    {validated:>12,.0f} rows/s ({validated / legacy:.1f}x)")
+        print(f"  RowCodec.construct:   {trusted:>12,.0f} rows/s ({trusted / legacy:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Microbenchmark for unindexed table scans, comparing reading every line and
+splitting it into columns (kept below as `line_scan`) with the memory-mapped
+scan that `CsvTable` uses, which compares the columns in place.
+
+The table is written to a temporary directory, not the real data directory.
+
+Usage:
+    python -m scripts.bench_scan [rows]
+"""
+
+import sys
+import tempfile
+import time
+from typing import Callable, Iterator
+
+from db.csv_table import CsvTable, _row_columns
+from db.models.UserReview import UserReview
+
+
+def line_scan(table: CsvTable, predicates: dict[int, bytes]) -> Iterator[bytes]:
+    with table._pinned() as table_file:
+        end = table_file.size
+    for _, row in table_file.lines(end = end):
+        columns = _row_columns(row)
+        if all(
+            column < len(columns) and columns[column] == value
+            for column, value in predicates.items()
+        ):
+            yield row
+
+
+def mapped_scan(table: CsvTable, predicates: dict[int, bytes]) -> Iterator[bytes]:
+    with table._pinned() as table_file:
+        end = table_file.size
+    return CsvTable._scan_file(table_file, end, predicates)
+
+
+def seconds(scan: Callable[[], Iterator[bytes]]) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = sum(1 for _ in scan())
+    return count, time.perf_counter() - start
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    UserReview.data_dir = tempfile.mkdtemp()
+    with UserReview.batch():
+        for i in range(count):
+            UserReview(
+                id = f"review{i}",
+                user_id = f"user{i % 1000}",
+                book_id = f"book{i % 5000}",
+                rating = i % 11,
+                text = "Loved it, mostly.",
+            ).put()
+    table = UserReview._table()
+    fields = list(UserReview.model_fields.keys())
+
+    print(f"UserReview ({count} rows):")
+    for search_fields in ({"book_id": "book42"}, {"rating": 5}, {}):
+        predicates = {
+            fields.index(field): UserReview._encode_value(value)
+            for field, value in search_fields.items()
+        }
+        matches, line_time = seconds(lambda: line_scan(table, predicates))
+        _, mapped_time = seconds(lambda: mapped_scan(table, predicates))
+        print(f"  {search_fields or 'all rows'} ({matches} matches):")
+        print(f"    line at a time: {line_time * 1000:>8.1f} ms")
+        print(f"    mapped:         {mapped_time * 1000:>8.1f} ms ({line_time / mapped_time:.1f}x)")
+    UserReview._drop_table()
+
+
+if __name__ == "__main__":
+    main()
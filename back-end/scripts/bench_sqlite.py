@@ -0,0 +1,111 @@
+"""
+Benchmark comparing the CSV and SQLite storage backends on synthetic data at
+the scale of the Book Crossing dataset (about 270k books and 1.15M ratings
+by default), through the `PersistedModel` API.
+
+The tables are written to temporary directories, not the real data
+directory. Book's record cache is turned off, so that both backends do the
+same work for each lookup.
+
+Usage:
+    python -m scripts.bench_sqlite [books] [ratings]
+"""
+
+import random
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from db.csv_table import CsvTable
+from db.models.Book import Book
+from db.models.UserReview import UserReview
+
+WORDS = [
+    "night", "river", "garden", "shadow", "winter", "stone", "secret", "house",
+    "island", "letters", "summer", "queen", "murder", "silver", "journey",
+    "history", "dragon", "ocean", "mountain", "city", "lost", "wild", "last",
+    "dark", "little", "story", "girl", "king", "fire", "moon",
+]
+
+CHUNK_SIZE = 50_000
+
+
+def book_row(i: int) -> bytes:
+    title = f"The {WORDS[i % len(WORDS)]} of the {WORDS[i * 7 % len(WORDS)]} {i}"
+    return f'book{i},{title},["Author {i % 5000}"],None,None,None,None'.encode()
+
+
+def review_row(i: int, books: int) -> bytes:
+    return f"review{i},user{i * 31 % 100_000},book{i * 17 % books},{i % 11},None".encode()
+
+
+def load(books: int, ratings: int) -> float:
+    start = time.perf_counter()
+    for model, prefix, count, row in (
+        (Book, "book", books, book_row),
+        (UserReview, "review", ratings, lambda i: review_row(i, books)),
+    ):
+        table = model._table()
+        for chunk_start in range(0, count, CHUNK_SIZE):
+            table.write_many({
+                f"{prefix}{i}".encode(): row(i)
+                for i in range(chunk_start, min(count, chunk_start + CHUNK_SIZE))
+            })
+    return time.perf_counter() - start
+
+
+def timed(work: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    work()
+    return time.perf_counter() - start
+
+
+def run(backend: str, books: int, ratings: int) -> dict[str, float]:
+    Book.storage_backend = backend
+    UserReview.storage_backend = backend
+    Book.data_dir = UserReview.data_dir = tempfile.mkdtemp()
+    Book.cache_max_entries = 0
+
+    results = {"bulk load": load(books, ratings)}
+    # A new process has to open the tables again; for table files that
+    # means indexing them.
+    table = UserReview._table()
+    if isinstance(table, CsvTable):
+        table._current = None
+    results["first lookup"] = timed(lambda: UserReview.get_by_primary_key("review1"))
+
+    rng = random.Random(0)
+    review_ids = [f"review{rng.randrange(ratings)}" for _ in range(10_000)]
+    results["10k get_by_primary_key"] = timed(
+        lambda: [UserReview.get_by_primary_key(review_id) for review_id in review_ids]
+    )
+    users = [f"user{rng.randrange(100_000)}" for _ in range(1_000)]
+    results["1k get_where(user_id) (indexed)"] = timed(
+        lambda: [list(UserReview.get_where(user_id = user)) for user in users]
+    )
+    results["get_where(rating) (not indexed)"] = timed(
+        lambda: sum(1 for _ in UserReview.get_where(rating = 10))
+    )
+    titles = [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(20)]
+    results["20 get_where_like(title)"] = timed(
+        lambda: [list(Book.get_where_like(title = title)) for title in titles]
+    )
+    Book._drop_table()
+    UserReview._drop_table()
+    return results
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 271_379
+    ratings = int(sys.argv[2]) if len(sys.argv) > 2 else 1_149_780
+    csv = run("csv", books, ratings)
+    sqlite = run("sqlite", books, ratings)
+    print(f"{books:,} books, {ratings:,} ratings:")
+    print(f"  {'':34} {'csv':>10} {'sqlite':>10}")
+    for name in csv:
+        print(f"  {name:34} {csv[name]:>9.3f}s {sqlite[name]:>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
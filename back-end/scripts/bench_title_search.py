@@ -0,0 +1,105 @@
+"""
+Benchmark of `Book.get_where_like(title = ...)`, as used by
+`GET /search/book/{book_title}`, with and without the in-memory text index
+(see `db.text_index`), in table order, ranked and fuzzy, on synthetic titles
+at the scale of the Book Crossing dataset (about 270k books by default).
+
+The table is written to a temporary directory, not the real data directory.
+
+Usage:
+    python -m scripts.bench_title_search [books]
+"""
+
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from db.csv_table import CsvTable
+from db.models.Book import Book
+from db.persisted_model import _tables
+
+COMMON_WORDS = ["the", "of", "and", "a", "in", "to", "my", "for", "with", "on"]
+SEARCHES = ["the", "frank", "frankenstein", "moon of", "garden of", "zyx", "history of the", "tion"]
+FUZZY_SEARCHES = ["frankenstien", "histroy of the"]
+FUZZY_MIN_SIMILARITY = 0.4
+CHUNK_SIZE = 50_000
+
+
+def vocabulary(rng: random.Random, size: int) -> list[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+def load(books: int) -> None:
+    rng = random.Random(42)
+    words = vocabulary(rng, 40_000)
+    # Words are picked by rank, so these go where they might rank in real
+    # titles: "history" is common, "frankenstein" rare.
+    for rank, word in [(20, "history"), (150, "garden"), (300, "moon"), (800, "silver"), (4000, "frankenstein")]:
+        words.insert(rank, word)
+    table = Book._table()
+    for chunk_start in range(0, books, CHUNK_SIZE):
+        changes = {}
+        for i in range(chunk_start, min(books, chunk_start + CHUNK_SIZE)):
+            # Titles seldom repeat a word.
+            title = " ".join(dict.fromkeys(
+                rng.choice(COMMON_WORDS) if rng.random() < 0.3 else words[(int(rng.paretovariate(0.6)) - 1) % len(words)]
+                for _ in range(rng.randint(1, 7))
+            )).title()
+            changes[f"book{i}".encode()] = f'book{i},{title},["Author {i % 5000}"],None,None,None,None'.encode()
+        table.write_many(changes)
+
+
+def reopen(text_indexed: bool) -> float:
+    """Reopens the table with or without the text index, and returns how long indexing it took."""
+    Book.text_indexed_fields = ("title",) if text_indexed else ()
+    _tables.clear()
+    CsvTable._tables.clear()
+    start = time.perf_counter()
+    Book.exists("book0")
+    return time.perf_counter() - start
+
+
+def timed_ms(search: str, samples: int = 5, **page: int | bool | float) -> float:
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        list(Book.get_where_like(title = search, **page))
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def run(text_indexed: bool) -> dict[str, float]:
+    results = {"open + index (ms)": reopen(text_indexed) * 1000}
+    for search in SEARCHES:
+        results[f"{search!r} first page (ms)"] = timed_ms(search, limit = 20)
+        results[f"{search!r} page 5 (ms)"] = timed_ms(search, skip = 80, limit = 20)
+        results[f"{search!r} all (ms)"] = timed_ms(search)
+        results[f"{search!r} ranked page (ms)"] = timed_ms(search, limit = 20, ranked = True)
+    for search in FUZZY_SEARCHES:
+        # Scanning checks the similarity of every word of every title, so
+        # this is only timed once.
+        results[f"{search!r} fuzzy ranked page (ms)"] = timed_ms(
+            search, samples = 1, limit = 20, ranked = True, min_similarity = FUZZY_MIN_SIMILARITY
+        )
+    return results
+
+
+def main() -> None:
+    books = int(sys.argv[1]) if len(sys.argv) > 1 else 271_379
+    Book.data_dir = tempfile.mkdtemp()
+    Book.cache_max_entries = 0
+    load(books)
+
+    scan = run(text_indexed = False)
+    indexed = run(text_indexed = True)
+    print(f"Book title search ({books:,} books):")
+    print(f"  {'':40} {'scan':>10} {'index':>10}")
+    for name in scan:
+        print(f"  {name:40} {scan[name]:>10,.2f} {indexed[name]:>10,.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark of concurrent writes to a `UserSession` table (whose writes are
+appends) and a `UserReview`-shaped table whose writes rewrite the file,
+without a write-ahead log and with each of its durability modes (see
+`PersistedModel.wal_durability`). Each run has several threads putting
+records at once, which is when group commit pays off.
+
+The tables are written to temporary directories, not the real data
+directory.
+
+Usage:
+    python -m scripts.bench_wal [threads] [writes per thread] [records]
+"""
+
+import sys
+import tempfile
+import time
+from threading import Thread
+from typing import Callable, ClassVar
+
+from db.models.User import UserSession
+from db.models.UserReview import UserReview
+from db.persisted_model import PersistedModel, _tables
+
+
+class RewrittenReview(UserReview):
+    append_only: ClassVar[bool] = False
+    key_filter: ClassVar[bool] = False
+    partitions: ClassVar[int] = 1
+
+
+MODES = [None, "fsync", "batched", "buffered"]
+
+
+def session(i: int) -> UserSession:
+    return UserSession(
+        session_id=f"session{i}",
+        user_id=f"user{i % 1000}",
+        original_creation_timestamp=i,
+        expiration_timestamp=i,
+    )
+
+
+def review(i: int) -> RewrittenReview:
+    return RewrittenReview(id=f"review{i}", user_id=f"user{i % 1000}", book_id=f"book{i % 5000}", rating=i % 11)
+
+
+def run(
+    model: type[PersistedModel],
+    make: Callable[[int], PersistedModel],
+    mode: str | None,
+    threads: int,
+    writes: int,
+    records: int,
+) -> float:
+    model.write_ahead_log = mode is not None
+    model.wal_durability = mode
+    model.data_dir = tempfile.mkdtemp()
+    _tables.clear()
+    model.put_many(make(i) for i in range(records))
+
+    def write(start: int) -> None:
+        for i in range(start, start + writes):
+            make(i % records).put()
+
+    workers = [Thread(target=write, args=(n * writes,)) for n in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    model._drop_table()
+    return threads * writes / elapsed
+
+
+def main() -> None:
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    writes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    records = int(sys.argv[3]) if len(sys.argv) > 3 else 10_000
+    print(f"{threads} threads x {writes} puts, {records:,} records (writes/sec):")
+    print(f"  {'':10} {'append':>10} {'rewrite':>10}")
+    for mode in MODES:
+        appends = run(UserSession, session, mode, threads, writes, records)
+        rewrites = run(RewrittenReview, review, mode, threads, writes, records)
+        print(f"  {mode or 'no log':10} {appends:>10,.0f} {rewrites:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
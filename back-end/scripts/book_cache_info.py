@@ -1,18 +1,48 @@
 """
-Utility script to inspect the in-process Book cache metrics.
+Utility script to inspect the in-process row cache metrics of each table.
 
 Usage:
     python -m scripts.book_cache_info
 """
 
+from db.models.AdminUser import AdminSession, AdminUser
+from db.models.AuditLog import AuditLog
 from db.models.Book import Book
+from db.models.BookMetadataCache import BookMetadataCache
+from db.models.BookRating import BookRating
+from db.models.Penalty import Penalty
+from db.models.Report import Report
+from db.models.SavedBook import SavedBook
+from db.models.SentimentCache import SentimentCache
+from db.models.User import User, UserSession
+from db.models.UserReview import UserReview
+
+MODELS = [
+    AdminSession,
+    AdminUser,
+    AuditLog,
+    Book,
+    BookMetadataCache,
+    BookRating,
+    Penalty,
+    Report,
+    SavedBook,
+    SentimentCache,
+    User,
+    UserSession,
+    UserReview,
+]
 
 
 def main() -> None:
-    stats = Book.cache_info()
-    print("Book cache stats:")
-    for key, value in stats.items():
-        print(f"  {key}: {value}")
+    for model in MODELS:
+        stats = model.cache_info()
+        if stats is None:
+            print(f"{model.__name__}: no cache")
+            continue
+        print(f"{model.__name__} cache stats:")
+        for key, value in stats.items():
+            print(f"  {key}: {value}")
 
 
 if __name__ == "__main__":
@@ -3,9 +3,11 @@ from pathlib import Path
 
 from db.models.Book import Book
 from db.models.UserReview import UserReview
+from db.models.BookRating import BookRating
 
 Book.data_dir = "data/production-data"
 UserReview.data_dir = "data/production-data"
+BookRating.data_dir = "data/production-data"
 
 print(f"Currently in {os.getcwd()}\n")
 
@@ -42,10 +44,13 @@ line = r.readline()
 while line != "":
 	values = line[1:-2].split("\";\"")
 
+	# The dataset gives 0 for books whose year of publication isn't known.
+	year = int(values[3]) if values[3].isdigit() and int(values[3]) > 0 else None
 	new_book = Book(
 		id = values[0],
 		title = values[1],
-		authors = values[2].split(",")
+		authors = values[2].split(","),
+		year = year
 	)
 	w.write(new_book._to_csv_row() + "\n") # pyright: ignore[reportPrivateUsage]
 
@@ -93,4 +98,8 @@ while line != "":
 r.close()
 w.close()
 
-print("\n\nData imported.")
+print("\n\nComputing book ratings...")
+
+rated_books = UserReview.rebuild_book_ratings()
+
+print(f"\n{rated_books} books have ratings.\n\nData imported.")
@@ -0,0 +1,70 @@
+"""
+Copies the CSV table files of every model in a data directory into the
+SQLite database in that directory, for use with `STORAGE_BACKEND=sqlite`.
+Tables that already exist in the database are replaced. The table files
+themselves are left as they are.
+
+Usage:
+    python -m scripts.migrate_to_sqlite [data_dir ...]
+
+The default is `data/production-data` and `data`, the directories that
+`server.py` uses.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from db.csv_table import CsvTable, _row_key
+from db.persisted_model import PersistedModel
+from scripts.book_cache_info import MODELS
+
+CHUNK_SIZE = 50_000
+"""
+The number of records copied per transaction.
+"""
+
+
+def migrate(model: type[PersistedModel], data_dir: str) -> int | None:
+    csv_path = Path(data_dir) / f"{model.__name__}.csv"
+    if not csv_path.exists():
+        return None
+
+    model.data_dir = data_dir
+    model.storage_backend = "csv"
+    source = CsvTable.open(
+        csv_path,
+        model._to_csv_header(),
+        append_only = model.append_only,
+    )
+    model.storage_backend = "sqlite"
+    target = model._table()
+    target.drop()
+
+    copied = 0
+    chunk: dict[bytes, bytes | None] = {}
+    for row in source.scan():
+        chunk[_row_key(row)] = row
+        if len(chunk) == CHUNK_SIZE:
+            target.write_many(chunk)
+            copied += len(chunk)
+            chunk = {}
+    target.write_many(chunk)
+    return copied + len(chunk)
+
+
+def main() -> None:
+    data_dirs = sys.argv[1:] or ["data/production-data", "data"]
+    for data_dir in data_dirs:
+        print(f"{data_dir}:")
+        for model in MODELS:
+            start = time.perf_counter()
+            copied = migrate(model, data_dir)
+            if copied is None:
+                print(f"  {model.__name__}: no table file")
+                continue
+            print(f"  {model.__name__}: {copied:,} records in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Splits a model's table into the given number of partition files (see
+`PersistedModel.partitions`), or merges its partitions back into a single
+table file when the number is 1. Set the model's `partitions` to the same
+number afterwards. Stop the server before running this.
+
+Usage:
+    python -m scripts.repartition <model> <partitions> [data_dir]
+
+For example, `python -m scripts.repartition UserReview 8 data/production-data`.
+"""
+
+import sys
+import time
+from pathlib import Path
+
+from db.partitioned_table import repartition
+from scripts.book_cache_info import MODELS
+
+
+def main() -> None:
+    if len(sys.argv) not in (3, 4) or not sys.argv[2].isdigit() or int(sys.argv[2]) < 1:
+        print(__doc__)
+        exit(1)
+    models = {model.__name__: model for model in MODELS}
+    model = models.get(sys.argv[1])
+    if model is None:
+        print(f"Unknown model {sys.argv[1]}; expected one of {', '.join(models)}.")
+        exit(1)
+    partitions = int(sys.argv[2])
+    data_dir = Path(sys.argv[3] if len(sys.argv) == 4 else model.data_dir)
+
+    start = time.perf_counter()
+    records = repartition(
+        data_dir,
+        model.__name__,
+        model._to_csv_header(),
+        partitions,
+        append_only = model.append_only,
+    )
+    print(
+        f"{model.__name__}: {records:,} records in {partitions} partition(s) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -5,18 +6,36 @@ from handlers import ROUTERS
 
 from db.models.UserReview import UserReview
 from db.models.Book import Book
-from db.models.User import User, UserSession
+from db.models.BookRating import BookRating, book_rating_sync
+from db.models.User import User, UserSession, session_renewals
+from db.models.AdminUser import AdminSession, admin_session_renewals
+from db.models.BookMetadataCache import BookMetadataCache
+from db.models.SentimentCache import SentimentCache
+from db.expiry_sweeper import ExpirySweeper
 
 import os
 
 if os.environ.get("TESTING") != "1":
 	Book.data_dir = "data/production-data"
 	UserReview.data_dir = "data/production-data"
+	BookRating.data_dir = "data/production-data"
 	User.data_dir = "data/production-data"
 	UserSession.data_dir = "data/production-data"
 	
 
-app = FastAPI()
+expiry_sweeper = ExpirySweeper([UserSession, AdminSession, SentimentCache, BookMetadataCache])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	UserReview.recover_book_ratings()
+	expiry_sweeper.start()
+	yield
+	expiry_sweeper.stop()
+	session_renewals.flush()
+	admin_session_renewals.flush()
+	book_rating_sync.flush()
+
+app = FastAPI(lifespan = lifespan)
 
 for router in ROUTERS:
 	app.include_router(router)